@@ -0,0 +1,134 @@
+"""
+Benchmark: concurrent writers on the same and on separate user partitions.
+
+Several processes (like several Streamlit servers on one data directory)
+mark topics as completed and append scores at the same time. The run
+checks that no update is lost and reports the write throughput and the
+optimistic-check conflicts resolved by merging.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_concorrenza
+    python -m benchmarks.bench_concorrenza --storage sqlite --processi 16
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+N_ARGOMENTI = 200
+PROCESSI = 8
+SCRITTURE = 25  # Scritture di stato e punteggio per processo
+
+
+def _scrittore(compito):
+    """Mark `scritture` topics as completed and log a score for each."""
+    cartella, backend, utente, argomenti = compito
+    os.chdir(cartella)
+    logging.disable(logging.WARNING)
+    import src.data.storage as storage
+
+    storage.BACKEND = backend
+    stato_store = storage.get_state_store(storage.file_utente(utente, "stato_argomenti.csv"))
+    punteggi_store = storage.get_score_store(storage.file_utente(utente, "punteggi_test.csv"))
+    catalogo = [f"Argomento {i}" for i in range(N_ARGOMENTI)]
+    stato_df = stato_store.load(catalogo)
+    inizio = time.perf_counter()
+    for argomento in argomenti:
+        stato_df.loc[stato_df["Argomento"] == argomento, "Stato"] = "completato"
+        stato_store.update(stato_df, [argomento], "completato")
+        punteggi_store.append([{
+            "Argomento": argomento, "Punteggio": 80, "Data": time.strftime("%Y-%m-%d %H:%M:%S"), "Commento": ""
+        }])
+    return time.perf_counter() - inizio, getattr(stato_store, "conflitti", 0)
+
+
+def esegui(backend, processi, scritture, utenti):
+    """
+    Run the writers in a temporary data directory.
+
+    Args:
+        backend (str): "csv" or "sqlite"
+        processi (int): Concurrent writer processes
+        scritture (int): Writes per process
+        utenti (list): Partitions, assigned round-robin to the processes
+
+    Returns:
+        dict: Throughput, conflicts and lost updates
+    """
+    import src.data.storage as storage
+
+    cartella = tempfile.mkdtemp(prefix="bench_concorrenza_")
+    try:
+        compiti = []
+        for p in range(processi):
+            utente = utenti[p % len(utenti)]
+            # Processi della stessa partizione scrivono argomenti diversi
+            primo = (p // len(utenti)) * scritture
+            argomenti = [f"Argomento {i % N_ARGOMENTI}" for i in range(primo, primo + scritture)]
+            compiti.append((cartella, backend, utente, argomenti))
+        inizio = time.perf_counter()
+        with Pool(processi) as pool:
+            risultati = pool.map(_scrittore, compiti)
+        durata = time.perf_counter() - inizio
+
+        # Verifica: ogni argomento scritto deve risultare completato, ogni punteggio presente
+        cwd = os.getcwd()
+        os.chdir(cartella)
+        storage.BACKEND = backend
+        persi = 0
+        try:
+            catalogo = [f"Argomento {i}" for i in range(N_ARGOMENTI)]
+            for utente in utenti:
+                scritti = {a for c in compiti if c[2] == utente for a in c[3]}
+                attesi_punteggi = sum(len(c[3]) for c in compiti if c[2] == utente)
+                stato_df = storage.get_state_store(storage.file_utente(utente, "stato_argomenti.csv")).load(catalogo)
+                completati = set(stato_df.loc[stato_df["Stato"] == "completato", "Argomento"])
+                punteggi_df = storage.get_score_store(storage.file_utente(utente, "punteggi_test.csv")).load()
+                persi += len(scritti - completati) + attesi_punteggi - len(punteggi_df)
+        finally:
+            os.chdir(cwd)
+        return {
+            "scritture/s": 2 * processi * scritture / durata,
+            "durata (s)": durata,
+            "processo p50 (s)": sorted(r[0] for r in risultati)[len(risultati) // 2],
+            "conflitti": sum(r[1] for r in risultati),
+            "aggiornamenti persi": persi,
+        }
+    finally:
+        shutil.rmtree(cartella, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent writers benchmark")
+    parser.add_argument("--storage", choices=["csv", "sqlite"], default="csv")
+    parser.add_argument("--processi", type=int, default=PROCESSI)
+    parser.add_argument("--scritture", type=int, default=SCRITTURE)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Fuori da `streamlit run` ogni st.* avvisa della ScriptRunContext mancante
+    logging.disable(logging.WARNING)
+
+    scenari = {
+        "stessa partizione": ["default"],
+        "partizione per processo": [f"studente{p}" for p in range(args.processi)],
+    }
+    print(f"Backend: {args.storage}, {args.processi} processi x {args.scritture} scritture")
+    persi = 0
+    for nome, utenti in scenari.items():
+        risultato = esegui(args.storage, args.processi, args.scritture, utenti)
+        persi += risultato["aggiornamenti persi"]
+        print(f"\n{nome}:")
+        for chiave, valore in risultato.items():
+            print(f"  {chiave:<22} {valore:.2f}" if isinstance(valore, float) else f"  {chiave:<22} {valore}")
+    return 1 if persi else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
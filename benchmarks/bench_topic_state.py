@@ -0,0 +1,68 @@
+"""
+Benchmark: per-row DataFrame scans vs TopicStateStore with 10k topics.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_topic_state
+"""
+
+import random
+import time
+
+import pandas as pd
+
+from src.utils.topic_index import STATI, TopicStateStore
+
+N_ARGOMENTI = 10000
+
+
+def genera_stati(n, seed=0):
+    """
+    Build a synthetic topics-state DataFrame.
+
+    Args:
+        n (int): Number of topics
+        seed (int, optional): Random seed
+
+    Returns:
+        pandas.DataFrame: DataFrame with "Argomento" and "Stato"
+    """
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "Argomento": [f"Macro {i % 50}: Argomento {i}" for i in range(n)],
+        "Stato": [rng.choice(STATI) for _ in range(n)],
+    })
+
+
+def cronometra(funzione):
+    """Return the wall time of a call in seconds."""
+    inizio = time.perf_counter()
+    funzione()
+    return time.perf_counter() - inizio
+
+
+def main(n=N_ARGOMENTI):
+    df = genera_stati(n)
+    argomenti = df["Argomento"].tolist()
+
+    def indice():
+        store = TopicStateStore(df)
+        for arg in argomenti:
+            store.stato(arg)
+        store.conteggi()
+
+    # Pattern precedente: una scansione completa per argomento (O(n²)).
+    # Troppo lenta su tutti gli argomenti: misura un campione ed estrapola
+    campione = argomenti[:500]
+    t_campione = cronometra(lambda: [df.loc[df.Argomento == a, "Stato"].values for a in campione])
+    t_scansione = t_campione * len(argomenti) / len(campione)
+    t_indice = cronometra(indice)
+
+    print(f"Argomenti: {n}")
+    print(f"Scansione per riga (stimata): {t_scansione * 1000:10.1f} ms")
+    print(f"TopicStateStore (build + lookup): {t_indice * 1000:6.1f} ms")
+    print(f"Speedup: {t_scansione / t_indice:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Load generator: N concurrent simulated students.
+
+Every student runs in its own thread, like a Streamlit session, and
+repeats the cycle study -> test -> grade -> chat through the app's own
+LLM functions (shared pooled client, same prompts and parameters, call
+ledger). Unless --url is given, the calls go to an in-process
+OpenRouter stand-in with the requested latency, token rate and error
+injection. The report gives throughput, latency percentiles and error
+rates per step and per cycle.
+
+Run from the repository root:
+
+    python -m benchmarks.carico --studenti 30 --cicli 3 --latenza lognormale:0.8,0.5 --token-al-secondo 60
+    python -m benchmarks.carico --studenti 5 --url http://127.0.0.1:8080/api/v1   # external server
+
+With --url the app's .streamlit/secrets.toml of the working directory is
+used; otherwise a temporary directory with dummy secrets.
+"""
+
+import argparse
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fake_openrouter import aggiungi_opzioni, da_opzioni
+
+STUDENTI = 10
+CICLI = 2
+TOKEN_RISPOSTA = 300  # Lunghezza delle risposte dello stand-in
+MESSAGGI_CHAT = 2  # Messaggi in chat per ciclo
+ARGOMENTI = [
+    "Victorian Literature (Dickens, Brontë, Tennyson, Hardy)",
+    "Phonetics and Phonology of English",
+    "Morphology and Word Formation",
+    "Modernism (Joyce, Woolf, Eliot)",
+    "Shakespeare's Tragedies",
+]
+PASSI = ["studio", "test", "valutazione", "chat"]
+
+
+class Studente:
+    """
+    Simulated student running study/test/grade/chat cycles.
+    """
+
+    def __init__(self, numero, pausa=0.0, seed=None):
+        """
+        Args:
+            numero (int): Student number
+            pausa (float, optional): Mean think time between steps in seconds
+            seed (int, optional): Random seed
+        """
+        from src.data.chat_history import ChatHistory
+        from src.llm.context import ConversationContext
+
+        self.numero = numero
+        self.pausa = pausa
+        self.rng = random.Random(seed)
+        self.chat_log = ChatHistory(uuid.uuid4().hex)
+        self.contesto = ConversationContext()
+        self.passi = []  # (passo, durata, ok)
+        self.cicli = []  # durata di ogni ciclo
+
+    def _attendi(self):
+        if self.pausa:
+            time.sleep(self.rng.uniform(0, 2 * self.pausa))
+
+    def _passo(self, nome, funzione):
+        inizio = time.perf_counter()
+        try:
+            ok = funzione()
+        except Exception:
+            ok = False
+        self.passi.append((nome, time.perf_counter() - inizio, ok))
+        self._attendi()
+
+    def ciclo(self):
+        """Run one study -> test -> grade -> chat cycle."""
+        from src.llm.api import (
+            LEZIONE_MAX_TOKENS, LEZIONE_TEMPERATURE, PARAMETRI_DOMANDA, PARAMETRI_RISPOSTA_MODELLO,
+            PARAMETRI_VALUTAZIONE, chiamata_llm, chiamata_llm_stream, estrai_punteggio, prompt_domanda_test,
+            prompt_lezione, prompt_risposta_modello, prompt_valutazione
+        )
+
+        argomento = self.rng.choice(ARGOMENTI)
+        test = {}
+        inizio = time.perf_counter()
+
+        def studio():
+            testo = "".join(chiamata_llm_stream(
+                prompt_lezione(argomento), max_tokens=LEZIONE_MAX_TOKENS, temperature=LEZIONE_TEMPERATURE,
+                tipo="lezione"
+            ))
+            return not testo.startswith("❌")
+
+        def domanda():
+            test["domanda"] = chiamata_llm(prompt_domanda_test(argomento), tipo="domanda", **PARAMETRI_DOMANDA)
+            test["risposta_modello"] = chiamata_llm(
+                prompt_risposta_modello(argomento, test["domanda"]), tipo="risposta_modello",
+                **PARAMETRI_RISPOSTA_MODELLO
+            )
+            return not (test["domanda"].startswith("❌") or test["risposta_modello"].startswith("❌"))
+
+        def valutazione():
+            risposta = "".join(chiamata_llm_stream(
+                prompt_valutazione(argomento, test["domanda"], test["risposta_modello"], "My answer. " * 30),
+                tipo="valutazione", **PARAMETRI_VALUTAZIONE
+            ))
+            if risposta.startswith("❌"):
+                return False
+            estrai_punteggio(risposta)
+            return True
+
+        def chat():
+            ok = True
+            for i in range(MESSAGGI_CHAT):
+                messaggio = f"Can you explain again the key points of {argomento}? ({i})"
+                messaggi, _ = self.contesto.messaggi(self.chat_log, messaggio)
+                risposta = "".join(chiamata_llm_stream(
+                    None, max_tokens=500, temperature=0.7, messages=messaggi, tipo="chat"
+                ))
+                ok = ok and not risposta.startswith("❌")
+                self.chat_log.append({"utente": messaggio, "llm": risposta})
+            return ok
+
+        self._passo("studio", studio)
+        self._passo("test", domanda)
+        self._passo("valutazione", valutazione)
+        self._passo("chat", chat)
+        self.cicli.append(time.perf_counter() - inizio)
+
+
+def percentili(durate):
+    """p50/p95/p99 in seconds (NaN when empty)."""
+    if not len(durate):
+        return (np.nan,) * 3
+    return tuple(np.percentile(durate, [50, 95, 99]))
+
+
+def report(studenti, durata, ledger_df):
+    """
+    Build the load report.
+
+    Args:
+        studenti (list): Finished Studente objects
+        durata (float): Wall time of the run in seconds
+        ledger_df (pandas.DataFrame): Per-type statistics from the call ledger
+
+    Returns:
+        tuple: (per-step DataFrame, totals dict)
+    """
+    passi = pd.DataFrame([p for s in studenti for p in s.passi], columns=["Passo", "Durata", "Ok"])
+    righe = []
+    for passo in PASSI:
+        gruppo = passi[passi["Passo"] == passo]
+        p50, p95, p99 = percentili(gruppo["Durata"].to_numpy())
+        righe.append({
+            "Passo": passo,
+            "Eseguiti": len(gruppo),
+            "Errori %": 100 * (1 - gruppo["Ok"].mean()) if len(gruppo) else np.nan,
+            "p50 (s)": p50, "p95 (s)": p95, "p99 (s)": p99,
+            "Passi/min": len(gruppo) / durata * 60,
+        })
+    cicli = [c for s in studenti for c in s.cicli]
+    p50, p95, p99 = percentili(cicli)
+    chiamate = int(ledger_df["Chiamate"].sum()) if not ledger_df.empty else 0
+    errori = int(ledger_df["Errori"].sum()) if not ledger_df.empty else 0
+    totali = {
+        "studenti": len(studenti),
+        "durata (s)": durata,
+        "cicli completati": len(cicli),
+        "cicli/min": len(cicli) / durata * 60,
+        "ciclo p50/p95/p99 (s)": f"{p50:.2f} / {p95:.2f} / {p99:.2f}",
+        "chiamate LLM": chiamate,
+        "chiamate/s": chiamate / durata,
+        "errori LLM %": 100 * errori / chiamate if chiamate else 0.0,
+    }
+    return pd.DataFrame(righe), totali
+
+
+def esegui(n_studenti, cicli, pausa=0.0, seed=None):
+    """
+    Run the simulated students in the current directory.
+
+    Args:
+        n_studenti (int): Concurrent students
+        cicli (int): Cycles per student
+        pausa (float, optional): Mean think time between steps in seconds
+        seed (int, optional): Random seed
+
+    Returns:
+        tuple: (per-step DataFrame, totals dict, per-type ledger DataFrame)
+    """
+    from src.llm.ledger import get_llm_ledger
+
+    studenti = [Studente(i, pausa, None if seed is None else seed + i) for i in range(n_studenti)]
+    barriera = threading.Barrier(n_studenti)
+
+    def lavora(studente):
+        # Tutti gli studenti partono insieme, come una classe all'inizio della lezione
+        barriera.wait()
+        for _ in range(cicli):
+            studente.ciclo()
+
+    dal = time.time()
+    inizio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_studenti, thread_name_prefix="studente") as pool:
+        list(pool.map(lavora, studenti))
+    durata = time.perf_counter() - inizio
+    ledger_df = get_llm_ledger().statistiche(dal)
+    passi, totali = report(studenti, durata, ledger_df)
+    return passi, totali, ledger_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-student load generator")
+    parser.add_argument("--studenti", type=int, default=STUDENTI)
+    parser.add_argument("--cicli", type=int, default=CICLI)
+    parser.add_argument("--pausa", type=float, default=0.0, help="mean think time between steps (s)")
+    parser.add_argument("--url", help="API base URL of an external server (skips the stand-in)")
+    aggiungi_opzioni(parser)
+    parser.set_defaults(token_risposta=TOKEN_RISPOSTA)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Fuori da `streamlit run` ogni st.* avvisa della ScriptRunContext mancante
+    logging.disable(logging.WARNING)
+    pd.set_option("display.width", 160)
+
+    cartella = os.getcwd()
+    tmp = None
+    server = None
+    try:
+        if args.url:
+            os.environ["OPENROUTER_BASE_URL"] = args.url
+        else:
+            server = da_opzioni(args).start()
+            os.environ["OPENROUTER_BASE_URL"] = server.base_url
+            tmp = tempfile.mkdtemp(prefix="carico_dashboard_")
+            os.chdir(tmp)
+            os.makedirs(".streamlit")
+            with open(os.path.join(".streamlit", "secrets.toml"), "w", encoding="utf-8") as f:
+                f.write('[openrouter_api_key]\nopenrouter_api_key = "carico"\nmodel = "carico/model"\n')
+
+        print(f"{args.studenti} studenti x {args.cicli} cicli -> {os.environ['OPENROUTER_BASE_URL']}")
+        passi, totali, ledger_df = esegui(args.studenti, args.cicli, args.pausa, args.seed)
+    finally:
+        os.chdir(cartella)
+        if server is not None:
+            server.stop()
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    print("\nPer passo:")
+    print(passi.round(2).to_string(index=False))
+    if not ledger_df.empty:
+        print("\nPer tipo di chiamata (ledger):")
+        print(ledger_df.round(2).to_string(index=False))
+    if server is not None:
+        print(f"\nRisposte dello stand-in: {dict(sorted(server.risposte.items()))}")
+    print("\nTotali:")
+    for chiave, valore in totali.items():
+        print(f"  {chiave:<24} {valore:.2f}" if isinstance(valore, float) else f"  {chiave:<24} {valore}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Synthetic data generators for the benchmarks.
+
+Topics are named "Macro N: Sottoargomento M" like the real catalogue;
+scores carry long Markdown comments like the LLM grading output.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.data.score_log import COLONNE
+
+SCALE = {
+    # nome: (argomenti, punteggi)
+    "piccola": (1000, 10000),
+    "media": (10000, 100000),
+    "grande": (100000, 1000000),
+}
+MACRO = 50
+LUNGHEZZA_COMMENTO = 800  # Caratteri di commento per punteggio
+
+_TESTO = (
+    "**SCORE: {p}/100**\n\n"
+    "The answer covers the main points of the topic but several details are missing. "
+    "Strengths: clear structure, correct terminology, relevant examples from the texts. "
+    "Weaknesses: the historical context is only sketched, the comparison with other authors "
+    "is superficial and some dates are imprecise. Suggestions: review the key concepts, "
+    "practise a two-minute oral summary and link the topic to the rest of the syllabus. "
+)
+
+
+def genera_argomenti(n, macro=MACRO):
+    """
+    Build a synthetic topics catalogue.
+
+    Args:
+        n (int): Number of topics
+        macro (int, optional): Number of macro areas
+
+    Returns:
+        pandas.DataFrame: DataFrame with "Argomento", like argomenti_orali.csv
+    """
+    return pd.DataFrame({"Argomento": [f"Macro {i % macro}: Sottoargomento {i}" for i in range(n)]})
+
+
+def genera_punteggi(n, argomenti, lunghezza_commento=LUNGHEZZA_COMMENTO, giorni=365, seed=0):
+    """
+    Build a synthetic score history sorted by date.
+
+    Args:
+        n (int): Number of score rows
+        argomenti (list): Topic names to draw from
+        lunghezza_commento (int, optional): Characters of each comment
+        giorni (int, optional): Days covered by the history, ending today
+        seed (int, optional): Random seed
+
+    Returns:
+        pandas.DataFrame: DataFrame with the COLONNE columns
+    """
+    rng = np.random.default_rng(seed)
+    punteggi = rng.integers(0, 101, n)
+    fine = pd.Timestamp.now().floor("s")
+    secondi = np.sort(rng.integers(0, giorni * 86400, n))
+    date = (fine - pd.Timedelta(days=giorni) + pd.to_timedelta(secondi, unit="s")).strftime("%Y-%m-%d %H:%M:%S")
+
+    # Commenti diversi tra loro: finestre a offset casuale su un testo lungo
+    base = _TESTO * (lunghezza_commento // len(_TESTO) + 2)
+    offset = rng.integers(0, len(_TESTO), n)
+    commenti = [f"**SCORE: {p}/100**\n\n{base[o:o + lunghezza_commento]}" for p, o in zip(punteggi, offset)]
+
+    return pd.DataFrame({
+        "Argomento": np.asarray(argomenti, dtype=object)[rng.integers(0, len(argomenti), n)],
+        "Punteggio": punteggi,
+        "Data": date,
+        "Commento": commenti,
+        "ID": [f"{i:032x}" for i in range(n)],
+    }, columns=COLONNE)
@@ -0,0 +1,263 @@
+"""
+Local stand-in for the OpenRouter chat/completions API.
+
+Serves JSON and SSE responses (with "usage") from an aiohttp app. The
+response latency follows a configurable distribution, completion tokens
+are produced at a configurable rate, and a share of the requests can be
+answered with 429 (with Retry-After) or 5xx errors. It runs in-process
+(on its own event loop in a daemon thread, as used by benchmarks.suite
+and benchmarks.carico) or standalone, to point the app at it:
+
+    python -m benchmarks.fake_openrouter --port 8080 --latenza lognormale:0.8,0.5 --errori-429 0.02
+    OPENROUTER_BASE_URL=http://127.0.0.1:8080/api/v1 streamlit run app.py
+
+Latency specs: "costante:S", "uniforme:MIN,MAX", "lognormale:MEDIANA,SIGMA",
+"esponenziale:MEDIA" (seconds).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import threading
+
+from aiohttp import web
+
+RISPOSTA = (
+    "**SCORE: 72/100**\n\nGood answer with a clear structure. The main concepts are correct, "
+    "but the historical context and the comparison with other authors need more depth."
+)
+STATUS_5XX = (500, 502, 503)
+
+
+def distribuzione(spec, rng=random):
+    """
+    Parse a latency distribution spec.
+
+    Args:
+        spec (str or None): "costante:S", "uniforme:MIN,MAX",
+            "lognormale:MEDIANA,SIGMA" or "esponenziale:MEDIA"
+        rng (random.Random, optional): Random source
+
+    Returns:
+        callable: () -> latency in seconds
+
+    Raises:
+        ValueError: If the spec is not valid
+    """
+    if not spec:
+        return lambda: 0.0
+    nome, _, parametri = spec.partition(":")
+    valori = [float(v) for v in parametri.split(",") if v]
+    if nome == "costante" and len(valori) == 1:
+        return lambda: valori[0]
+    if nome == "uniforme" and len(valori) == 2:
+        return lambda: rng.uniform(valori[0], valori[1])
+    if nome == "lognormale" and len(valori) == 2:
+        return lambda: rng.lognormvariate(math.log(valori[0]), valori[1])
+    if nome == "esponenziale" and len(valori) == 1:
+        return lambda: rng.expovariate(1.0 / valori[0])
+    raise ValueError(f"Distribuzione di latenza non valida: {spec}")
+
+
+def _usage(payload, testo):
+    prompt = sum(len(m.get("content") or "") for m in payload.get("messages", [])) // 4
+    completion = len(testo) // 4
+    return {"prompt_tokens": prompt, "completion_tokens": completion, "total_tokens": prompt + completion}
+
+
+class FakeOpenRouter:
+    """
+    Local chat/completions server.
+
+    Usage:
+
+        with FakeOpenRouter(latenza="lognormale:0.5,0.4") as server:
+            client = LLMClient(secrets_file, url=server.url)
+    """
+
+    def __init__(self, risposta=RISPOSTA, chunk=8, host="127.0.0.1", port=0, latenza=None,
+                 token_al_secondo=None, token_risposta=None, errori_429=0.0, errori_5xx=0.0, retry_after=1,
+                 seed=None):
+        """
+        Args:
+            risposta (str, optional): Content of every completion, truncated to max_tokens
+            chunk (int, optional): Characters per SSE delta
+            host (str, optional): Bind address
+            port (int, optional): Port (0 picks a free one)
+            latenza (str, optional): Latency distribution before the first byte (see distribuzione)
+            token_al_secondo (float, optional): Completion token rate. Defaults to instantaneous.
+            token_risposta (int, optional): Completion length in tokens (risposta repeated),
+                capped by max_tokens. Defaults to risposta as is.
+            errori_429 (float, optional): Share of requests answered with 429
+            errori_5xx (float, optional): Share of requests answered with a 5xx error
+            retry_after (int, optional): Retry-After seconds of the 429 responses
+            seed (int, optional): Random seed
+        """
+        self.risposta = risposta
+        self.chunk = chunk
+        self.host = host
+        self.port = port
+        self.token_al_secondo = token_al_secondo
+        self.token_risposta = token_risposta
+        self.errori_429 = errori_429
+        self.errori_5xx = errori_5xx
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._latenza = distribuzione(latenza, self._rng)
+        self.richieste = 0
+        self.risposte = {}  # status -> conteggio
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    @property
+    def url(self):
+        """str: chat/completions endpoint."""
+        return f"{self.base_url}/chat/completions"
+
+    @property
+    def base_url(self):
+        """str: API base URL, for OPENROUTER_BASE_URL."""
+        return f"http://{self.host}:{self.port}/api/v1"
+
+    def _conta(self, status):
+        self.risposte[status] = self.risposte.get(status, 0) + 1
+
+    def _testo(self, payload):
+        """Completion text limited to the requested max_tokens."""
+        caratteri = (payload.get("max_tokens") or len(self.risposta)) * 4
+        if self.token_risposta:
+            caratteri = min(caratteri, self.token_risposta * 4)
+            return (self.risposta * (caratteri // len(self.risposta) + 1))[:caratteri]
+        return self.risposta[:caratteri]
+
+    async def _completions(self, request):
+        payload = await request.json()
+        self.richieste += 1
+        await asyncio.sleep(self._latenza())
+
+        caso = self._rng.random()
+        if caso < self.errori_429:
+            self._conta(429)
+            return web.json_response(
+                {"error": {"code": 429, "message": "Rate limit exceeded"}}, status=429,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+        if caso < self.errori_429 + self.errori_5xx:
+            status = self._rng.choice(STATUS_5XX)
+            self._conta(status)
+            return web.json_response({"error": {"code": status, "message": "Upstream error"}}, status=status)
+        self._conta(200)
+
+        testo = self._testo(payload)
+        usage = _usage(payload, testo)
+        if not payload.get("stream"):
+            if self.token_al_secondo:
+                await asyncio.sleep(usage["completion_tokens"] / self.token_al_secondo)
+            return web.json_response({
+                "choices": [{"message": {"role": "assistant", "content": testo}}],
+                "usage": usage,
+            })
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        pausa = self.chunk / 4 / self.token_al_secondo if self.token_al_secondo else 0
+        for i in range(0, len(testo), self.chunk):
+            if pausa:
+                await asyncio.sleep(pausa)
+            evento = {"choices": [{"delta": {"content": testo[i:i + self.chunk]}}]}
+            await response.write(f"data: {json.dumps(evento)}\n\n".encode("utf-8"))
+        evento = {"choices": [{"delta": {}, "finish_reason": "stop"}], "usage": usage}
+        await response.write(f"data: {json.dumps(evento)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    def app(self):
+        """
+        Build the aiohttp application.
+
+        Returns:
+            aiohttp.web.Application: App serving POST /api/v1/chat/completions
+        """
+        app = web.Application()
+        app.router.add_post("/api/v1/chat/completions", self._completions)
+        return app
+
+    async def _avvia(self):
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    def start(self):
+        """Start the server in a background thread and wait until it accepts connections."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="fake-openrouter", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._avvia(), self._loop).result()
+        return self
+
+    def stop(self):
+        """Stop the server."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def aggiungi_opzioni(parser):
+    """
+    Add the stand-in options to an argument parser.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser
+    """
+    parser.add_argument("--latenza", help="latency distribution, e.g. lognormale:0.8,0.5")
+    parser.add_argument("--token-al-secondo", type=float, help="completion token rate")
+    parser.add_argument("--token-risposta", type=int, help="completion length in tokens")
+    parser.add_argument("--errori-429", type=float, default=0.0, help="share of 429 responses")
+    parser.add_argument("--errori-5xx", type=float, default=0.0, help="share of 5xx responses")
+    parser.add_argument("--seed", type=int)
+
+
+def da_opzioni(args, **kwargs):
+    """
+    Build a stand-in from parsed options.
+
+    Args:
+        args (argparse.Namespace): Options added by aggiungi_opzioni
+        **kwargs: Other FakeOpenRouter arguments
+
+    Returns:
+        FakeOpenRouter: Server (not started)
+    """
+    return FakeOpenRouter(
+        latenza=args.latenza, token_al_secondo=args.token_al_secondo, token_risposta=args.token_risposta,
+        errori_429=args.errori_429, errori_5xx=args.errori_5xx, seed=args.seed, **kwargs
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenRouter chat/completions stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    aggiungi_opzioni(parser)
+    args = parser.parse_args(argv)
+    server = da_opzioni(args, host=args.host, port=args.port)
+    print(f"OPENROUTER_BASE_URL={server.base_url}")
+    web.run_app(server.app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Import-time budget of the app entry point.
+
+Imports the entry module in fresh interpreters with `python -X importtime`
+and reports, as the median of the runs:
+
+- the cumulative import time of the entry module;
+- its own share: the total minus the third-party packages the entry
+  module imports directly (streamlit, pandas), i.e. what the app's
+  modules add on top of the framework;
+- the slowest imports.
+
+It fails (exit status 1) when either time exceeds its budget or when a
+module that must load lazily on first use (aiohttp, requests, the plotly
+figure modules, pyarrow) is imported at startup because of the app.
+streamlit and pandas load plotly and pyarrow themselves, so a lazy module
+only counts when the app imports it: either an app module imports it
+directly (seen through an __import__ hook, even if it is already loaded)
+or it first appears in the import tree outside the framework subtrees.
+
+Run from the repository root:
+
+    python -m benchmarks.importtime
+    python -m benchmarks.importtime --budget-ms 2000 --budget-proprio-ms 100 --ripetizioni 7
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+MODULO = "src.app"
+RIPETIZIONI = 5
+BUDGET_MS = 1500  # Import completo del modulo di ingresso
+BUDGET_PROPRIO_MS = 60  # Quota dei moduli dell'app, escluse le dipendenze importate direttamente
+# Caricati al primo utilizzo, mai all'avvio
+LAZY = ["aiohttp", "requests", "plotly.graph_objects", "plotly.express", "pyarrow"]
+FRAMEWORK = ["streamlit", "pandas"]  # I loro import interni non contano come import dell'app
+TOP = 15
+
+_RIGA = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# Eseguito in un interprete nuovo: registra gli import LAZY fatti direttamente dai moduli dell'app
+_TRACCIA = """
+import builtins, json, sys
+lazy = json.loads(sys.argv[1])
+trovati = set()
+originale = builtins.__import__
+
+def traccia(name, globals=None, locals=None, fromlist=(), level=0):
+    importatore = (globals or {}).get("__name__") or ""
+    if level == 0 and importatore.split(".")[0] == "src":
+        nomi = [name] + [name + "." + f for f in fromlist or ()]
+        for modulo in lazy:
+            if any(n == modulo or n.startswith(modulo + ".") for n in nomi):
+                trovati.add((modulo, importatore))
+    return originale(name, globals, locals, fromlist, level)
+
+builtins.__import__ = traccia
+import {modulo}
+builtins.__import__ = originale
+print(json.dumps(sorted(trovati)))
+"""
+
+
+def leggi_importtime(output):
+    """
+    Parse the stderr of `python -X importtime`.
+
+    Args:
+        output (str): stderr text
+
+    Returns:
+        list: (name, depth, self_us, cumulative_us) tuples in output order
+            (children before their parent)
+    """
+    righe = []
+    for riga in output.splitlines():
+        m = _RIGA.match(riga)
+        if m:
+            righe.append((m.group(4), len(m.group(3)) // 2, int(m.group(1)), int(m.group(2))))
+    return righe
+
+
+def analizza(righe, modulo=MODULO):
+    """
+    Summarise the import tree of the entry module.
+
+    Args:
+        righe (list): Output of leggi_importtime
+        modulo (str, optional): Entry module
+
+    Returns:
+        dict: "totale_ms", "proprio_ms", "dirette" (direct third-party
+            imports with their ms), "moduli" (name -> (self ms, cumulative ms))
+            and "dell_app" (modules first loaded outside the FRAMEWORK subtrees)
+    """
+    fine = next(i for i, r in enumerate(righe) if r[0] == modulo and r[1] == 0)
+    inizio = max([i + 1 for i, r in enumerate(righe[:fine]) if r[1] == 0] or [0])
+    albero = righe[inizio:fine + 1]
+    totale = albero[-1][3]
+    # Dal genitore ai figli: i moduli caricati senza passare da un framework
+    antenati, dell_app = [], set()
+    for nome, livello, _, _ in reversed(albero):
+        del antenati[livello:]
+        if not any(a.split(".")[0] in FRAMEWORK for a in antenati + [nome]):
+            dell_app.add(nome)
+        antenati.append(nome)
+    dirette = {nome: cumulato for nome, livello, _, cumulato in albero[:-1]
+               if livello == 1 and not nome.startswith("src")}
+    return {
+        "totale_ms": totale / 1000,
+        "proprio_ms": (totale - sum(dirette.values())) / 1000,
+        "dirette": {nome: us / 1000 for nome, us in dirette.items()},
+        "moduli": {nome: (proprio / 1000, cumulato / 1000) for nome, _, proprio, cumulato in albero},
+        "dell_app": dell_app,
+    }
+
+
+def misura(modulo=MODULO, ripetizioni=RIPETIZIONI):
+    """
+    Import the entry module in fresh interpreters.
+
+    Args:
+        modulo (str, optional): Entry module
+        ripetizioni (int, optional): Interpreter runs (the median is reported)
+
+    Returns:
+        list: analizza results, sorted by total time
+    """
+    risultati = []
+    for _ in range(ripetizioni):
+        processo = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+            capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        if processo.returncode:
+            raise RuntimeError(f"import {modulo} fallito:\n{processo.stderr[-2000:]}")
+        risultati.append(analizza(leggi_importtime(processo.stderr), modulo))
+    return sorted(risultati, key=lambda r: r["totale_ms"])
+
+
+def importati_dall_app(modulo=MODULO, lazy=LAZY):
+    """
+    Find the lazy modules that app modules import while the entry module loads.
+
+    Args:
+        modulo (str, optional): Entry module
+        lazy (list, optional): Module names (a name also covers its submodules)
+
+    Returns:
+        list: (lazy module, importing app module) pairs
+    """
+    processo = subprocess.run(
+        [sys.executable, "-c", _TRACCIA.replace("{modulo}", modulo), json.dumps(lazy)],
+        capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    if processo.returncode:
+        raise RuntimeError(f"import {modulo} fallito:\n{processo.stderr[-2000:]}")
+    return [tuple(t) for t in json.loads(processo.stdout.splitlines()[-1])]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import-time budget of the app entry point")
+    parser.add_argument("--modulo", default=MODULO)
+    parser.add_argument("--ripetizioni", type=int, default=RIPETIZIONI)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    parser.add_argument("--budget-proprio-ms", type=float, default=BUDGET_PROPRIO_MS)
+    parser.add_argument("--top", type=int, default=TOP, help="slowest imports to list")
+    args = parser.parse_args(argv)
+
+    risultati = misura(args.modulo, args.ripetizioni)
+    mediana = risultati[len(risultati) // 2]
+    totale = mediana["totale_ms"]
+    proprio = statistics.median(r["proprio_ms"] for r in risultati)
+
+    print(f"import {args.modulo}: {args.ripetizioni} interpreti, mediana")
+    print("\nImport diretti di terze parti:")
+    for nome, ms in sorted(mediana["dirette"].items(), key=lambda v: -v[1]):
+        print(f"  {nome:<40} {ms:8.1f} ms")
+    print(f"\nPiù lenti (tempo proprio) su {len(mediana['moduli'])} moduli:")
+    lenti = sorted(mediana["moduli"].items(), key=lambda v: -v[1][0])[:args.top]
+    for nome, (ms_proprio, ms_cumulato) in lenti:
+        print(f"  {nome:<40} {ms_proprio:8.1f} ms  (cumulato {ms_cumulato:.1f} ms)")
+    print("\nModuli dell'app (cumulato):")
+    for nome, (_, ms_cumulato) in sorted(mediana["moduli"].items()):
+        if nome.startswith("src"):
+            print(f"  {nome:<40} {ms_cumulato:8.1f} ms")
+
+    esito = 0
+    print()
+    for etichetta, valore, budget in (("totale", totale, args.budget_ms), ("proprio", proprio, args.budget_proprio_ms)):
+        superato = valore > budget
+        esito |= superato
+        print(f"  {'OLTRE BUDGET' if superato else 'ok':<13} {etichetta:<8} {valore:8.1f} ms  (budget {budget:.0f} ms)")
+    caricati = {m: "dipendenza dell'app" for m in LAZY if m in mediana["dell_app"]}
+    for m, importatore in importati_dall_app(args.modulo):
+        caricati[m] = importatore
+    if caricati:
+        esito = 1
+        elenco = ", ".join(f"{m} ({da})" for m, da in sorted(caricati.items()))
+        print(f"  {'NON LAZY':<13} importati all'avvio: {elenco}")
+    return esito
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,360 @@
+"""
+Offline benchmark suite for the data, calendar and LLM layers.
+
+Every case runs on synthetic data in a temporary directory and reports
+the median wall time and the peak Python memory (tracemalloc) of one
+run. LLM cases talk to an in-process fake OpenRouter endpoint. Results
+are compared with benchmarks/baseline.json and regressions beyond the
+tolerance are flagged (exit status 1).
+
+Run from the repository root:
+
+    python -m benchmarks.suite                       # scala piccola, backend csv
+    python -m benchmarks.suite --scala media --storage sqlite
+    python -m benchmarks.suite --aggiorna-baseline   # record the current results
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+RIPETIZIONI = 5
+TOLLERANZA = 0.5  # Rallentamento relativo oltre cui si segnala una regressione
+SOGLIA_MS = 5.0  # Differenze assolute sotto questa soglia sono rumore
+SOGLIA_MB = 1.0
+GIORNI_STUDIO = 90
+OPERAZIONI = 100  # Aggiornamenti/append/eliminazioni per caso
+CHIAMATE_LLM = 20
+BATCH_LLM = 50
+PUNTEGGI_FILE = "punteggi_test.csv"
+STATO_FILE = "stato_argomenti.csv"
+
+
+def misura(funzione, ripetizioni=RIPETIZIONI, prepara=None):
+    """
+    Time a case and measure its peak memory.
+
+    Args:
+        funzione (callable): Case to measure
+        ripetizioni (int, optional): Timed runs (the median is reported)
+        prepara (callable, optional): Untimed setup before every run
+
+    Returns:
+        dict: "tempo_ms" and "picco_mb"
+    """
+    tempi = []
+    for _ in range(ripetizioni):
+        if prepara:
+            prepara()
+        inizio = time.perf_counter()
+        funzione()
+        tempi.append(time.perf_counter() - inizio)
+
+    # Memoria misurata su un'esecuzione separata: tracemalloc rallenta il codice
+    if prepara:
+        prepara()
+    tracemalloc.start()
+    try:
+        funzione()
+        _, picco = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"tempo_ms": round(statistics.median(tempi) * 1000, 2), "picco_mb": round(picco / 2**20, 2)}
+
+
+def casi_dati(argomenti_df, punteggi_df):
+    """
+    Build the data, state, calendar and history cases.
+
+    Must run inside the benchmark directory: the app modules resolve
+    their files relative to the working directory.
+
+    Args:
+        argomenti_df (pandas.DataFrame): Synthetic catalogue
+        punteggi_df (pandas.DataFrame): Synthetic score history
+
+    Returns:
+        list: (name, case, setup) tuples, run in order
+    """
+    from src.data.analytics import ScoreAnalytics
+    from src.data.loader import carica_argomenti, inizializza_punteggi, inizializza_stato_argomenti, salva_punteggio
+    from src.data.score_log import nuovo_id
+    from src.data.write_behind import WriteBehind, unita_di_lavoro
+    from src.utils.calendar import CalendarCache, genera_calendario_studio
+    from src.utils.state import aggiorna_stato_argomento, elimina_punteggi
+
+    argomenti_df.to_csv("argomenti_orali.csv", index=False)
+    punteggi_df.to_csv(PUNTEGGI_FILE, index=False)
+    argomenti = argomenti_df["Argomento"].tolist()
+    oggi = date.today()
+    stato = {}
+
+    def carica():
+        stato["argomenti"] = carica_argomenti()
+
+    def stato_argomenti():
+        stato["stato"] = inizializza_stato_argomenti(stato["argomenti"], STATO_FILE)
+
+    def aggiorna():
+        passo = max(1, len(argomenti) // OPERAZIONI)
+        for argomento in argomenti[::passo][:OPERAZIONI]:
+            stato["stato"] = aggiorna_stato_argomento(stato["stato"], argomento, "da ripassare", STATO_FILE)
+
+    def punteggi():
+        stato["punteggi"] = inizializza_punteggi(PUNTEGGI_FILE)
+
+    def salva():
+        for i in range(OPERAZIONI):
+            stato["punteggi"] = salva_punteggio(
+                stato["punteggi"], argomenti[i % len(argomenti)], i % 101, punteggi_df["Commento"].iat[i], PUNTEGGI_FILE
+            )
+
+    writer = WriteBehind()
+
+    def invio_test():
+        # Come submit_test_risposta: punteggio scritto subito, stato a fine rerun;
+        # ogni rerun attende le scritture del precedente e rilegge lo stato, come in app.py
+        for i in range(OPERAZIONI):
+            writer.attendi(STATO_FILE, PUNTEGGI_FILE)
+            stato["stato"] = inizializza_stato_argomenti(stato["argomenti"], STATO_FILE)
+            with unita_di_lavoro(writer):
+                stato["punteggi"] = salva_punteggio(
+                    stato["punteggi"], argomenti[i % len(argomenti)], i % 101, punteggi_df["Commento"].iat[i],
+                    PUNTEGGI_FILE
+                )
+                stato["stato"] = aggiorna_stato_argomento(
+                    stato["stato"], argomenti[i % len(argomenti)], "completato", STATO_FILE
+                )
+        writer.attendi()
+
+    def scegli_da_eliminare():
+        stato["ids"] = stato["punteggi"]["ID"].iloc[:OPERAZIONI].tolist()
+
+    def elimina():
+        stato["punteggi"] = elimina_punteggi(stato["punteggi"], stato["ids"], PUNTEGGI_FILE)
+
+    def calendario():
+        genera_calendario_studio(stato["argomenti"], GIORNI_STUDIO, oggi, stato["stato"], stato["punteggi"])
+
+    cache = CalendarCache()
+    versioni = (1, 1)  # Catalogo e stato invariati tra i rerun, come li passa app.py
+
+    def calendario_memo():
+        cache.calendario(stato["argomenti"], GIORNI_STUDIO, oggi, stato["stato"], stato["punteggi"], versioni)
+
+    def calendario_dopo_test():
+        # Un test salvato: lo scheduler in cache ripianifica solo quell'argomento
+        riga = {"ID": nuovo_id(), "Argomento": argomenti[0], "Punteggio": 80,
+                "Data": f"{oggi} 12:00:00", "Commento": ""}
+        cache.registra_punteggi([riga])
+        cache.calendario(stato["argomenti"], GIORNI_STUDIO, oggi, stato["stato"], stato["punteggi"], versioni)
+
+    def nuovo_snapshot():
+        shutil.rmtree("snapshot", ignore_errors=True)
+        stato["analytics"] = ScoreAnalytics(PUNTEGGI_FILE, directory="snapshot")
+
+    def snapshot():
+        stato["analytics"].sincronizza(stato["punteggi"])
+
+    filtro = argomenti[:5]
+
+    def storico():
+        analytics = stato["analytics"]
+        analytics.colonne(["Argomento", "Punteggio", "Data"])
+        analytics.argomenti()
+        analytics.pagina(25, 0)
+        analytics.pagina(25, 0, filtro, ordina_per="Punteggio")
+
+    return [
+        ("carica_argomenti", carica, None),
+        ("inizializza_stato_argomenti", stato_argomenti, None),
+        (f"aggiorna_stato_argomento x{OPERAZIONI}", aggiorna, None),
+        ("inizializza_punteggi", punteggi, None),
+        (f"salva_punteggio x{OPERAZIONI}", salva, None),
+        (f"invio test x{OPERAZIONI} (write-behind)", invio_test, None),
+        (f"elimina_punteggi {OPERAZIONI}", elimina, scegli_da_eliminare),
+        ("genera_calendario_studio", calendario, None),
+        ("calendario memoizzato", calendario_memo, None),
+        ("calendario dopo un test (patch)", calendario_dopo_test, None),
+        ("storico: snapshot", snapshot, nuovo_snapshot),
+        ("storico: aggregazioni e pagine", storico, None),
+    ]
+
+
+def casi_llm(url):
+    """
+    Build the LLM path cases against a fake endpoint.
+
+    Args:
+        url (str): chat/completions endpoint
+
+    Returns:
+        tuple: ((name, case, setup) tuples run in order, client to close)
+    """
+    from src.llm.api import _estrai_testo_sse, chiamata_llm
+    from src.llm.batch import LLMBatchEngine
+    from src.llm.client import LLMClient
+    from src.llm.ledger import LLMLedger
+
+    os.makedirs(".streamlit", exist_ok=True)
+    secrets = os.path.join(".streamlit", "secrets.toml")
+    with open(secrets, "w", encoding="utf-8") as f:
+        f.write('[openrouter_api_key]\nopenrouter_api_key = "bench"\nmodel = "bench/model"\n')
+    client = LLMClient(secrets, url=url)
+    ledger = LLMLedger(os.path.join("ledger", "llm_ledger.sqlite3"))
+    prompt = "Explain the main themes of Victorian literature. " * 20
+
+    def sincrone():
+        for _ in range(CHIAMATE_LLM):
+            chiamata_llm(prompt, client=client, tipo="bench")
+
+    def stream():
+        for _ in range(CHIAMATE_LLM):
+            payload = client.build_payload(prompt, stream=True)
+            with client.post(payload, stream=True) as response:
+                "".join(_estrai_testo_sse(response.iter_lines()))
+
+    def batch():
+        engine = LLMBatchEngine(client, concurrency=8, rpm=10**6, tpm=10**9, ledger=ledger)
+        client.run_async(engine.run([prompt] * BATCH_LLM))
+
+    return [
+        (f"llm: chiamata_llm x{CHIAMATE_LLM}", sincrone, None),
+        (f"llm: stream SSE x{CHIAMATE_LLM}", stream, None),
+        (f"llm: batch {BATCH_LLM}", batch, None),
+    ], client
+
+
+def confronta(risultati, baseline, tolleranza=TOLLERANZA):
+    """
+    Compare results with a baseline.
+
+    Args:
+        risultati (dict): Case name -> measurement
+        baseline (dict): Case name -> measurement
+        tolleranza (float, optional): Relative slowdown tolerated
+
+    Returns:
+        dict: Case name -> "REGRESSIONE", "migliorato", "ok" or "nuovo"
+    """
+    esiti = {}
+    for nome, valore in risultati.items():
+        base = baseline.get(nome)
+        if base is None:
+            esiti[nome] = "nuovo"
+            continue
+        delta_t = valore["tempo_ms"] - base["tempo_ms"]
+        delta_m = valore["picco_mb"] - base["picco_mb"]
+        if (delta_t > SOGLIA_MS and valore["tempo_ms"] > base["tempo_ms"] * (1 + tolleranza)) or \
+                (delta_m > SOGLIA_MB and valore["picco_mb"] > base["picco_mb"] * (1 + tolleranza)):
+            esiti[nome] = "REGRESSIONE"
+        elif -delta_t > SOGLIA_MS and valore["tempo_ms"] * (1 + tolleranza) < base["tempo_ms"]:
+            esiti[nome] = "migliorato"
+        else:
+            esiti[nome] = "ok"
+    return esiti
+
+
+def esegui(scala, ripetizioni=RIPETIZIONI, solo=None):
+    """
+    Run the suite in a temporary directory.
+
+    Args:
+        scala (str): Key of SCALE
+        ripetizioni (int, optional): Timed runs per case
+        solo (str, optional): Only measure cases whose name contains this text
+
+    Returns:
+        dict: Case name -> measurement
+    """
+    from benchmarks.dati import SCALE, genera_argomenti, genera_punteggi
+    from benchmarks.fake_openrouter import FakeOpenRouter
+
+    n_argomenti, n_punteggi = SCALE[scala]
+    argomenti_df = genera_argomenti(n_argomenti)
+    punteggi_df = genera_punteggi(n_punteggi, argomenti_df["Argomento"].tolist())
+
+    cartella = os.getcwd()
+    tmp = tempfile.mkdtemp(prefix="bench_dashboard_")
+    risultati = {}
+    try:
+        os.chdir(tmp)
+        with FakeOpenRouter() as server:
+            casi = casi_dati(argomenti_df, punteggi_df)
+            llm, client = casi_llm(server.url)
+            try:
+                for nome, funzione, prepara in casi + llm:
+                    if solo and solo not in nome:
+                        # I casi preparano lo stato dei successivi: eseguilo senza misurarlo
+                        if prepara:
+                            prepara()
+                        funzione()
+                        continue
+                    risultati[nome] = misura(funzione, ripetizioni, prepara)
+                    print(f"  {nome:<36} {risultati[nome]['tempo_ms']:>10.1f} ms {risultati[nome]['picco_mb']:>9.1f} MB")
+            finally:
+                client.close()
+    finally:
+        os.chdir(cartella)
+        shutil.rmtree(tmp, ignore_errors=True)
+    return risultati
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dashboard Studio benchmark suite")
+    parser.add_argument("--scala", default="piccola", choices=["piccola", "media", "grande"])
+    parser.add_argument("--storage", default="csv", choices=["csv", "sqlite"])
+    parser.add_argument("--ripetizioni", type=int, default=RIPETIZIONI)
+    parser.add_argument("--solo", help="only measure cases whose name contains this text")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--tolleranza", type=float, default=TOLLERANZA)
+    parser.add_argument("--aggiorna-baseline", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    # Il backend è letto all'import di src.data.storage
+    os.environ["DASHBOARD_STORAGE"] = args.storage
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Fuori da `streamlit run` ogni st.* avvisa della ScriptRunContext mancante
+    logging.disable(logging.WARNING)
+
+    chiave = f"{args.scala}/{args.storage}"
+    print(f"Benchmark {chiave}")
+    risultati = esegui(args.scala, args.ripetizioni, args.solo)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.aggiorna_baseline:
+        baseline[chiave] = dict(baseline.get(chiave, {}), **risultati)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline aggiornata: {args.baseline} [{chiave}]")
+        return 0
+
+    esiti = confronta(risultati, baseline.get(chiave, {}), args.tolleranza)
+    print(f"\nConfronto con la baseline [{chiave}] (tolleranza {args.tolleranza:.0%}):")
+    for nome, esito in esiti.items():
+        attuale, base = risultati[nome], baseline.get(chiave, {}).get(nome)
+        riferimento = f"(baseline {base['tempo_ms']:.1f} ms, {base['picco_mb']:.1f} MB)" if base else ""
+        print(f"  {esito:<12} {nome:<36} {attuale['tempo_ms']:>10.1f} ms {attuale['picco_mb']:>7.1f} MB  {riferimento}")
+    regressioni = [n for n, e in esiti.items() if e == "REGRESSIONE"]
+    if regressioni:
+        print(f"\n{len(regressioni)} regressioni")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
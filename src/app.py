@@ -12,9 +12,19 @@ import os
 from datetime import datetime, timedelta
 
 # Import modules
-from src.data.loader import carica_argomenti, inizializza_punteggi, inizializza_stato_argomenti
-from src.utils.calendar import genera_calendario_studio
+from src.data.loader import (
+    ARGOMENTI_FILE, carica_argomenti, get_versioni_dati, inizializza_punteggi, inizializza_stato_argomenti
+)
+from src.data.chat_history import ChatHistory, session_id
+from src.data.storage import DB_FILE, file_partizione, file_utente, utente_corrente
+from src.data.write_behind import get_write_behind, unita_di_lavoro
+from src.utils.calendar import get_calendar_cache, argomenti_in_programma
+from src.llm.cache import get_llm_cache
+from src.llm.prefetch import get_lesson_prefetcher
 from src.ui.pages import main_layout
+from src.utils.profiling import (
+    RerunProfiler, CPROFILE_LENTI, get_profile_archive, mostra_profilo, profilo_richiesto
+)
 
 # === PARAMETRI STUDIO ===
 st.set_page_config(page_title="Studio Orale AS2B", layout="wide")
@@ -26,35 +36,107 @@ PUNTEGGI_FILE = "punteggi_test.csv"
 
 def main():
     """Main application entry point."""
-    # Initialize session state for chat log
+    # Profiling opzionale (DASHBOARD_PROFILE=1 o ?profile=1)
+    profiler = RerunProfiler(profilo_richiesto(st.query_params), cprofile=CPROFILE_LENTI > 0)
+    profiler.inizia()
+    completato = False
+    try:
+        # Le scritture del rerun vengono raccolte e scritte in background alla fine
+        with unita_di_lavoro(get_write_behind(), session_id(st.query_params)):
+            esegui_rerun(profiler)
+        completato = True
+    finally:
+        # Eseguito anche quando st.rerun() interrompe lo script
+        traccia = profiler.termina(get_profile_archive())
+    if completato and traccia:
+        mostra_profilo(profiler, traccia)
+
+def esegui_rerun(profiler):
+    """
+    Run one rerun of the application.
+
+    Args:
+        profiler (RerunProfiler): Stage timer of this rerun
+    """
+    # Chat history of this session, restored from disk via the "sid" query param
     if "chat_log" not in st.session_state:
-        st.session_state.chat_log = []
+        with profiler.fase("chat_history"):
+            st.session_state.chat_log = ChatHistory(session_id(st.query_params))
+    
+    # Data partition of this session ("utente" query param)
+    utente = utente_corrente(st.query_params)
+    stato_file = file_utente(utente, STATO_FILE)
+    punteggi_file = file_utente(utente, PUNTEGGI_FILE)
+    if st.session_state.get("utente") != utente:
+        # I punteggi in sessione appartengono alla partizione precedente
+        st.session_state.pop("punteggi_df", None)
+        st.session_state.utente = utente
+    st.sidebar.caption(f"Profilo: {utente}")
+    
+    # Le scritture differite dei rerun precedenti devono essere su disco prima di leggere
+    writer = get_write_behind()
+    with profiler.fase("scritture_in_sospeso"):
+        writer.attendi(stato_file, punteggi_file, file_partizione(punteggi_file, DB_FILE))
+    errore = writer.errore_sessione(session_id(st.query_params))
+    if errore:
+        st.sidebar.error(f"⚠️ Salvataggio non riuscito, nuovo tentativo in corso: {errore}")
     
     # Load data with caching
-    argomenti_df = carica_argomenti()
-    stato_argomenti_df = inizializza_stato_argomenti(argomenti_df, STATO_FILE)
-    punteggi_df = inizializza_punteggi(PUNTEGGI_FILE)
-    
-    # Generate study calendar
-    calendario_studio = genera_calendario_studio(
-        argomenti_df, 
-        GIORNI_STUDIO, 
-        OGGI, 
-        stato_argomenti_df
+    with profiler.fase("carica_argomenti"):
+        argomenti_df = carica_argomenti()
+    with profiler.fase("inizializza_stato_argomenti"):
+        stato_argomenti_df = inizializza_stato_argomenti(argomenti_df, stato_file)
+    with profiler.fase("inizializza_punteggi"):
+        punteggi_df = inizializza_punteggi(punteggi_file)
+    
+    # Study calendar: rebuilt only when catalogue or date change, patched for scores and states
+    with profiler.fase("calendario"):
+        calendario_cache = get_calendar_cache(punteggi_file)
+        versioni_dati = get_versioni_dati()
+        calendario_studio = calendario_cache.calendario(
+            argomenti_df, 
+            GIORNI_STUDIO, 
+            OGGI, 
+            stato_argomenti_df,
+            punteggi_df,
+            versioni=(versioni_dati.versione(ARGOMENTI_FILE), versioni_dati.versione(stato_file))
+        )
+    
+    stats = calendario_cache.stats()
+    st.sidebar.caption(
+        f"Calendario: {stats['riusi']} riutilizzi, {stats['aggiornamenti']} aggiornamenti parziali, "
+        f"{stats['ricostruzioni']} ricostruzioni"
+    )
+    scritture = writer.statistiche()
+    st.sidebar.caption(
+        f"Scritture: {scritture['richieste']} richieste, {scritture['scritture']} eseguite "
+        f"({scritture['risparmiate']} risparmiate), {scritture['errori']} errori"
+    )
+    cache_llm = get_llm_cache().stats()
+    st.sidebar.caption(
+        f"Cache LLM: {cache_llm['hits']} hit, {cache_llm['misses']} miss "
+        f"({cache_llm['hit_rate']:.0%}), {cache_llm['entries']} risposte"
     )
     
+    # Prepare today's and tomorrow's lessons in the background
+    with profiler.fase("prefetch_lezioni"):
+        get_lesson_prefetcher().prefetch(
+            argomenti_in_programma(calendario_studio, [OGGI, OGGI + timedelta(days=1)])
+        )
+    
     # Render main layout
-    stato_argomenti_df, punteggi_df, chat_log = main_layout(
-        argomenti_df,
-        stato_argomenti_df,
-        punteggi_df,
-        calendario_studio,
-        OGGI,
-        DATA_ESAME,
-        STATO_FILE,
-        PUNTEGGI_FILE,
-        st.session_state.chat_log
-    )
+    with profiler.fase("main_layout"):
+        stato_argomenti_df, punteggi_df, chat_log = main_layout(
+            argomenti_df,
+            stato_argomenti_df,
+            punteggi_df,
+            calendario_studio,
+            OGGI,
+            DATA_ESAME,
+            stato_file,
+            punteggi_file,
+            st.session_state.chat_log
+        )
     
     # Update session state
     st.session_state.chat_log = chat_log
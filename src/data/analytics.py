@@ -0,0 +1,211 @@
+"""
+Columnar snapshot of the score history for analytics.
+
+The history is written as uncompressed Arrow IPC files that can be
+memory-mapped: one file with the typed analytic columns (timestamp,
+integer score, topic, id) sorted by date, and a separate file with the
+long LLM commentary, so charts and metrics never load the comments nor
+re-parse date strings.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import streamlit as st
+
+from src.data.score_log import firma_punteggi
+
+SNAPSHOT_DIR = ".cache"
+
+SCHEMA_STORICO = pa.schema([
+    ("ID", pa.string()),
+    ("Argomento", pa.dictionary(pa.int32(), pa.string())),
+    ("Punteggio", pa.int32()),
+    ("Data", pa.timestamp("s")),
+])
+SCHEMA_COMMENTI = pa.schema([
+    ("ID", pa.string()),
+    ("Commento", pa.large_string()),
+])
+
+
+def _scrivi_atomico(tabella, path):
+    """Write an Arrow IPC file through a temporary file unique to the writer."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, tabella.schema) as writer:
+            writer.write_table(tabella)
+    os.replace(tmp, path)
+
+
+class ScoreAnalytics:
+    """
+    Memory-mapped columnar view of the score history.
+    """
+
+    def __init__(self, punteggi_file, directory=SNAPSHOT_DIR):
+        """
+        Args:
+            punteggi_file (str): Path to scores file (its path names the snapshot,
+                so every user partition gets its own)
+            directory (str, optional): Snapshot directory
+        """
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        nome = os.path.splitext(os.path.normpath(punteggi_file))[0].replace(os.sep, "_")
+        self.storico_file = os.path.join(directory, f"{nome}.storico.arrow")
+        self.commenti_file = os.path.join(directory, f"{nome}.commenti.arrow")
+        self._lock = threading.Lock()
+        self._firma = None
+        self._tabella = None
+        self._date = None
+
+    def _leggi_firma(self):
+        """Read the fingerprint stored in the snapshot metadata."""
+        if not os.path.exists(self.storico_file):
+            return None
+        with pa.memory_map(self.storico_file) as source:
+            metadata = pa.ipc.open_file(source).schema.metadata or {}
+        return metadata.get(b"firma", b"").decode()
+
+    def _scrivi(self, punteggi_df, firma):
+        """Build both snapshot files from a scores DataFrame."""
+        df = pd.DataFrame({
+            "ID": punteggi_df["ID"].astype(str),
+            "Argomento": punteggi_df["Argomento"].astype(str),
+            "Punteggio": pd.to_numeric(punteggi_df["Punteggio"], errors="coerce").fillna(0).astype("int32"),
+            # Unico punto in cui le date vengono interpretate
+            "Data": pd.to_datetime(punteggi_df["Data"], errors="coerce").astype("datetime64[s]"),
+            "Commento": punteggi_df["Commento"].astype(str),
+        }).sort_values("Data", kind="stable")
+
+        # Un file IPC ammette un solo dizionario per colonna: unifica quelli dei vari chunk
+        storico = pa.Table.from_pandas(
+            df[["ID", "Argomento", "Punteggio", "Data"]], schema=SCHEMA_STORICO, preserve_index=False
+        ).unify_dictionaries().combine_chunks().replace_schema_metadata({"firma": firma})
+        commenti = pa.Table.from_pandas(df[["ID", "Commento"]], schema=SCHEMA_COMMENTI, preserve_index=False)
+        _scrivi_atomico(commenti, self.commenti_file)
+        _scrivi_atomico(storico, self.storico_file)
+
+    def sincronizza(self, punteggi_df):
+        """
+        Rebuild the snapshot if the scores changed since it was written.
+
+        Args:
+            punteggi_df (pandas.DataFrame): DataFrame containing scores
+        """
+        firma = firma_punteggi(punteggi_df)
+        with self._lock:
+            if firma == self._firma:
+                return
+            if self._leggi_firma() != firma:
+                self._scrivi(punteggi_df, firma)
+            self._firma = firma
+            # Mappa il file aggiornato in memoria (zero-copy)
+            self._tabella = pa.ipc.open_file(pa.memory_map(self.storico_file)).read_all()
+            # Date ordinate come interi: i filtri per intervallo sono ricerche binarie
+            # (le date mancanti, in fondo allo snapshot, restano in fondo)
+            self._date = pc.fill_null(self._tabella["Data"].cast(pa.int64()), np.iinfo(np.int64).max).to_numpy()
+
+    def colonne(self, nomi):
+        """
+        Read only the requested analytic columns, sorted by date.
+
+        Args:
+            nomi (list): Column names among ID, Argomento, Punteggio, Data
+
+        Returns:
+            pandas.DataFrame: Selected columns
+        """
+        if self._tabella is None:
+            return pd.DataFrame(columns=nomi)
+        return self._tabella.select(nomi).to_pandas()
+
+    def argomenti(self):
+        """
+        List the topics present in the history.
+
+        Returns:
+            list: Topic names, sorted
+        """
+        if self._tabella is None:
+            return []
+        return sorted(pc.unique(self._tabella["Argomento"].combine_chunks().dictionary).to_pylist())
+
+    def pagina(self, limite, offset=0, argomenti=None, dal=None, al=None, ordina_per="Data", discendente=True):
+        """
+        Query one page of the history.
+
+        The date range is resolved with a binary search on the date-sorted
+        snapshot and the topic filter on the dictionary-encoded column;
+        only the rows of the requested page are converted to pandas.
+
+        Args:
+            limite (int): Page size
+            offset (int, optional): Rows to skip
+            argomenti (list, optional): Keep only these topics
+            dal (datetime.date, optional): First day included
+            al (datetime.date, optional): Last day included
+            ordina_per (str, optional): "Data", "Punteggio" or "Argomento"
+            discendente (bool, optional): Descending order
+
+        Returns:
+            tuple: (page with ID, Argomento, Punteggio, Data; number of matching rows)
+        """
+        colonne = ["ID", "Argomento", "Punteggio", "Data"]
+        if self._tabella is None:
+            return pd.DataFrame(columns=colonne), 0
+        inizio, fine = 0, len(self._date)
+        if dal is not None:
+            inizio = int(np.searchsorted(self._date, pd.Timestamp(dal).value // 10**9, side="left"))
+        if al is not None:
+            fine = int(np.searchsorted(self._date, (pd.Timestamp(al) + pd.Timedelta(days=1)).value // 10**9, side="left"))
+        tabella = self._tabella.slice(inizio, max(0, fine - inizio))
+        if argomenti:
+            tabella = tabella.filter(pc.is_in(tabella["Argomento"].cast(pa.string()), value_set=pa.array(argomenti)))
+        totale = tabella.num_rows
+        if ordina_per == "Data":
+            # Lo snapshot è già ordinato per data
+            indici = np.arange(totale)[::-1] if discendente else np.arange(totale)
+        else:
+            chiave = tabella[ordina_per].cast(pa.string()) if ordina_per == "Argomento" else tabella[ordina_per]
+            indici = pc.sort_indices(
+                pa.table({"k": chiave}), sort_keys=[("k", "descending" if discendente else "ascending")]
+            ).to_numpy()
+        return tabella.take(indici[offset:offset + limite]).select(colonne).to_pandas(), totale
+
+    def commento(self, id_punteggio):
+        """
+        Look up the commentary of a single score.
+
+        Args:
+            id_punteggio (str): Score id
+
+        Returns:
+            str or None: Comment
+        """
+        if not os.path.exists(self.commenti_file):
+            return None
+        with pa.memory_map(self.commenti_file) as source:
+            tabella = pa.ipc.open_file(source).read_all()
+        mask = pc.equal(tabella["ID"], id_punteggio)
+        trovati = tabella.filter(mask)["Commento"]
+        return trovati[0].as_py() if len(trovati) else None
+
+
+@st.cache_resource(show_spinner=False)
+def get_score_analytics(punteggi_file):
+    """
+    Return the process-wide columnar view of a scores file.
+
+    Args:
+        punteggi_file (str): Path to scores file
+
+    Returns:
+        ScoreAnalytics: Shared analytics view
+    """
+    return ScoreAnalytics(punteggi_file)
@@ -0,0 +1,184 @@
+"""
+Bounded, disk-backed chat history for the Dashboard Studio application.
+
+Only the most recent turns are kept in memory (a ring buffer). Every
+turn is also appended, with its index, to a small per-session journal;
+when the journal holds a full segment it is compressed into a numbered
+gzip segment and truncated. Journal turns whose index is already in a
+segment (a crash between the two steps) are skipped when reading. Older
+turns are paged back from the segments on demand, and the whole history
+survives restarts as long as the session id (the "sid" query parameter)
+is kept. The rolling summary of the older turns (src/llm/context.py) is
+stored next to them, so a restart does not summarise the history again.
+"""
+
+import gzip
+import json
+import os
+import re
+import uuid
+from collections import deque
+
+CHAT_DIR = os.path.join(".cache", "chat")
+CAPACITA = 20  # Turni tenuti in memoria
+SEGMENTO = 50  # Turni per segmento compresso
+
+
+def session_id(query_params):
+    """
+    Get the chat session id from the query parameters, creating one if needed.
+
+    Args:
+        query_params (streamlit.runtime.state.QueryParamsProxy): st.query_params
+
+    Returns:
+        str: Session id
+    """
+    sid = query_params.get("sid", "")
+    if not re.fullmatch(r"[0-9a-f]{32}", sid):
+        sid = uuid.uuid4().hex
+        query_params["sid"] = sid
+    return sid
+
+
+class ChatHistory:
+    """
+    Chat turns ({"utente": ..., "llm": ...}) of one session.
+
+    Supports append() and len() like the plain list it replaces.
+    """
+
+    def __init__(self, sid, directory=CHAT_DIR, capacita=CAPACITA, segmento=SEGMENTO):
+        """
+        Args:
+            sid (str): Session id
+            directory (str, optional): Root directory of the chat logs
+            capacita (int, optional): Turns kept in memory
+            segmento (int, optional): Turns per compressed segment
+        """
+        self.directory = os.path.join(directory, sid)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        self.segmento = segmento
+        self.journal = os.path.join(self.directory, "corrente.jsonl")
+        self.file_riassunto = os.path.join(self.directory, "riassunto.json")
+        self._segmenti = sum(1 for f in os.listdir(self.directory) if f.endswith(".jsonl.gz"))
+        correnti = self._leggi_journal()
+        self._totale = self._segmenti * segmento + len(correnti)
+        self._recenti = deque(maxlen=capacita)
+        for turno in self.intervallo(max(0, self._totale - capacita), self._totale):
+            self._recenti.append(turno)
+        self._riassunto = ("", 0)
+        if os.path.exists(self.file_riassunto):
+            try:
+                with open(self.file_riassunto, "r", encoding="utf-8") as f:
+                    voce = json.load(f)
+                self._riassunto = (voce["testo"], voce["fino_a"])
+            except (ValueError, KeyError):
+                pass
+
+    def __len__(self):
+        return self._totale
+
+    def _path_segmento(self, numero):
+        return os.path.join(self.directory, f"{numero:06d}.jsonl.gz")
+
+    def _leggi_journal(self):
+        """Read the turns of the open segment, skipping a torn last line."""
+        if not os.path.exists(self.journal):
+            return []
+        base = self._segmenti * self.segmento
+        turni = []
+        with open(self.journal, "r", encoding="utf-8") as f:
+            for riga in f:
+                try:
+                    voce = json.loads(riga)
+                except ValueError:
+                    continue
+                if voce["n"] >= base:
+                    turni.append(voce["turno"])
+                # Altrimenti il turno è già in un segmento: il journal non è stato svuotato
+        return turni[:self.segmento]
+
+    def _leggi_segmento(self, numero):
+        with gzip.open(self._path_segmento(numero), "rt", encoding="utf-8") as f:
+            return [json.loads(riga) for riga in f]
+
+    def append(self, turno):
+        """
+        Record a turn.
+
+        Args:
+            turno (dict): Turn with "utente" and "llm"
+        """
+        with open(self.journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"n": self._totale, "turno": turno}, ensure_ascii=False) + "\n")
+        self._recenti.append(turno)
+        self._totale += 1
+        if self._totale - self._segmenti * self.segmento >= self.segmento:
+            # Journal pieno: comprimilo in un nuovo segmento e svuotalo
+            path = self._path_segmento(self._segmenti)
+            with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as f:
+                for t in self._leggi_journal():
+                    f.write(json.dumps(t, ensure_ascii=False) + "\n")
+            os.replace(f"{path}.tmp", path)
+            open(self.journal, "w").close()
+            self._segmenti += 1
+
+    def riassunto(self):
+        """
+        Get the stored rolling summary.
+
+        Returns:
+            tuple: (summary text, index of the first turn it does not cover)
+        """
+        return self._riassunto
+
+    def salva_riassunto(self, testo, fino_a):
+        """
+        Store the rolling summary.
+
+        Args:
+            testo (str): Summary text
+            fino_a (int): Index of the first turn the summary does not cover
+        """
+        with open(f"{self.file_riassunto}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"testo": testo, "fino_a": fino_a}, f, ensure_ascii=False)
+        os.replace(f"{self.file_riassunto}.tmp", self.file_riassunto)
+        self._riassunto = (testo, fino_a)
+
+    def recenti(self):
+        """
+        Get the turns kept in memory, oldest first.
+
+        Returns:
+            list: Turns
+        """
+        return list(self._recenti)
+
+    def intervallo(self, inizio, fine):
+        """
+        Get the turns with index in [inizio, fine), oldest first.
+
+        Turns still in memory are served from the ring buffer; older ones
+        are read from the segments that contain them.
+
+        Args:
+            inizio (int): First turn index
+            fine (int): End turn index (excluded)
+
+        Returns:
+            list: Turns
+        """
+        inizio, fine = max(0, inizio), min(fine, self._totale)
+        if inizio >= fine:
+            return []
+        primo_in_memoria = self._totale - len(self._recenti)
+        if inizio >= primo_in_memoria:
+            return list(self._recenti)[inizio - primo_in_memoria:fine - primo_in_memoria]
+        turni = []
+        for numero in range(inizio // self.segmento, (fine - 1) // self.segmento + 1):
+            base = numero * self.segmento
+            blocco = self._leggi_segmento(numero) if numero < self._segmenti else self._leggi_journal()
+            turni.extend(blocco[max(0, inizio - base):fine - base])
+        return turni
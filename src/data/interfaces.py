@@ -0,0 +1,84 @@
+"""
+Storage interfaces for topic state and scores.
+
+The backends live in src/data/storage.py (CSV state, SQLite) and
+src/data/score_log.py (CSV score log); this module has no dependencies so
+that every backend can subclass the interfaces.
+"""
+
+from abc import ABC, abstractmethod
+
+
+class StateStore(ABC):
+    """
+    Interface of topic state storage.
+    """
+
+    @abstractmethod
+    def load(self, argomenti):
+        """
+        Load the state of every topic, adding missing topics as "non iniziato".
+
+        Args:
+            argomenti (list): Topic names of the catalogue
+
+        Returns:
+            pandas.DataFrame: DataFrame with "Argomento" and "Stato"
+        """
+
+    def update(self, stato_argomenti_df, argomenti, nuovo_stato):
+        """
+        Persist a state change already applied to the DataFrame.
+
+        Args:
+            stato_argomenti_df (pandas.DataFrame): Updated topics state
+            argomenti (list): Changed topic names
+            nuovo_stato (str): New state
+        """
+        self.update_many(stato_argomenti_df, {argomento: nuovo_stato for argomento in argomenti})
+
+    @abstractmethod
+    def update_many(self, stato_argomenti_df, modifiche):
+        """
+        Persist several state changes, already applied to the DataFrame, with one write.
+
+        Args:
+            stato_argomenti_df (pandas.DataFrame): Updated topics state
+            modifiche (dict): New state of each changed topic
+        """
+
+
+class ScoreStore(ABC):
+    """
+    Interface of score storage.
+    """
+
+    @abstractmethod
+    def load(self):
+        """
+        Load every score.
+
+        Returns:
+            pandas.DataFrame: DataFrame with the COLONNE columns
+        """
+
+    @abstractmethod
+    def append(self, righe):
+        """
+        Record new scores.
+
+        Args:
+            righe (list): Dicts with "Argomento", "Punteggio", "Data", "Commento"
+
+        Returns:
+            list: The recorded rows, each with its "ID"
+        """
+
+    @abstractmethod
+    def delete(self, ids):
+        """
+        Delete scores by id.
+
+        Args:
+            ids (list): Score ids
+        """
@@ -2,10 +2,84 @@
 Data loading and initialization module for the Dashboard Studio application.
 """
 
-import os
+import threading
+
 import pandas as pd
 import streamlit as st
 
+from src.data.locking import versione_file
+from src.data.score_log import COLONNE
+from src.data.storage import get_score_store, get_state_store
+from src.data.write_behind import unita_corrente
+from src.utils.calendar import get_calendar_cache
+
+ARGOMENTI_FILE = "argomenti_orali.csv"
+
+class VersioniDati:
+    """
+    Process-wide version counters of the loaded data.
+    
+    A counter goes up when the loader sees a new version of its source
+    (file or database token) or when a writer changes the data in place,
+    so memos derived from the data can check one integer instead of
+    hashing or scanning the DataFrames on every rerun.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versioni = {}
+        self._sorgenti = {}
+    
+    def osserva(self, chiave, sorgente):
+        """
+        Record the source version seen by a load.
+        
+        Args:
+            chiave (str): Data key (file path)
+            sorgente: Version token of the source, None if unknown
+            
+        Returns:
+            int: Current counter
+        """
+        with self._lock:
+            if sorgente is None or self._sorgenti.get(chiave) != sorgente:
+                self._sorgenti[chiave] = sorgente
+                self._versioni[chiave] = self._versioni.get(chiave, 0) + 1
+            return self._versioni[chiave]
+    
+    def incrementa(self, chiave):
+        """
+        Mark the data as changed by a writer.
+        
+        Args:
+            chiave (str): Data key (file path)
+        """
+        with self._lock:
+            self._versioni[chiave] = self._versioni.get(chiave, 0) + 1
+    
+    def versione(self, chiave):
+        """
+        Get the current counter.
+        
+        Args:
+            chiave (str): Data key (file path)
+            
+        Returns:
+            int: Counter, 0 if the data was never loaded
+        """
+        with self._lock:
+            return self._versioni.get(chiave, 0)
+
+@st.cache_resource(show_spinner=False)
+def get_versioni_dati():
+    """
+    Return the process-wide data version counters.
+    
+    Returns:
+        VersioniDati: Shared counters
+    """
+    return VersioniDati()
+
 def carica_argomenti():
     """
     Load topics from CSV file.
@@ -13,25 +87,24 @@ def carica_argomenti():
     Returns:
         pandas.DataFrame: DataFrame containing topics
     """
-    df = pd.read_csv("argomenti_orali.csv")
+    versione = versione_file(ARGOMENTI_FILE)
+    df = pd.read_csv(ARGOMENTI_FILE)
+    get_versioni_dati().osserva(ARGOMENTI_FILE, versione)
     return df
 
 def inizializza_punteggi(punteggi_file):
     """
     Initialize scores DataFrame.
     
+    Scores come from the configured storage backend.
+    
     Args:
         punteggi_file (str): Path to scores file
         
     Returns:
         pandas.DataFrame: DataFrame containing scores
     """
-    if not os.path.exists(punteggi_file):
-        punteggi_df = pd.DataFrame(columns=["Argomento", "Punteggio", "Data", "Commento"])
-        punteggi_df.to_csv(punteggi_file, index=False)
-    else:
-        punteggi_df = pd.read_csv(punteggi_file)
-    return punteggi_df
+    return get_score_store(punteggi_file).load()
 
 def inizializza_stato_argomenti(df, stato_file):
     """
@@ -44,20 +117,8 @@ def inizializza_stato_argomenti(df, stato_file):
     Returns:
         pandas.DataFrame: DataFrame containing topics state
     """
-    if not os.path.exists(stato_file):
-        stato_df = pd.DataFrame({"Argomento": df["Argomento"], "Stato": "non iniziato"})
-        stato_df.to_csv(stato_file, index=False)
-    else:
-        stato_df = pd.read_csv(stato_file)
-        # Add any new topics that are not in the state file
-        new_topics = df[~df["Argomento"].isin(stato_df["Argomento"])]
-        if not new_topics.empty:
-            new_rows = pd.DataFrame({
-                "Argomento": new_topics["Argomento"],
-                "Stato": "non iniziato"
-            })
-            stato_df = pd.concat([stato_df, new_rows], ignore_index=True)
-            stato_df.to_csv(stato_file, index=False)
+    stato_df = get_state_store(stato_file).load(df["Argomento"].tolist())
+    get_versioni_dati().osserva(stato_file, stato_df.attrs.get("versione"))
     return stato_df
 
 def salva_punteggio(punteggi_df, argomento, punteggio, commento, punteggi_file):
@@ -76,13 +137,41 @@ def salva_punteggio(punteggi_df, argomento, punteggio, commento, punteggi_file):
     """
     from datetime import datetime
     
-    nuova_riga = pd.DataFrame({
-        "Argomento": [argomento],
-        "Punteggio": [punteggio],
-        "Data": [datetime.now().strftime("%Y-%m-%d %H:%M:%S")],
-        "Commento": [commento]
-    })
+    # Una riga nel log append-only, scritta subito: il toast conferma un punteggio già su disco
+    registrate = unita_corrente().aggiungi_punteggi(punteggi_file, [{
+        "Argomento": argomento,
+        "Punteggio": punteggio,
+        "Data": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "Commento": commento
+    }])
+    nuova_riga = pd.DataFrame(registrate, columns=COLONNE)
     punteggi_df = pd.concat([punteggi_df, nuova_riga], ignore_index=True)
-    punteggi_df.to_csv(punteggi_file, index=False)
+    # Ripianifica solo l'argomento testato nel calendario della partizione
+    get_calendar_cache(punteggi_file).registra_punteggi(registrate, punteggi_df)
     st.toast(f"✅ Punteggio salvato: {argomento} → {punteggio}/10")
     return punteggi_df
+
+def salva_punteggi(punteggi_df, righe, punteggi_file):
+    """
+    Save several scores with a single write.
+    
+    Args:
+        punteggi_df (pandas.DataFrame): DataFrame containing scores
+        righe (list): List of dicts with "Argomento", "Punteggio" and "Commento"
+        punteggi_file (str): Path to scores file
+        
+    Returns:
+        pandas.DataFrame: Updated DataFrame containing scores
+    """
+    from datetime import datetime
+    
+    if not righe:
+        return punteggi_df
+    
+    data = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    registrate = unita_corrente().aggiungi_punteggi(punteggi_file, [dict(r, Data=data) for r in righe])
+    nuove_righe = pd.DataFrame(registrate, columns=COLONNE)
+    punteggi_df = pd.concat([punteggi_df, nuove_righe], ignore_index=True)
+    get_calendar_cache(punteggi_file).registra_punteggi(registrate, punteggi_df)
+    st.toast(f"✅ {len(righe)} punteggi salvati")
+    return punteggi_df
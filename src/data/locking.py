@@ -0,0 +1,104 @@
+"""
+Inter-process file locks and atomic writes for the storage layer.
+
+Streamlit serves every session from threads of one process, and several
+server processes may share the same data directory: writers of a data
+file take an exclusive lock on a sidecar ".lock" file, replace the data
+file through a temporary file plus rename, and detect concurrent writers
+by comparing file versions.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def blocco_file(path, condiviso=False):
+    """
+    Hold an inter-process lock on a data file.
+
+    Every acquisition opens its own descriptor, so the lock also excludes
+    other threads of the same process.
+
+    Args:
+        path (str): Data file to lock (the lock lives in "<path>.lock")
+        condiviso (bool, optional): Shared (read) lock instead of exclusive.
+            Windows only has exclusive locks.
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_SH if condiviso else fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK rinuncia dopo 10 secondi: riprova
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is None:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    finally:
+        # Chiudere il descrittore rilascia il lock flock
+        os.close(fd)
+
+
+def scrivi_atomico(path, scrivi):
+    """
+    Replace a text file atomically.
+
+    The content goes to a temporary file unique to the writer, is fsync'd
+    and renamed over the target, so readers see either the old or the
+    new file, never a partial one.
+
+    Args:
+        path (str): Target file
+        scrivi (callable): Receives the open temporary file and writes the content
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            scrivi(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def versione_file(path):
+    """
+    Version token of a file.
+
+    Atomic replacement gives the file a new inode, so the token changes
+    on every write even within the mtime resolution.
+
+    Args:
+        path (str): File path
+
+    Returns:
+        tuple or None: (inode, mtime_ns, size), None if the file does not exist
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
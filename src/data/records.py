@@ -0,0 +1,353 @@
+"""
+Structured test records for the Dashboard Studio application.
+
+Each test is one row of the test_record table, in the same SQLite
+database used by the storage layer: question and model answer are
+inserted when the test starts, the user answer and the grading are
+single-row updates, and the record links to its score by id. The
+changes of a rerun share one transaction (src/data/write_behind.py).
+Legacy text files in temp_test_files are imported once.
+
+The table doubles as the manifest of the detailed history (topic,
+timestamp, score id, byte size): the history lists the manifest and
+loads bodies one record at a time. Bodies of old records are moved into
+monthly gzip segments, leaving only their manifest row in the table.
+"""
+
+import gzip
+import json
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from src.data.storage import DB_FILE, _get_database, file_partizione
+from src.data.write_behind import unita_corrente
+
+TEMP_DIR = "temp_test_files"
+ARCHIVIO_DIR = os.path.join(".cache", "archivio_test")
+ARCHIVIA_DOPO_GIORNI = 90
+CORPO = ["domanda", "risposta_modello", "risposta_utente", "valutazione"]
+MANIFESTO = ["id", "argomento", "creato", "punteggio", "punteggio_id", "dimensione", "segmento"]
+# Dimensione in byte del corpo, ricalcolata a ogni scrittura
+_DIMENSIONE = "length(CAST(%s AS BLOB))" % " || ".join(f"coalesce({c}, '')" for c in CORPO)
+CAMPI_LEGACY = ["ARGOMENTO", "DOMANDA", "RISPOSTA MODELLO", "RISPOSTA UTENTE", "VALUTAZIONE"]
+_CAMPO_LEGACY = re.compile(r"^(%s): " % "|".join(CAMPI_LEGACY), re.MULTILINE)
+
+
+def _adesso():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def leggi_file_legacy(path):
+    """
+    Parse a temp_test_files text file into its fields.
+
+    Args:
+        path (str): Path to test file
+
+    Returns:
+        dict: Mapping field name -> text
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        testo = f.read()
+    parti = _CAMPO_LEGACY.split(testo)
+    # parti = [prefisso, campo, valore, campo, valore, ...]
+    return {campo: valore.strip() for campo, valore in zip(parti[1::2], parti[2::2])}
+
+
+class TestRecordStore:
+    """
+    One record per test, updated phase by phase.
+    """
+
+    COLONNE = [
+        "id", "argomento", "domanda", "risposta_modello", "risposta_utente",
+        "valutazione", "punteggio", "punteggio_id", "creato", "risposto", "valutato", "dimensione",
+    ]
+
+    def __init__(self, db, temp_dir=TEMP_DIR, archivio_dir=ARCHIVIO_DIR):
+        """
+        Args:
+            db (SqliteDatabase): Database
+            temp_dir (str, optional): Legacy text files imported on first use
+            archivio_dir (str, optional): Directory of the compressed segments
+        """
+        self.db = db
+        self.archivio_dir = archivio_dir
+        db.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS test_record (
+                id TEXT PRIMARY KEY,
+                argomento TEXT NOT NULL,
+                domanda TEXT,
+                risposta_modello TEXT,
+                risposta_utente TEXT,
+                valutazione TEXT,
+                punteggio INTEGER,
+                punteggio_id TEXT,
+                creato TEXT NOT NULL,
+                risposto TEXT,
+                valutato TEXT,
+                dimensione INTEGER,
+                segmento TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_test_creato ON test_record(creato);
+            CREATE INDEX IF NOT EXISTS idx_test_punteggio ON test_record(punteggio_id);
+        """)
+        with db.transazione() as conn:
+            colonne = {r[1] for r in conn.execute("PRAGMA table_info(test_record)")}
+            for colonna, tipo in (("dimensione", "INTEGER"), ("segmento", "TEXT")):
+                if colonna not in colonne:
+                    conn.execute(f"ALTER TABLE test_record ADD COLUMN {colonna} {tipo}")
+            if not db.migrato(conn, "test_files") and os.path.isdir(temp_dir):
+                self._importa_legacy(conn, temp_dir)
+            if not db.migrato(conn, "test_dimensione"):
+                # Anche per i file appena importati
+                conn.execute(f"UPDATE test_record SET dimensione = {_DIMENSIONE} WHERE segmento IS NULL")
+
+    def _importa_legacy(self, conn, temp_dir):
+        """Import the text files written before the store existed."""
+        for nome in sorted(os.listdir(temp_dir)):
+            if not (nome.startswith("test_") and nome.endswith(".txt")):
+                continue
+            path = os.path.join(temp_dir, nome)
+            try:
+                campi = leggi_file_legacy(path)
+            except (OSError, UnicodeDecodeError):
+                continue
+            creato = datetime.fromtimestamp(os.path.getmtime(path)).strftime("%Y-%m-%d %H:%M:%S")
+            conn.execute(
+                "INSERT INTO test_record (id, argomento, domanda, risposta_modello, risposta_utente, valutazione, creato) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (uuid.uuid4().hex, campi.get("ARGOMENTO", ""), campi.get("DOMANDA"), campi.get("RISPOSTA MODELLO"),
+                 campi.get("RISPOSTA UTENTE"), campi.get("VALUTAZIONE"), creato)
+            )
+
+    def crea(self, argomento, domanda, risposta_modello):
+        """
+        Start a test record.
+
+        Args:
+            argomento (str): Topic name
+            domanda (str): Test question
+            risposta_modello (str): Model answer
+
+        Returns:
+            str: Record id
+        """
+        id_test = uuid.uuid4().hex
+        creato = _adesso()
+
+        def inserisci(conn):
+            conn.execute(
+                "INSERT INTO test_record (id, argomento, domanda, risposta_modello, creato) VALUES (?, ?, ?, ?, ?)",
+                (id_test, argomento, domanda, risposta_modello, creato)
+            )
+            conn.execute(f"UPDATE test_record SET dimensione = {_DIMENSIONE} WHERE id = ?", (id_test,))
+
+        unita_corrente().transazione(self.db, inserisci)
+        return id_test
+
+    def registra_risposta(self, id_test, risposta_utente):
+        """
+        Record the user's answer.
+
+        Args:
+            id_test (str): Record id
+            risposta_utente (str): User's answer
+        """
+        risposto = _adesso()
+        unita_corrente().transazione(self.db, lambda conn: conn.execute(
+            f"UPDATE test_record SET risposta_utente = ?, risposto = ?, dimensione = {_DIMENSIONE} WHERE id = ?",
+            (risposta_utente, risposto, id_test)
+        ))
+
+    def registra_valutazione(self, id_test, valutazione, punteggio, punteggio_id):
+        """
+        Record the grading and link the record to its score.
+
+        Args:
+            id_test (str): Record id
+            valutazione (str): LLM grading
+            punteggio (int): Score value
+            punteggio_id (str): Id of the score row
+        """
+        valutato = _adesso()
+        unita_corrente().transazione(self.db, lambda conn: conn.execute(
+            "UPDATE test_record SET valutazione = ?, punteggio = ?, punteggio_id = ?, valutato = ?, "
+            f"dimensione = {_DIMENSIONE} WHERE id = ?",
+            (valutazione, punteggio, punteggio_id, valutato, id_test)
+        ))
+
+    def aggiungi(self, tests):
+        """
+        Record completed tests in a single transaction.
+
+        Args:
+            tests (list): Dicts with "argomento", "domanda", "risposta_modello",
+                "risposta_utente", "valutazione", "punteggio" and "punteggio_id"
+
+        Returns:
+            list: Record ids
+        """
+        adesso = _adesso()
+        righe = [
+            (uuid.uuid4().hex, t["argomento"], t["domanda"], t["risposta_modello"], t["risposta_utente"],
+             t["valutazione"], t["punteggio"], t["punteggio_id"], adesso, adesso, adesso,
+             sum(len((t[c] or "").encode("utf-8")) for c in CORPO))
+            for t in tests
+        ]
+        unita_corrente().transazione(self.db, lambda conn: conn.executemany(
+            "INSERT INTO test_record (%s) VALUES (%s)" % (", ".join(self.COLONNE), ", ".join("?" * len(self.COLONNE))),
+            righe
+        ))
+        return [r[0] for r in righe]
+
+    def get(self, id_test):
+        """
+        Get a test record, reading its body from the archive if needed.
+
+        Args:
+            id_test (str): Record id
+
+        Returns:
+            dict or None: Record
+        """
+        riga = self.db.conn.execute(
+            "SELECT %s, segmento FROM test_record WHERE id = ?" % ", ".join(self.COLONNE), (id_test,)
+        ).fetchone()
+        if not riga:
+            return None
+        record = dict(zip(self.COLONNE + ["segmento"], riga))
+        if record["segmento"]:
+            record.update(self._leggi_segmento(record["segmento"], id_test))
+        return record
+
+    def manifesto(self, limite=None, offset=0):
+        """
+        List the manifest of the history, most recent first, without bodies.
+
+        Args:
+            limite (int, optional): Page size
+            offset (int, optional): Records to skip
+
+        Returns:
+            list: Dicts with the MANIFESTO fields
+        """
+        righe = self.db.conn.execute(
+            "SELECT %s FROM test_record ORDER BY creato DESC, rowid DESC LIMIT ? OFFSET ?" % ", ".join(MANIFESTO),
+            (-1 if limite is None else limite, offset)
+        ).fetchall()
+        return [dict(zip(MANIFESTO, r)) for r in righe]
+
+    def conta(self):
+        """
+        Count the test records.
+
+        Returns:
+            int: Number of records
+        """
+        return self.db.conn.execute("SELECT COUNT(*) FROM test_record").fetchone()[0]
+
+    def _leggi_segmento(self, segmento, id_test):
+        """Find the body of a record in a compressed segment."""
+        path = os.path.join(self.archivio_dir, segmento)
+        if not os.path.exists(path):
+            return {}
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for riga in f:
+                try:
+                    voce = json.loads(riga)
+                except ValueError:
+                    continue
+                if voce.get("id") == id_test:
+                    return {c: voce.get(c) for c in CORPO}
+        return {}
+
+    def archivia(self, giorni=ARCHIVIA_DOPO_GIORNI):
+        """
+        Move the bodies of completed records older than `giorni` into monthly
+        gzip segments, keeping their manifest rows.
+
+        The segment is written before the rows are updated, so a crash in
+        between only leaves a duplicate body in the segment.
+
+        Args:
+            giorni (int, optional): Age in days after which records are archived
+
+        Returns:
+            int: Number of archived records
+        """
+        limite = (datetime.now() - timedelta(days=giorni)).strftime("%Y-%m-%d %H:%M:%S")
+        righe = self.db.conn.execute(
+            "SELECT id, creato, %s FROM test_record "
+            "WHERE segmento IS NULL AND valutato IS NOT NULL AND creato < ? ORDER BY creato" % ", ".join(CORPO),
+            (limite,)
+        ).fetchall()
+        if not righe:
+            return 0
+        per_segmento = {}
+        for id_test, creato, *corpo in righe:
+            per_segmento.setdefault(f"{creato[:7]}.jsonl.gz", []).append(dict(zip(CORPO, corpo), id=id_test))
+        if not os.path.exists(self.archivio_dir):
+            os.makedirs(self.archivio_dir)
+        for segmento, voci in per_segmento.items():
+            # gzip ammette più membri concatenati: si aggiunge in coda al segmento
+            with gzip.open(os.path.join(self.archivio_dir, segmento), "at", encoding="utf-8") as f:
+                for voce in voci:
+                    f.write(json.dumps(voce, ensure_ascii=False) + "\n")
+        with self.db.transazione() as conn:
+            for segmento, voci in per_segmento.items():
+                conn.executemany(
+                    "UPDATE test_record SET %s, segmento = ? WHERE id = ?" % ", ".join(f"{c} = NULL" for c in CORPO),
+                    [(segmento, v["id"]) for v in voci]
+                )
+        return len(righe)
+
+    def elimina(self, id_test):
+        """
+        Delete a test record.
+
+        Args:
+            id_test (str): Record id
+        """
+        unita_corrente().transazione(
+            self.db, lambda conn: conn.execute("DELETE FROM test_record WHERE id = ?", (id_test,))
+        )
+
+    def elimina_per_punteggio(self, punteggio_ids):
+        """
+        Delete the test records linked to scores.
+
+        Args:
+            punteggio_ids (list): Score ids
+        """
+        righe = [(i,) for i in punteggio_ids]
+        unita_corrente().transazione(
+            self.db, lambda conn: conn.executemany("DELETE FROM test_record WHERE punteggio_id = ?", righe)
+        )
+
+
+@st.cache_resource(show_spinner=False)
+def get_test_record_store(punteggi_file):
+    """
+    Return the process-wide test record store of a user partition.
+
+    Args:
+        punteggi_file (str): Scores file of the partition
+
+    Returns:
+        TestRecordStore: Shared store
+    """
+    if not os.path.dirname(punteggi_file):
+        store = TestRecordStore(_get_database(DB_FILE))
+    else:
+        store = TestRecordStore(
+            _get_database(file_partizione(punteggi_file, DB_FILE)),
+            temp_dir=file_partizione(punteggi_file, TEMP_DIR),
+            archivio_dir=file_partizione(punteggi_file, os.path.basename(ARCHIVIO_DIR))
+        )
+    store.archivia()
+    return store
@@ -0,0 +1,216 @@
+"""
+Append-only score log for the Dashboard Studio application.
+
+Scores are kept in a CSV snapshot (punteggi_test.csv) plus a JSON-lines
+event log next to it. Saving or deleting a score appends one fsync'd line
+to the log, so the cost does not grow with the history; readers replay
+the log on top of the snapshot and compaction periodically folds the log
+back into a new snapshot. Every operation holds the snapshot's file lock,
+so other processes never see a snapshot and log from different compactions.
+"""
+
+import json
+import os
+import threading
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from src.data.interfaces import ScoreStore
+from src.data.locking import blocco_file, scrivi_atomico
+
+COLONNE = ["Argomento", "Punteggio", "Data", "Commento", "ID"]
+COMPATTA_OGNI = 500  # Numero di eventi dopo cui il log viene compattato
+
+
+def nuovo_id():
+    """
+    Generate a new score id.
+
+    Returns:
+        str: Unique id
+    """
+    return uuid.uuid4().hex
+
+
+def firma_punteggi(punteggi_df):
+    """
+    Cheap fingerprint of a scores DataFrame.
+
+    Scores are only ever appended or deleted by id, so length plus first
+    and last id identify a version without hashing the whole frame.
+
+    Args:
+        punteggi_df (pandas.DataFrame): DataFrame containing scores
+
+    Returns:
+        str: Fingerprint
+    """
+    if punteggi_df.empty:
+        return "0"
+    return f"{len(punteggi_df)}:{punteggi_df['ID'].iloc[0]}:{punteggi_df['ID'].iloc[-1]}"
+
+
+class ScoreLog(ScoreStore):
+    """
+    CSV snapshot plus append-only event log of scores.
+
+    Events are {"op": "add", "ID": ..., <columns>} and tombstones
+    {"op": "del", "ID": ...}. Replay is idempotent, so a crash between
+    writing a snapshot and truncating the log cannot duplicate rows, and a
+    torn last line is ignored.
+    """
+
+    def __init__(self, snapshot_file, compatta_ogni=COMPATTA_OGNI):
+        """
+        Args:
+            snapshot_file (str): Path to the CSV snapshot
+            compatta_ogni (int, optional): Events after which the log is compacted
+        """
+        self.snapshot_file = snapshot_file
+        self.log_file = f"{snapshot_file}.log"
+        self.compatta_ogni = compatta_ogni
+        self._lock = threading.Lock()
+        self._eventi = self._conta_eventi()
+
+    def _conta_eventi(self):
+        """Count the events currently in the log."""
+        if not os.path.exists(self.log_file):
+            return 0
+        with open(self.log_file, "rb") as f:
+            return sum(1 for riga in f if riga.strip())
+
+    def _scrivi_eventi(self, eventi):
+        """Append events to the log and fsync."""
+        testa = ""
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+            with open(self.log_file, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Chiudi una riga troncata da un crash precedente
+                    testa = "\n"
+        with open(self.log_file, "a", encoding="utf-8") as f:
+            f.write(testa)
+            for evento in eventi:
+                f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._eventi += len(eventi)
+
+    def append(self, righe):
+        """
+        Record new scores.
+
+        Args:
+            righe (list): Dicts with "Argomento", "Punteggio", "Data",
+                "Commento" and optionally "ID"
+
+        Returns:
+            list: The recorded rows, each with its "ID"
+        """
+        registrate = []
+        for riga in righe:
+            riga = {c: riga.get(c) for c in COLONNE}
+            riga["ID"] = riga["ID"] or nuovo_id()
+            registrate.append(riga)
+        with self._lock, blocco_file(self.snapshot_file):
+            self._scrivi_eventi([dict(op="add", **r) for r in registrate])
+            if self._eventi >= self.compatta_ogni:
+                self._compatta()
+        return registrate
+
+    def delete(self, ids):
+        """
+        Record tombstones for scores.
+
+        Args:
+            ids (list): Score ids to delete
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock, blocco_file(self.snapshot_file):
+            self._scrivi_eventi([{"op": "del", "ID": i} for i in ids])
+            if self._eventi >= self.compatta_ogni:
+                self._compatta()
+
+    def _leggi_snapshot(self):
+        """Read the snapshot, assigning ids to legacy rows without one."""
+        if not os.path.exists(self.snapshot_file):
+            return pd.DataFrame(columns=COLONNE)
+        df = pd.read_csv(self.snapshot_file)
+        if "ID" not in df.columns:
+            # Migrazione una tantum: gli id devono restare stabili per i tombstone
+            df["ID"] = [nuovo_id() for _ in range(len(df))]
+            self._scrivi_snapshot(df)
+        return df[COLONNE]
+
+    def _scrivi_snapshot(self, df):
+        """Atomically replace the snapshot."""
+        scrivi_atomico(self.snapshot_file, lambda f: df.to_csv(f, index=False, columns=COLONNE))
+
+    def _replay(self):
+        """Rebuild the current scores from snapshot and log."""
+        df = self._leggi_snapshot()
+        aggiunte = {}
+        eliminati = set()
+        if os.path.exists(self.log_file):
+            with open(self.log_file, "r", encoding="utf-8") as f:
+                for riga in f:
+                    try:
+                        evento = json.loads(riga)
+                    except ValueError:
+                        # Riga troncata da un crash durante l'append
+                        continue
+                    if evento.get("op") == "add":
+                        aggiunte[evento["ID"]] = {c: evento.get(c) for c in COLONNE}
+                    elif evento.get("op") == "del":
+                        aggiunte.pop(evento["ID"], None)
+                        eliminati.add(evento["ID"])
+        if eliminati:
+            df = df[~df["ID"].isin(eliminati)]
+        presenti = set(df["ID"])
+        nuove = [r for i, r in aggiunte.items() if i not in presenti]
+        if nuove:
+            df = pd.concat([df, pd.DataFrame(nuove, columns=COLONNE)], ignore_index=True)
+        return df.reset_index(drop=True)
+
+    def load(self):
+        """
+        Replay the log into a DataFrame.
+
+        Returns:
+            pandas.DataFrame: Current scores
+        """
+        # Lock esclusivo: la prima lettura può migrare lo snapshot legacy
+        with self._lock, blocco_file(self.snapshot_file):
+            return self._replay()
+
+    def _compatta(self):
+        """Fold the log into a new snapshot and truncate the log."""
+        df = self._replay()
+        self._scrivi_snapshot(df)
+        with open(self.log_file, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self._eventi = 0
+
+    def compact(self):
+        """Fold the log into a new snapshot and truncate the log."""
+        with self._lock, blocco_file(self.snapshot_file):
+            self._compatta()
+
+
+@st.cache_resource(show_spinner=False)
+def get_score_log(punteggi_file):
+    """
+    Return the process-wide score log for a scores file.
+
+    Args:
+        punteggi_file (str): Path to scores file
+
+    Returns:
+        ScoreLog: Shared score log
+    """
+    return ScoreLog(punteggi_file)
@@ -0,0 +1,384 @@
+"""
+Pluggable storage backends for topic state and scores.
+
+Two backends are available, selected with the DASHBOARD_STORAGE
+environment variable:
+
+- "csv" (default): the state CSV and the append-only score log, fine for
+  small single-user installs.
+- "sqlite": indexed tables in a WAL-mode SQLite database with single-row
+  transactional updates. Existing CSVs are migrated once on first use.
+
+Data is partitioned per user (or per cohort: any shared key), chosen
+with the "utente" query parameter. Each partition has its own state
+file, score log and database under UTENTI_DIR/<utente>/, so concurrent
+students never contend for the same file; the default partition keeps
+the files in the working directory. Within a partition, writers are
+serialised by inter-process file locks (src/data/locking.py).
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+import streamlit as st
+
+from src.data.interfaces import ScoreStore, StateStore
+from src.data.locking import blocco_file, scrivi_atomico, versione_file
+from src.data.score_log import COLONNE, ScoreLog, nuovo_id
+
+BACKEND = os.environ.get("DASHBOARD_STORAGE", "csv")
+DB_FILE = os.environ.get("DASHBOARD_DB", "studio.sqlite3")
+UTENTI_DIR = os.environ.get("DASHBOARD_UTENTI_DIR", "utenti")
+UTENTE_DEFAULT = "default"
+STATO_INIZIALE = "non iniziato"
+
+
+def utente_corrente(query_params):
+    """
+    Get the data partition of the session from the "utente" query parameter.
+
+    Args:
+        query_params (streamlit.runtime.state.QueryParamsProxy): st.query_params
+
+    Returns:
+        str: Partition key (lowercase letters, digits, "-" and "_"), or UTENTE_DEFAULT
+    """
+    utente = query_params.get("utente", "").strip().lower()
+    if not re.fullmatch(r"[a-z0-9_-]{1,40}", utente):
+        return UTENTE_DEFAULT
+    return utente
+
+
+def file_utente(utente, nome):
+    """
+    Path of a data file inside a user partition.
+
+    Args:
+        utente (str): Partition key
+        nome (str): File name
+
+    Returns:
+        str: Path (the name itself for the default partition)
+    """
+    if utente == UTENTE_DEFAULT:
+        return nome
+    return os.path.join(UTENTI_DIR, utente, os.path.basename(nome))
+
+
+def file_partizione(file_dati, nome):
+    """
+    Path of a companion file in the same partition as a data file.
+
+    Args:
+        file_dati (str): A data file of the partition (e.g. the scores file)
+        nome (str): Companion file name (e.g. DB_FILE)
+
+    Returns:
+        str: Path next to `file_dati`, or `nome` for the default partition
+    """
+    directory = os.path.dirname(file_dati)
+    return os.path.join(directory, os.path.basename(nome)) if directory else nome
+
+
+class CsvStateStore(StateStore):
+    """
+    Topic state stored in a CSV file rewritten on every change.
+
+    The loaded DataFrame remembers the file version in
+    attrs["versione"]. An update whose DataFrame is still current writes
+    it as is; if another session wrote the file in the meantime, the
+    change is re-applied on the current file instead, so no update is lost.
+    """
+
+    def __init__(self, stato_file):
+        self.stato_file = stato_file
+        self.conflitti = 0  # Aggiornamenti riapplicati su una versione più recente
+
+    def _scrivi(self, stato_df):
+        scrivi_atomico(self.stato_file, lambda f: stato_df.to_csv(f, index=False))
+        stato_df.attrs["versione"] = versione_file(self.stato_file)
+
+    def load(self, argomenti):
+        with blocco_file(self.stato_file, condiviso=True):
+            esiste = os.path.exists(self.stato_file)
+            if esiste:
+                versione = versione_file(self.stato_file)
+                stato_df = pd.read_csv(self.stato_file)
+                stato_df.attrs["versione"] = versione
+                presenti = set(stato_df["Argomento"])
+                nuovi = [a for a in argomenti if a not in presenti]
+                if not nuovi:
+                    return stato_df
+
+        with blocco_file(self.stato_file):
+            # Ricontrolla sotto lock esclusivo: un'altra sessione può aver già scritto
+            if not os.path.exists(self.stato_file):
+                stato_df = pd.DataFrame({"Argomento": list(argomenti), "Stato": STATO_INIZIALE})
+            else:
+                stato_df = pd.read_csv(self.stato_file)
+                # Add any new topics that are not in the state file
+                presenti = set(stato_df["Argomento"])
+                nuovi = [a for a in argomenti if a not in presenti]
+                if nuovi:
+                    new_rows = pd.DataFrame({"Argomento": nuovi, "Stato": STATO_INIZIALE})
+                    stato_df = pd.concat([stato_df, new_rows], ignore_index=True)
+            self._scrivi(stato_df)
+        return stato_df
+
+    def update_many(self, stato_argomenti_df, modifiche):
+        with blocco_file(self.stato_file):
+            versione = versione_file(self.stato_file)
+            if versione is None or versione == stato_argomenti_df.attrs.get("versione"):
+                self._scrivi(stato_argomenti_df)
+                return
+            # Il file è cambiato dopo il caricamento: riapplica solo queste modifiche
+            corrente = pd.read_csv(self.stato_file)
+            cambiati = corrente["Argomento"].isin(modifiche.keys())
+            corrente.loc[cambiati, "Stato"] = corrente.loc[cambiati, "Argomento"].map(modifiche)
+            self._scrivi(corrente)
+            self.conflitti += 1
+            # Il DataFrame della sessione resta marcato come vecchio: anche le sue
+            # prossime modifiche verranno riapplicate sul file corrente
+
+
+class SqliteDatabase:
+    """
+    Shared SQLite connection holding the topics, state and scores tables.
+    """
+
+    def __init__(self, path=DB_FILE):
+        """
+        Args:
+            path (str, optional): Database path
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._commit = 0  # Commit di questa connessione, che data_version non conta
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL: le letture non bloccano le scritture
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                chiave TEXT PRIMARY KEY,
+                valore TEXT
+            );
+            CREATE TABLE IF NOT EXISTS argomenti (
+                id INTEGER PRIMARY KEY,
+                nome TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS stato_argomenti (
+                argomento_id INTEGER PRIMARY KEY REFERENCES argomenti(id),
+                stato TEXT NOT NULL,
+                aggiornato TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_stato ON stato_argomenti(stato);
+            CREATE TABLE IF NOT EXISTS punteggi (
+                id TEXT PRIMARY KEY,
+                argomento_id INTEGER NOT NULL REFERENCES argomenti(id),
+                punteggio INTEGER,
+                data TEXT NOT NULL,
+                commento TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_punteggi_argomento_data ON punteggi(argomento_id, data);
+            CREATE INDEX IF NOT EXISTS idx_punteggi_data ON punteggi(data);
+        """)
+
+    @contextmanager
+    def transazione(self):
+        """Run the enclosed statements in a single transaction."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self.conn.execute("COMMIT")
+                self._commit += 1
+
+    def versione(self):
+        """
+        Version token of the database contents.
+
+        PRAGMA data_version changes when another connection commits; the
+        commits of this shared connection are counted separately.
+
+        Returns:
+            tuple: (data_version, local commits)
+        """
+        with self._lock:
+            return (self.conn.execute("PRAGMA data_version").fetchone()[0], self._commit)
+
+    def id_argomento(self, conn, nome):
+        """
+        Return the id of a topic, inserting it if needed.
+
+        Args:
+            conn (sqlite3.Connection): Connection inside a transaction
+            nome (str): Topic name
+
+        Returns:
+            int: Topic id
+        """
+        conn.execute("INSERT OR IGNORE INTO argomenti (nome) VALUES (?)", (nome,))
+        return conn.execute("SELECT id FROM argomenti WHERE nome = ?", (nome,)).fetchone()[0]
+
+    def migrato(self, conn, chiave):
+        """Check and set a one-shot migration flag."""
+        if conn.execute("SELECT 1 FROM meta WHERE chiave = ?", (chiave,)).fetchone():
+            return True
+        conn.execute("INSERT INTO meta VALUES (?, ?)", (chiave, datetime.now().isoformat()))
+        return False
+
+
+class SqliteStateStore(StateStore):
+    """
+    Topic state stored in SQLite, updated one row at a time.
+    """
+
+    def __init__(self, db, stato_file=None):
+        """
+        Args:
+            db (SqliteDatabase): Database
+            stato_file (str, optional): Legacy CSV migrated on first use
+        """
+        self.db = db
+        with db.transazione() as conn:
+            if not db.migrato(conn, "stato_csv") and stato_file and os.path.exists(stato_file):
+                for riga in pd.read_csv(stato_file).itertuples(index=False):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO stato_argomenti (argomento_id, stato) VALUES (?, ?)",
+                        (db.id_argomento(conn, riga.Argomento), riga.Stato)
+                    )
+
+    def _leggi(self):
+        return self.db.conn.execute("""
+            SELECT a.nome, s.stato FROM stato_argomenti s
+            JOIN argomenti a ON a.id = s.argomento_id
+            ORDER BY a.id
+        """).fetchall()
+
+    def load(self, argomenti):
+        # Versione presa prima della lettura: un commit intermedio la rende già vecchia
+        versione = self.db.versione()
+        righe = self._leggi()
+        presenti = {nome for nome, _ in righe}
+        nuovi = [a for a in argomenti if a not in presenti]
+        if nuovi:
+            # Scrive solo quando il catalogo contiene argomenti nuovi
+            with self.db.transazione() as conn:
+                for nome in nuovi:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO stato_argomenti (argomento_id, stato) VALUES (?, ?)",
+                        (self.db.id_argomento(conn, nome), STATO_INIZIALE)
+                    )
+            versione = self.db.versione()
+            righe = self._leggi()
+        # Stesso ordine del catalogo, come per il backend CSV
+        posizione = {a: i for i, a in enumerate(argomenti)}
+        righe = sorted(righe, key=lambda r: posizione.get(r[0], len(posizione)))
+        stato_df = pd.DataFrame(righe, columns=["Argomento", "Stato"])
+        stato_df.attrs["versione"] = versione
+        return stato_df
+
+    def update_many(self, stato_argomenti_df, modifiche):
+        adesso = datetime.now().isoformat()
+        with self.db.transazione() as conn:
+            conn.executemany(
+                "UPDATE stato_argomenti SET stato = ?, aggiornato = ? "
+                "WHERE argomento_id = (SELECT id FROM argomenti WHERE nome = ?)",
+                [(stato, adesso, a) for a, stato in modifiche.items()]
+            )
+
+
+class SqliteScoreStore(ScoreStore):
+    """
+    Scores stored in SQLite with single-row inserts and deletes.
+    """
+
+    def __init__(self, db, punteggi_file=None):
+        """
+        Args:
+            db (SqliteDatabase): Database
+            punteggi_file (str, optional): Legacy CSV (and its log) migrated on first use
+        """
+        self.db = db
+        with db.transazione() as conn:
+            if not db.migrato(conn, "punteggi_csv") and punteggi_file and os.path.exists(punteggi_file):
+                self._inserisci(conn, ScoreLog(punteggi_file).load().to_dict("records"))
+
+    def _inserisci(self, conn, righe):
+        conn.executemany(
+            "INSERT OR IGNORE INTO punteggi (id, argomento_id, punteggio, data, commento) VALUES (?, ?, ?, ?, ?)",
+            [
+                (r["ID"], self.db.id_argomento(conn, r["Argomento"]),
+                 None if pd.isna(r["Punteggio"]) else int(r["Punteggio"]), r["Data"], r["Commento"])
+                for r in righe
+            ]
+        )
+
+    def load(self):
+        righe = self.db.conn.execute("""
+            SELECT a.nome, p.punteggio, p.data, p.commento, p.id FROM punteggi p
+            JOIN argomenti a ON a.id = p.argomento_id
+            ORDER BY p.rowid
+        """).fetchall()
+        return pd.DataFrame(righe, columns=COLONNE)
+
+    def append(self, righe):
+        registrate = [dict({c: r.get(c) for c in COLONNE}, ID=r.get("ID") or nuovo_id()) for r in righe]
+        with self.db.transazione() as conn:
+            self._inserisci(conn, registrate)
+        return registrate
+
+    def delete(self, ids):
+        with self.db.transazione() as conn:
+            conn.executemany("DELETE FROM punteggi WHERE id = ?", [(i,) for i in ids])
+
+
+@st.cache_resource(show_spinner=False)
+def _get_database(path):
+    return SqliteDatabase(path)
+
+
+@st.cache_resource(show_spinner=False)
+def get_state_store(stato_file):
+    """
+    Return the configured topic state store.
+
+    Args:
+        stato_file (str): Path to state file
+
+    Returns:
+        StateStore: Shared store
+    """
+    if BACKEND == "sqlite":
+        return SqliteStateStore(_get_database(file_partizione(stato_file, DB_FILE)), stato_file)
+    return CsvStateStore(stato_file)
+
+
+@st.cache_resource(show_spinner=False)
+def get_score_store(punteggi_file):
+    """
+    Return the configured score store.
+
+    Args:
+        punteggi_file (str): Path to scores file
+
+    Returns:
+        ScoreStore: Shared store
+    """
+    if BACKEND == "sqlite":
+        return SqliteScoreStore(_get_database(file_partizione(punteggi_file, DB_FILE)), punteggi_file)
+    return ScoreLog(punteggi_file)
@@ -0,0 +1,436 @@
+"""
+Write-behind unit of work for the storage layer.
+
+The mutations of a rerun (topic states, deleted scores, test record
+changes) are collected in a UnitOfWork instead of being written one by
+one. They are coalesced as they arrive: the last state of a topic wins,
+the deleted scores of a file are written with one call, and the test
+record changes of a database share one transaction. New scores are the
+exception: they are appended (and fsync'd) at once, so a score is only
+confirmed to the student once it is on disk. When the
+rerun ends, also through st.rerun(), the batch goes to a background
+writer, so the script thread never waits for the disk; the next rerun
+waits only for the pending batches of its own partition before loading.
+A batch that still fails after a few attempts is kept in a retry queue,
+together with the later batches touching the same files, and its error
+is shown to the session that wrote it. Batches still queued at
+interpreter exit are written before it ends.
+
+Without an open unit of work (callbacks, benchmarks, scripts) every
+mutation is written immediately.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+from src.data.storage import get_score_store, get_state_store
+
+TENTATIVI = 3  # Tentativi di scrittura di un batch prima di metterlo in coda di ripresa
+RIPROVA_OGNI = 5.0  # Secondi tra i tentativi sui batch in coda di ripresa
+
+logger = logging.getLogger(__name__)
+
+_corrente = threading.local()
+
+
+class ScritturaDiretta:
+    """
+    Writes every mutation immediately (no unit of work open).
+    """
+
+    def aggiorna_stato(self, stato_file, stato_argomenti_df, argomenti, nuovo_stato):
+        """
+        Persist a state change already applied to the DataFrame.
+
+        Args:
+            stato_file (str): Path to state file
+            stato_argomenti_df (pandas.DataFrame): Updated topics state
+            argomenti (list): Changed topic names
+            nuovo_stato (str): New state
+        """
+        get_state_store(stato_file).update(stato_argomenti_df, argomenti, nuovo_stato)
+
+    def aggiungi_punteggi(self, punteggi_file, righe):
+        """
+        Record new scores.
+
+        Args:
+            punteggi_file (str): Path to scores file
+            righe (list): Dicts with "Argomento", "Punteggio", "Data", "Commento"
+
+        Returns:
+            list: The recorded rows, each with its "ID"
+        """
+        return get_score_store(punteggi_file).append(righe)
+
+    def elimina_punteggi(self, punteggi_file, ids):
+        """
+        Delete scores by id.
+
+        Args:
+            punteggi_file (str): Path to scores file
+            ids (list): Score ids
+        """
+        get_score_store(punteggi_file).delete(ids)
+
+    def transazione(self, db, operazione):
+        """
+        Run a write on a SQLite database.
+
+        Args:
+            db (SqliteDatabase): Database
+            operazione (callable): Receives the connection inside a transaction
+        """
+        with db.transazione() as conn:
+            operazione(conn)
+
+
+class UnitOfWork(ScritturaDiretta):
+    """
+    Mutations of one rerun, coalesced and written together.
+
+    New scores are not deferred: aggiungi_punteggi, inherited from
+    ScritturaDiretta, appends them before the save is confirmed.
+    """
+
+    def __init__(self, sessione=None):
+        """
+        Args:
+            sessione (str, optional): Id of the session that records the
+                mutations, to report a failed write to it
+        """
+        self.sessione = sessione
+        self.errore = None  # Ultimo errore di scrittura, se il batch è in coda di ripresa
+        # Store presi nel thread dello script: il writer non usa st.cache_resource
+        self.stati = {}  # stato_file -> [store, stato_df, {argomento: stato}]
+        self.eliminati = {}  # punteggi_file -> [store, [id]]
+        self.transazioni = {}  # path del database -> [db, [operazioni]]
+        self.richieste = 0  # Scritture che sarebbero state eseguite subito
+        self.chiavi_inviate = set()  # File registrati come in sospeso all'invio
+
+    def aggiorna_stato(self, stato_file, stato_argomenti_df, argomenti, nuovo_stato):
+        self.richieste += 1
+        if stato_file not in self.stati:
+            self.stati[stato_file] = [get_state_store(stato_file), None, {}]
+        voce = self.stati[stato_file]
+        # Il DataFrame più recente contiene già tutte le modifiche
+        voce[1] = stato_argomenti_df
+        for argomento in argomenti:
+            voce[2][argomento] = nuovo_stato
+
+    def elimina_punteggi(self, punteggi_file, ids):
+        self.richieste += 1
+        if punteggi_file not in self.eliminati:
+            self.eliminati[punteggi_file] = [get_score_store(punteggi_file), []]
+        eliminati = self.eliminati[punteggi_file][1]
+        for id_punteggio in ids:
+            if id_punteggio not in eliminati:
+                eliminati.append(id_punteggio)
+
+    def transazione(self, db, operazione):
+        self.richieste += 1
+        self.transazioni.setdefault(db.path, [db, []])[1].append(operazione)
+
+    def chiudi(self):
+        """
+        Detach the unit from the session data before it leaves the script thread.
+
+        The writer gets a copy of the latest topics state, not the
+        DataFrame the session keeps using.
+        """
+        for voce in self.stati.values():
+            if voce[1] is not None:
+                voce[1] = voce[1].copy()
+
+    def chiavi(self):
+        """
+        Files touched by the pending writes.
+
+        Returns:
+            set: State, scores and database paths
+        """
+        return set(self.stati) | set(self.eliminati) | set(self.transazioni)
+
+    def vuota(self):
+        """bool: True if nothing was recorded."""
+        return not self.richieste
+
+    def scrivi(self):
+        """
+        Write the coalesced mutations.
+
+        Every write done is removed from the unit, so after a failure
+        a new call resumes from the first write not done.
+
+        Returns:
+            int: Writes done
+        """
+        scritture = 0
+        for stato_file in list(self.stati):
+            store, stato_df, modifiche = self.stati[stato_file]
+            if modifiche:
+                store.update_many(stato_df, modifiche)
+                scritture += 1
+            del self.stati[stato_file]
+        for punteggi_file in list(self.eliminati):
+            store, ids = self.eliminati[punteggi_file]
+            if ids:
+                store.delete(ids)
+                scritture += 1
+            del self.eliminati[punteggi_file]
+        for path in list(self.transazioni):
+            db, operazioni = self.transazioni[path]
+            with db.transazione() as conn:
+                for operazione in operazioni:
+                    operazione(conn)
+            scritture += 1
+            del self.transazioni[path]
+        return scritture
+
+
+_DIRETTA = ScritturaDiretta()
+
+
+def unita_corrente():
+    """
+    Get the writer for the mutations of the current thread.
+
+    Returns:
+        ScritturaDiretta: The open UnitOfWork of the rerun, or an
+            immediate writer when none is open
+    """
+    return getattr(_corrente, "unita", None) or _DIRETTA
+
+
+class WriteBehind:
+    """
+    Background writer of the units of work.
+
+    A single thread writes the batches in arrival order, so the writes of
+    consecutive reruns of a session are never reordered. A batch that
+    keeps failing goes to a retry queue, and so does every later batch
+    touching one of its files, so they are still written in order.
+    """
+
+    def __init__(self, tentativi=TENTATIVI, riprova_ogni=RIPROVA_OGNI):
+        """
+        Args:
+            tentativi (int, optional): Attempts per batch before it goes to the retry queue
+            riprova_ogni (float, optional): Seconds between passes over the retry queue
+        """
+        self.tentativi = tentativi
+        self.riprova_ogni = riprova_ogni
+        self._coda = queue.Queue()
+        self._cond = threading.Condition()
+        self._in_sospeso = {}  # file -> batch in coda che lo toccano
+        self._ripresa = []  # Batch non riusciti, in ordine di arrivo
+        self.unita = 0
+        self.richieste = 0
+        self.scritture = 0
+        self.errori = 0
+        self.ultimo_errore = None
+        self._thread = threading.Thread(target=self._lavora, name="write-behind", daemon=True)
+        self._thread.start()
+        # Il thread è daemon: lo svuotamento della coda all'uscita lo garantisce atexit
+        atexit.register(self.chiudi)
+
+    def invia(self, unita):
+        """
+        Queue a unit of work for writing.
+
+        Args:
+            unita (UnitOfWork): Closed unit of work
+        """
+        if unita.vuota():
+            return
+        if not self._thread.is_alive():
+            # Writer già chiuso (uscita in corso): scrive subito
+            if not self._scrivi(unita):
+                logger.error("Scrittura non riuscita all'uscita: %s", unita.errore)
+            return
+        # La unit si svuota mentre viene scritta: le chiavi da sbloccare si fissano qui
+        unita.chiavi_inviate = unita.chiavi()
+        with self._cond:
+            for chiave in unita.chiavi_inviate:
+                self._in_sospeso[chiave] = self._in_sospeso.get(chiave, 0) + 1
+        self._coda.put(unita)
+
+    def _scrivi(self, unita):
+        """
+        Write a unit with retries and update the counters.
+
+        Returns:
+            bool: True if every write of the unit was done
+        """
+        richieste = unita.richieste
+        scritture = 0
+        riuscito = False
+        for tentativo in range(self.tentativi):
+            try:
+                scritture += unita.scrivi()
+                riuscito = True
+                break
+            except Exception as e:
+                unita.errore = repr(e)
+                if tentativo + 1 < self.tentativi:
+                    time.sleep(0.1 * 2 ** tentativo)
+        with self._cond:
+            self.scritture += scritture
+            if riuscito:
+                unita.errore = None
+                self.unita += 1
+                self.richieste += richieste
+            else:
+                self.errori += 1
+                self.ultimo_errore = unita.errore
+        return riuscito
+
+    def _riprendi(self):
+        """Retry the failed units in order; a unit waits while an earlier one on its files fails."""
+        bloccate = set()
+        rimaste = []
+        for unita in list(self._ripresa):
+            chiavi = unita.chiavi()
+            if chiavi & bloccate or not self._scrivi(unita):
+                bloccate |= chiavi
+                rimaste.append(unita)
+        with self._cond:
+            self._ripresa = rimaste
+
+    def _accoda_o_scrivi(self, unita):
+        """Write a new unit, or queue it behind a failed unit on the same files."""
+        chiavi = unita.chiavi()
+        bloccante = next((u for u in self._ripresa if u.chiavi() & chiavi), None)
+        if bloccante is not None:
+            unita.errore = bloccante.errore
+        elif self._scrivi(unita):
+            return
+        logger.warning("Scrittura differita non riuscita, in coda di ripresa: %s", unita.errore)
+        with self._cond:
+            self._ripresa.append(unita)
+
+    def _lavora(self):
+        """Writer thread body."""
+        while True:
+            try:
+                unita = self._coda.get(timeout=self.riprova_ogni if self._ripresa else None)
+            except queue.Empty:
+                self._riprendi()
+                continue
+            if unita is None:
+                # Uscita: un ultimo tentativo sui batch non riusciti
+                self._riprendi()
+                for rimasta in self._ripresa:
+                    logger.error("Scrittura differita persa all'uscita: %s", rimasta.errore)
+                return
+            if self._ripresa:
+                self._riprendi()
+            self._accoda_o_scrivi(unita)
+            with self._cond:
+                # Anche un batch in coda di ripresa sblocca le letture: l'errore è mostrato alla sessione
+                for chiave in unita.chiavi_inviate:
+                    self._in_sospeso[chiave] -= 1
+                    if not self._in_sospeso[chiave]:
+                        del self._in_sospeso[chiave]
+                self._cond.notify_all()
+
+    def attendi(self, *chiavi, timeout=None):
+        """
+        Wait until the queued batches touching some files are written.
+
+        Args:
+            *chiavi (str): File paths (all pending batches if none)
+            timeout (float, optional): Maximum wait in seconds
+
+        Returns:
+            bool: True if nothing is pending any more for those files
+        """
+        def scritti():
+            if not chiavi:
+                return not self._in_sospeso
+            return not any(chiave in self._in_sospeso for chiave in chiavi)
+
+        with self._cond:
+            return self._cond.wait_for(scritti, timeout)
+
+    def errore_sessione(self, sessione):
+        """
+        Get the write error of a session's batches waiting in the retry queue.
+
+        Args:
+            sessione (str): Session id passed to unita_di_lavoro
+
+        Returns:
+            str or None: Last error, or None if every batch of the session was written
+        """
+        with self._cond:
+            errori = [u.errore for u in self._ripresa if u.sessione == sessione]
+        return errori[-1] if errori else None
+
+    def chiudi(self):
+        """Write the queued batches and stop the writer thread."""
+        if self._thread.is_alive():
+            self._coda.put(None)
+            self._thread.join()
+
+    def statistiche(self):
+        """
+        Get the write counters.
+
+        Returns:
+            dict: "unita" (batches written), "richieste" (writes recorded),
+                "scritture" (writes done), "risparmiate", "in_coda", "errori"
+                (failed write rounds) and "in_ripresa" (batches waiting in the retry queue)
+        """
+        with self._cond:
+            return {
+                "unita": self.unita,
+                "richieste": self.richieste,
+                "scritture": self.scritture,
+                "risparmiate": self.richieste - self.scritture,
+                "in_coda": self._coda.qsize(),
+                "errori": self.errori,
+                "in_ripresa": len(self._ripresa),
+            }
+
+
+@contextmanager
+def unita_di_lavoro(writer, sessione=None):
+    """
+    Collect the mutations of the enclosed block in a unit of work.
+
+    The unit is sent to the writer when the block ends, also when it is
+    interrupted by st.rerun() or an exception.
+
+    Args:
+        writer (WriteBehind): Background writer
+        sessione (str, optional): Session id, for WriteBehind.errore_sessione
+
+    Yields:
+        UnitOfWork: The open unit of work
+    """
+    unita = UnitOfWork(sessione)
+    _corrente.unita = unita
+    try:
+        yield unita
+    finally:
+        _corrente.unita = None
+        unita.chiudi()
+        writer.invia(unita)
+
+
+@st.cache_resource(show_spinner=False)
+def get_write_behind():
+    """
+    Return the process-wide background writer.
+
+    Returns:
+        WriteBehind: Shared writer
+    """
+    return WriteBehind()
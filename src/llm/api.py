@@ -2,15 +2,19 @@
 LLM API integration for the Dashboard Studio application.
 """
 
-import requests
-import toml
-import asyncio
-import aiohttp
+import json
 import streamlit as st
-import os
 import time
 
-def chiamata_llm(prompt, max_tokens=500, temperature=0.7):
+from src.llm.batch import LLMBatchEngine, get_rate_limiter
+from src.llm.cache import get_llm_cache, make_key
+from src.llm.client import get_llm_client
+from src.llm.ledger import get_llm_ledger
+from src.data.records import get_test_record_store
+from src.utils.profiling import profila
+
+@profila()
+def chiamata_llm(prompt, max_tokens=500, temperature=0.7, client=None, messages=None, tipo="generico"):
     """
     Call LLM API.
     
@@ -18,156 +22,275 @@ def chiamata_llm(prompt, max_tokens=500, temperature=0.7):
         prompt (str): Prompt text
         max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 500.
         temperature (float, optional): Temperature parameter. Defaults to 0.7.
+        client (LLMClient, optional): Client to use. Defaults to the shared client.
+        messages (list, optional): Chat messages to send instead of `prompt`
+        tipo (str, optional): Prompt type recorded in the call ledger
         
     Returns:
         str: LLM response
     """
     try:
-        # Carica il file secrets.toml
-        secrets = toml.load(".streamlit/secrets.toml")
-        
-        # Access to the secrets structure
-        api_key = secrets["openrouter_api_key"]["openrouter_api_key"]
-        model_id = secrets["openrouter_api_key"]["model"]
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://yourapp.com",
-            "X-Title": "Studio Orale AS2B"
-        }
-
-        payload = {
-            "model": model_id,
-            "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
+        # Il client condiviso carica secrets.toml una sola volta e riusa le connessioni
+        client = client or get_llm_client()
+        payload = client.build_payload(prompt, max_tokens=max_tokens, temperature=temperature, messages=messages)
 
+        misura = get_llm_ledger().misura(tipo, client.model)
         try:
-            response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload)
+            response = client.post(payload)
             if response.status_code == 200:
                 json_response = response.json()
                 if "choices" in json_response and len(json_response["choices"]) > 0:
+                    misura.chiudi(200, json_response.get("usage"))
                     return json_response["choices"][0]["message"]["content"]
                 else:
-                    return f"❌ Errore API: Risposta non valida: {json_response}"
+                    errore = f"❌ Errore API: Risposta non valida: {json_response}"
             else:
-                return f"❌ Errore API: {response.status_code}: {response.text}"
+                errore = f"❌ Errore API: {response.status_code}: {response.text}"
+            misura.chiudi(response.status_code, errore=errore)
+            return errore
         except Exception as e:
+            misura.chiudi(errore=str(e))
             return f"❌ Errore nella chiamata API: {str(e)}"
     
     except FileNotFoundError:
-        return f"❌ File secrets.toml non trovato. Assicurati che il file esista nella directory .streamlit"
+        return "❌ File secrets.toml non trovato. Assicurati che il file esista nella directory .streamlit"
     
     except Exception as e:
         return f"❌ Errore nella configurazione LLM: {str(e)}"
 
 
-async def async_chiamata_llm(prompt, max_tokens=500, temperature=0.7):
+def _estrai_testo_sse(righe, esito=None):
+    """
+    Extract content deltas from an OpenRouter SSE stream.
+    
+    Args:
+        righe (iterable): Raw lines (bytes) of the event stream
+        esito (dict, optional): Receives the "usage" of the final event
+        
+    Yields:
+        str: Content chunks
+    """
+    for riga in righe:
+        if not riga:
+            continue
+        riga = riga.decode("utf-8") if isinstance(riga, bytes) else riga
+        # Le righe che iniziano con ":" sono commenti keep-alive
+        if not riga.startswith("data:"):
+            continue
+        dati = riga[len("data:"):].strip()
+        if dati == "[DONE]":
+            return
+        try:
+            evento = json.loads(dati)
+        except ValueError:
+            continue
+        if "error" in evento:
+            yield f"❌ Errore API: {evento['error']}"
+            return
+        if esito is not None and evento.get("usage"):
+            esito["usage"] = evento["usage"]
+        choices = evento.get("choices") or []
+        if choices:
+            testo = (choices[0].get("delta") or {}).get("content")
+            if testo:
+                yield testo
+
+
+def chiamata_llm_stream(prompt, max_tokens=500, temperature=0.7, messages=None, tipo="generico"):
+    """
+    Streaming version of LLM API call.
+    
+    Consumes OpenRouter's SSE stream and yields text chunks as soon as they
+    arrive; errors are yielded as a single "❌ ..." chunk.
+    
+    Args:
+        prompt (str): Prompt text
+        max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 500.
+        temperature (float, optional): Temperature parameter. Defaults to 0.7.
+        messages (list, optional): Chat messages to send instead of `prompt`
+        tipo (str, optional): Prompt type recorded in the call ledger
+        
+    Yields:
+        str: Response chunks
+    """
+    try:
+        client = get_llm_client()
+        payload = client.build_payload(
+            prompt, max_tokens=max_tokens, temperature=temperature, stream=True, messages=messages
+        )
+        # OpenRouter aggiunge l'uso dei token all'ultimo evento dello stream
+        payload["usage"] = {"include": True}
+    except FileNotFoundError:
+        yield "❌ File secrets.toml non trovato. Assicurati che il file esista nella directory .streamlit"
+        return
+    except Exception as e:
+        yield f"❌ Errore nella configurazione LLM: {str(e)}"
+        return
+
+    misura = get_llm_ledger().misura(tipo, client.model)
+    esito = {}
+    http_status, errore = None, None
+    try:
+        with client.post(payload, stream=True) as response:
+            http_status = response.status_code
+            if response.status_code != 200:
+                errore = f"❌ Errore API: {response.status_code}: {response.text}"
+                yield errore
+                return
+            for chunk in _estrai_testo_sse(response.iter_lines(), esito):
+                misura.primo_token()
+                if chunk.startswith("❌"):
+                    errore = chunk
+                yield chunk
+    except Exception as e:
+        errore = f"❌ Errore nella chiamata API: {str(e)}"
+        yield errore
+    finally:
+        misura.chiudi(http_status, esito.get("usage"), errore)
+
+
+async def async_chiamata_llm(prompt, max_tokens=500, temperature=0.7, tipo="generico"):
     """
     Asynchronous version of LLM API call.
     
+    When running on the shared client's event loop the long-lived aiohttp
+    session is reused; otherwise a temporary session is opened.
+    
     Args:
         prompt (str): Prompt text
         max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 500.
         temperature (float, optional): Temperature parameter. Defaults to 0.7.
+        tipo (str, optional): Prompt type recorded in the call ledger
         
     Returns:
         str: LLM response
     """
+    import aiohttp
+
     try:
-        # Carica il file secrets.toml
-        secrets = toml.load(".streamlit/secrets.toml")
-        
-        # Access to the secrets structure
-        api_key = secrets["openrouter_api_key"]["openrouter_api_key"]
-        model_id = secrets["openrouter_api_key"]["model"]
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://yourapp.com",
-            "X-Title": "Studio Orale AS2B"
-        }
-
-        payload = {
-            "model": model_id,
-            "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
-            "max_tokens": max_tokens,
-            "temperature": temperature
-        }
-
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://openrouter.ai/api/v1/chat/completions", 
-                headers=headers, 
-                json=payload
-            ) as response:
+        client = get_llm_client()
+        headers = client.headers()
+        payload = client.build_payload(prompt, max_tokens=max_tokens, temperature=temperature)
+
+        if client.on_client_loop():
+            session = client.async_session()
+            owns_session = False
+        else:
+            session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(
+                sock_connect=client.connect_timeout, sock_read=client.read_timeout
+            ))
+            owns_session = True
+
+        misura = get_llm_ledger().misura(tipo, client.model)
+        try:
+            async with session.post(client.url, headers=headers, json=payload) as response:
                 if response.status == 200:
                     result = await response.json()
                     if "choices" in result and len(result["choices"]) > 0:
+                        misura.chiudi(200, result.get("usage"))
                         return result["choices"][0]["message"]["content"]
                     else:
-                        return f"❌ Errore API: Risposta non valida: {result}"
+                        errore = f"❌ Errore API: Risposta non valida: {result}"
                 else:
                     text = await response.text()
-                    return f"❌ Errore API: {response.status}: {text}"
+                    errore = f"❌ Errore API: {response.status}: {text}"
+                misura.chiudi(response.status, errore=errore)
+                return errore
+        except Exception as e:
+            misura.chiudi(errore=str(e))
+            raise
+        finally:
+            if owns_session:
+                await session.close()
     
     except Exception as e:
         return f"❌ Errore nella chiamata API asincrona: {str(e)}"
 
 
-async def parallel_llm_calls(prompts):
+def _engine(client, rpm=None, tpm=None, **opzioni):
+    """
+    Build a batch engine on the process-wide rate limiter.
+
+    Args:
+        client (LLMClient): LLM client
+        rpm (float, optional): Requests per minute of the shared limiter
+        tpm (float, optional): Tokens per minute of the shared limiter
+        **opzioni: Other LLMBatchEngine options
+
+    Returns:
+        LLMBatchEngine: Engine recording into the LLM ledger
+    """
+    limiti = {k: v for k, v in (("rpm", rpm), ("tpm", tpm)) if v is not None}
+    return LLMBatchEngine(client, ledger=get_llm_ledger(), limiter=get_rate_limiter(**limiti), **opzioni)
+
+
+async def parallel_llm_calls(prompts, **opzioni):
     """
     Execute multiple LLM calls in parallel.
     
+    Calls go through LLMBatchEngine: bounded concurrency, rate limiting and
+    retries with backoff.
+    
     Args:
-        prompts (list): List of prompts
+        prompts (list): List of prompts (str) or request dicts with "prompt",
+            "max_tokens" and "temperature"
+        **opzioni: LLMBatchEngine options (concurrency, rpm, tpm, max_retries)
         
     Returns:
-        list: List of LLM responses
+        list: List of LLM responses (error strings for failed items)
     """
-    tasks = [async_chiamata_llm(prompt) for prompt in prompts]
-    return await asyncio.gather(*tasks)
+    risultati = await _engine(get_llm_client(), **opzioni).run(prompts)
+    return [r.content for r in risultati]
 
 
-def run_parallel_llm_calls(prompts):
+def run_parallel_llm_calls(prompts, **opzioni):
     """
     Wrapper to execute parallel LLM calls from synchronous code.
     
+    The calls run on the shared client's event loop so that pooled
+    connections survive between batches.
+    
     Args:
-        prompts (list): List of prompts
+        prompts (list): List of prompts or request dicts
+        **opzioni: LLMBatchEngine options
         
     Returns:
         list: List of LLM responses
     """
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        results = loop.run_until_complete(parallel_llm_calls(prompts))
-    finally:
-        loop.close()
-    return results
+    return get_llm_client().run_async(parallel_llm_calls(prompts, **opzioni))
 
 
-# Modified to use TTL for cache and handle errors better
-@st.cache_data(show_spinner=True, ttl=600)  # Cache expires after 10 minutes
-def cached_llm_studio(argomento, retry=0):
+def run_llm_batch(richieste, **opzioni):
     """
-    Cached version of LLM call for topic study.
+    Execute a batch of LLM calls and return per-item results.
+    
+    Args:
+        richieste (list): List of prompts or request dicts
+        **opzioni: LLMBatchEngine options
+        
+    Returns:
+        list: BatchResult objects in input order
+    """
+    client = get_llm_client()
+    return client.run_async(_engine(client, **opzioni).run(richieste))
+
+
+# Parametri di generazione delle lezioni (fanno parte della chiave di cache)
+LEZIONE_MAX_TOKENS = 800
+LEZIONE_TEMPERATURE = 0.7
+
+
+def prompt_lezione(argomento):
+    """
+    Build the lesson prompt for a topic.
     
     Args:
         argomento (str): Topic name
-        retry (int): Retry attempt counter
         
     Returns:
-        str: LLM response
+        str: Prompt text
     """
-    with st.spinner(f"Generating study content for {argomento}..."):
-        prompt = f"""You are an English language tutor. Explain the following topic as if it were a lesson:
+    return f"""You are an English language tutor. Explain the following topic as if it were a lesson:
 
 Topic: {argomento}
 
@@ -177,12 +300,106 @@ Structure your explanation in 3 parts:
 3. Brief questions to verify student understanding
 
 Use a clear and professional tone. RESPOND ONLY IN ENGLISH."""
-        response = chiamata_llm(prompt, max_tokens=800, temperature=0.7)
+
+
+def _is_risposta_errore(response):
+    """
+    Check whether an LLM response is empty or an error message.
+    
+    Args:
+        response (str): LLM response
+        
+    Returns:
+        bool: True if the response must not be cached
+    """
+    return not response or response.startswith("❌") or "Errore" in response
+
+
+def chiave_lezione(argomento, client=None):
+    """
+    Return the disk-cache key of a topic's lesson.
+    
+    Args:
+        argomento (str): Topic name
+        client (LLMClient, optional): Client to use. Defaults to the shared client.
+        
+    Returns:
+        str: Cache key
+    """
+    client = client or get_llm_client()
+    return make_key(client.model, prompt_lezione(argomento), LEZIONE_MAX_TOKENS, LEZIONE_TEMPERATURE)
+
+
+def _leggi_lezione(argomento):
+    """Return the cached lesson for a topic, or None if missing or expired."""
+    try:
+        return get_llm_cache().get(chiave_lezione(argomento))
+    except Exception:
+        # Configurazione mancante: la chiamata successiva mostrerà l'errore
+        return None
+
+
+def _registra_cache_hit():
+    """Record a lesson served from the cache in the call ledger."""
+    get_llm_ledger().registra("lezione", get_llm_client().model, 0.0, cache_hit=True)
+
+
+def _salva_lezione(argomento, testo):
+    """Store a lesson for a topic."""
+    get_llm_cache().put(chiave_lezione(argomento), testo, topic=argomento)
+
+
+def genera_lezione(argomento, client, cache):
+    """
+    Generate and cache a topic's lesson without touching the Streamlit UI.
+    
+    Safe to call from background threads.
+    
+    Args:
+        argomento (str): Topic name
+        client (LLMClient): LLM client
+        cache (LLMCache): Lesson cache
+        
+    Returns:
+        bool: True if the lesson is in the cache afterwards
+    """
+    key = chiave_lezione(argomento, client)
+    if cache.contains(key):
+        return True
+    response = chiamata_llm(
+        prompt_lezione(argomento), max_tokens=LEZIONE_MAX_TOKENS, temperature=LEZIONE_TEMPERATURE, client=client,
+        tipo="lezione"
+    )
+    if _is_risposta_errore(response):
+        return False
+    cache.put(key, response, topic=argomento)
+    return True
+
+
+def cached_llm_studio(argomento, retry=0):
+    """
+    Cached version of LLM call for topic study.
+    
+    Args:
+        argomento (str): Topic name
+        retry (int): Retry attempt counter
+        
+    Returns:
+        str: LLM response
+    """
+    cached = _leggi_lezione(argomento)
+    if cached is not None:
+        _registra_cache_hit()
+        return cached
+
+    with st.spinner(f"Generating study content for {argomento}..."):
+        response = chiamata_llm(
+            prompt_lezione(argomento), max_tokens=LEZIONE_MAX_TOKENS, temperature=LEZIONE_TEMPERATURE, tipo="lezione"
+        )
         
         # Check if response is empty or contains an error message
-        if not response or response.startswith("❌") or "Errore" in response:
+        if _is_risposta_errore(response):
             # Don't cache error responses
-            st.cache_data.clear()
             # If this is the first retry attempt, try once more
             if retry < 1:
                 st.warning(f"Error generating content for {argomento}. Retrying...")
@@ -191,25 +408,170 @@ Use a clear and professional tone. RESPOND ONLY IN ENGLISH."""
             else:
                 return f"Error generating content for {argomento}. Please try again or contact support."
         
+        _salva_lezione(argomento, response)
         return response
 
 
+def stream_llm_studio(argomento):
+    """
+    Streaming version of cached_llm_studio.
+    
+    A cached lesson is yielded in one chunk; otherwise the lesson is streamed
+    and stored once complete. If streaming fails before any text arrives,
+    falls back to a single non-streaming retry.
+    
+    Args:
+        argomento (str): Topic name
+        
+    Yields:
+        str: Lesson chunks
+    """
+    cached = _leggi_lezione(argomento)
+    if cached is not None:
+        _registra_cache_hit()
+        yield cached
+        return
+
+    parti = []
+    for chunk in chiamata_llm_stream(
+        prompt_lezione(argomento), max_tokens=LEZIONE_MAX_TOKENS, temperature=LEZIONE_TEMPERATURE, tipo="lezione"
+    ):
+        if chunk.startswith("❌"):
+            if not parti:
+                # Nessun testo ricevuto: riprova una volta senza streaming
+                yield cached_llm_studio(argomento, retry=1)
+                return
+            # Errore a metà stream: mostra il testo parziale senza salvarlo
+            yield f"\n\n{chunk}"
+            return
+        parti.append(chunk)
+        yield chunk
+
+    risposta = "".join(parti)
+    if not _is_risposta_errore(risposta):
+        _salva_lezione(argomento, risposta)
+
+
 def clear_topic_cache(argomento):
     """
     Clear the cache for a specific topic.
     
     Args:
         argomento (str): Topic name to clear from cache
+        
+    Returns:
+        bool: True if at least one cached entry was removed
+    """
+    # Import locale: prefetch importa questo modulo
+    from src.llm.prefetch import get_lesson_prefetcher
+    get_lesson_prefetcher().dimentica(argomento)
+    return get_llm_cache().invalidate_topic(argomento) > 0
+
+# Parametri di generazione delle fasi del test
+PARAMETRI_DOMANDA = {"max_tokens": 300, "temperature": 0.7}
+PARAMETRI_RISPOSTA_MODELLO = {"max_tokens": 800, "temperature": 0.5}
+PARAMETRI_VALUTAZIONE = {"max_tokens": 600, "temperature": 0.4}
+
+
+def prompt_domanda_test(argomento):
     """
-    # Create a unique key for this topic's cache entry
-    cache_key = f"cached_llm_studio-{argomento}"
+    Build the prompt that generates a test question.
     
-    # Clear this specific cache entry if it exists
-    if hasattr(st.cache_data, "clear") and callable(st.cache_data.clear):
-        st.cache_data.clear(cache_key)
-        return True
-    return False
+    Args:
+        argomento (str): Topic name
+        
+    Returns:
+        str: Prompt text
+    """
+    return f"""English examiner. Create an oral exam question on:
+"{argomento}"
+Complex question requiring in-depth knowledge. Clear and specific.
+QUESTION ONLY. NO INTRODUCTION. ENGLISH ONLY."""
+
 
+def prompt_risposta_modello(argomento, domanda):
+    """
+    Build the prompt that generates the model answer to a test question.
+    
+    Args:
+        argomento (str): Topic name
+        domanda (str): Test question
+        
+    Returns:
+        str: Prompt text
+    """
+    return f"""English expert. Answer this question about {argomento}:
+Question: {domanda}
+Comprehensive, well-structured answer (perfect score). Include terminology, examples.
+250-300 words. ENGLISH ONLY."""
+
+
+def prompt_valutazione(argomento, domanda, risposta_modello, risposta_utente):
+    """
+    Build the grading prompt for a test answer.
+    
+    Args:
+        argomento (str): Topic name
+        domanda (str): Test question
+        risposta_modello (str): Model answer
+        risposta_utente (str): User's answer
+        
+    Returns:
+        str: Prompt text
+    """
+    return f"""English examiner. Evaluate student response vs model answer.
+TOPIC: {argomento}
+QUESTION: {domanda}
+MODEL: {risposta_modello}
+STUDENT: {risposta_utente}
+
+Evaluate on scale 0-100:
+- Content (40%): Key points coverage
+- Language (30%): Grammar, vocabulary
+- Structure (30%): Organization, clarity
+
+Format: SCORE: [0-100]
+COMMENT: [strengths and areas for improvement]
+ENGLISH ONLY."""
+
+
+def domanda_predefinita(argomento):
+    """Fallback question used when generation fails."""
+    return f"Explain the key concepts of {argomento} and provide examples."
+
+
+def risposta_modello_predefinita(argomento):
+    """Fallback model answer used when generation fails."""
+    return f"This would be a model answer for the question about {argomento}. In a real scenario, this would contain a comprehensive explanation of the topic with examples and proper terminology."
+
+
+def estrai_punteggio(risposta):
+    """
+    Extract score and comment from a grading response.
+    
+    Args:
+        risposta (str): LLM grading response
+        
+    Returns:
+        tuple: (score on 0-100 scale, comment)
+    """
+    try:
+        # Try to extract using English format
+        if "SCORE:" in risposta:
+            punteggio_match = risposta.split("SCORE:")[1].split("\n")[0].strip()
+            punteggio = int(punteggio_match)  # Keep the original 0-100 scale
+            commento = risposta.split("COMMENT:")[1].strip()
+        else:
+            # If no format is found, use default
+            punteggio = 50  # Default on 0-100 scale
+            commento = risposta
+    except:
+        punteggio = 50  # Default in caso di errore nel parsing (0-100 scale)
+        commento = risposta
+    return punteggio, commento
+
+
+@profila()
 def interazione_llm_su_argomento(argomento, modalita, stato_argomenti_df, stato_file, punteggi_df, punteggi_file, chat_log):
     """
     Interact with LLM on a topic.
@@ -221,7 +583,7 @@ def interazione_llm_su_argomento(argomento, modalita, stato_argomenti_df, stato_
         stato_file (str): Path to state file
         punteggi_df (pandas.DataFrame): DataFrame containing scores
         punteggi_file (str): Path to scores file
-        chat_log (list): Chat history
+        chat_log (ChatHistory): Chat history
         
     Returns:
         tuple: Updated state and session variables
@@ -246,8 +608,8 @@ def interazione_llm_su_argomento(argomento, modalita, stato_argomenti_df, stato_
             clear_topic_cache(argomento)
             st.info("Refreshing content for this topic...")
         
-        # Get the response from the cached function
-        risposta = cached_llm_studio(argomento)
+        # Mostra la lezione man mano che arriva (o subito se già in cache)
+        risposta = st.write_stream(stream_llm_studio(argomento))
         
         # If we get an error, mark this topic for refresh next time
         if "Error generating content" in risposta:
@@ -263,33 +625,23 @@ def interazione_llm_su_argomento(argomento, modalita, stato_argomenti_df, stato_
         
         # Usa metodo sequenziale per maggiore affidabilità
         with st.spinner("Generazione domanda di test..."):
-            # Prepara il prompt per la domanda
-            prompt_domanda = f"""English examiner. Create an oral exam question on:
-"{argomento}"
-Complex question requiring in-depth knowledge. Clear and specific.
-QUESTION ONLY. NO INTRODUCTION. ENGLISH ONLY."""
-            
             # Genera la domanda
-            domanda = chiamata_llm(prompt_domanda, max_tokens=300, temperature=0.7)
+            domanda = chiamata_llm(prompt_domanda_test(argomento), tipo="domanda", **PARAMETRI_DOMANDA)
             
             # Verifica se la domanda è stata generata correttamente
             if domanda.startswith("Errore") or "❌" in domanda:
                 # Se c'è un errore nella generazione della domanda, usa una domanda predefinita
-                domanda = f"Explain the key concepts of {argomento} and provide examples."
-            
-            # Prepara il prompt per la risposta modello
-            prompt_risposta_modello = f"""English expert. Answer this question about {argomento}:
-Question: {domanda}
-Comprehensive, well-structured answer (perfect score). Include terminology, examples.
-250-300 words. ENGLISH ONLY."""
+                domanda = domanda_predefinita(argomento)
             
             # Genera la risposta modello
-            risposta_modello = chiamata_llm(prompt_risposta_modello, max_tokens=800, temperature=0.5)
+            risposta_modello = chiamata_llm(
+                prompt_risposta_modello(argomento, domanda), tipo="risposta_modello", **PARAMETRI_RISPOSTA_MODELLO
+            )
             
             # Verifica se la risposta modello è stata generata correttamente
             if risposta_modello.startswith("Errore") or "❌" in risposta_modello:
                 # Se c'è un errore nella generazione della risposta modello, usa una risposta predefinita
-                risposta_modello = f"This would be a model answer for the question about {argomento}. In a real scenario, this would contain a comprehensive explanation of the topic with examples and proper terminology."
+                risposta_modello = risposta_modello_predefinita(argomento)
         
         # Salva i risultati nella sessione
         st.session_state.test_domanda = domanda
@@ -298,29 +650,8 @@ Comprehensive, well-structured answer (perfect score). Include terminology, exam
         # Aggiungi la risposta modello alla sessione per mostrarla nell'interfaccia
         st.session_state.mostra_risposta_modello = True
         
-        # Salva la domanda e la risposta modello in un file temporaneo
-        import tempfile
-        import os
-        
-        # Crea una directory temporanea se non esiste
-        temp_dir = "temp_test_files"
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-        
-        # Crea un nome file basato sull'argomento e timestamp
-        timestamp = int(time.time())
-        filename = f"{temp_dir}/test_{argomento.replace(' ', '_').replace(':', '_')}_{timestamp}.txt"
-        
-        # Salva domanda e risposta modello nel file
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(f"ARGOMENTO: {argomento}\n\n")
-            f.write(f"DOMANDA: {domanda}\n\n")
-            f.write(f"RISPOSTA MODELLO: {risposta_modello}\n\n")
-            f.write("RISPOSTA UTENTE: [Sarà aggiunta dopo la risposta dell'utente]\n\n")
-            f.write("VALUTAZIONE: [Sarà aggiunta dopo la valutazione]\n\n")
-        
-        # Salva il percorso del file nella sessione
-        st.session_state.test_file_path = filename
+        # Un record strutturato per il test, completato fase per fase
+        st.session_state.test_record_id = get_test_record_store(punteggi_file).crea(argomento, domanda, risposta_modello)
         
         # Aggiungi alla chat log solo la domanda
         chat_log.append({"utente": f"Richiesta test su '{argomento}'", "llm": domanda})
@@ -332,7 +663,8 @@ Comprehensive, well-structured answer (perfect score). Include terminology, exam
     return stato_argomenti_df, chat_log
 
 
-def submit_test_risposta(user_input, test_argomento, test_domanda, test_risposta_modello, test_file_path, 
+@profila()
+def submit_test_risposta(user_input, test_argomento, test_domanda, test_risposta_modello, test_record_id, 
                          punteggi_df, punteggi_file, stato_argomenti_df, stato_file, chat_log):
     """
     Submit test response.
@@ -342,12 +674,12 @@ def submit_test_risposta(user_input, test_argomento, test_domanda, test_risposta
         test_argomento (str): Topic name
         test_domanda (str): Test question
         test_risposta_modello (str): Model answer
-        test_file_path (str): Path to test file
+        test_record_id (str): Id of the test record
         punteggi_df (pandas.DataFrame): DataFrame containing scores
         punteggi_file (str): Path to scores file
         stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
         stato_file (str): Path to state file
-        chat_log (list): Chat history
+        chat_log (ChatHistory): Chat history
         
     Returns:
         tuple: Updated state and session variables
@@ -355,90 +687,24 @@ def submit_test_risposta(user_input, test_argomento, test_domanda, test_risposta
     from src.utils.state import aggiorna_stato_argomento
     from src.data.loader import salva_punteggio
     
-    # Aggiorna il file temporaneo con la risposta dell'utente
-    content = ""
-    if os.path.exists(test_file_path):
-        try:
-            with open(test_file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            content = content.replace("RISPOSTA UTENTE: [Sarà aggiunta dopo la risposta dell'utente]", f"RISPOSTA UTENTE: {user_input}")
-            
-            with open(test_file_path, "w", encoding="utf-8") as f:
-                f.write(content)
-        except Exception as e:
-            st.error(f"Errore nell'aggiornamento del file: {str(e)}")
-    else:
-        # Se il file non esiste, crea un nuovo file
-        content = f"ARGOMENTO: {test_argomento}\n\n"
-        content += f"DOMANDA: {test_domanda}\n\n"
-        content += f"RISPOSTA MODELLO: {test_risposta_modello}\n\n"
-        content += f"RISPOSTA UTENTE: {user_input}\n\n"
-        content += "VALUTAZIONE: [Sarà aggiunta dopo la valutazione]\n\n"
-        
-        # Crea una directory temporanea se non esiste
-        temp_dir = "temp_test_files"
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-        
-        # Crea un nuovo file
-        timestamp = int(time.time())
-        test_file_path = f"{temp_dir}/test_{test_argomento.replace(' ', '_').replace(':', '_')}_{timestamp}.txt"
-        
-        with open(test_file_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        
-        # Aggiorna il percorso del file nella sessione
-        st.session_state.test_file_path = test_file_path
+    store = get_test_record_store(punteggi_file)
+    if test_record_id is None:
+        test_record_id = store.crea(test_argomento, test_domanda, test_risposta_modello)
+        st.session_state.test_record_id = test_record_id
+    store.registra_risposta(test_record_id, user_input)
     
     # Richiedi valutazione all'LLM confrontando con la risposta modello (versione ottimizzata)
-    prompt = f"""English examiner. Evaluate student response vs model answer.
-TOPIC: {test_argomento}
-QUESTION: {test_domanda}
-MODEL: {test_risposta_modello}
-STUDENT: {user_input}
-
-Evaluate on scale 0-100:
-- Content (40%): Key points coverage
-- Language (30%): Grammar, vocabulary
-- Structure (30%): Organization, clarity
+    prompt = prompt_valutazione(test_argomento, test_domanda, test_risposta_modello, user_input)
 
-Format: SCORE: [0-100]
-COMMENT: [strengths and areas for improvement]
-ENGLISH ONLY."""
-
-    risposta = chiamata_llm(prompt, max_tokens=600, temperature=0.4)
-    
-    # Aggiorna il file temporaneo con la valutazione
-    if os.path.exists(test_file_path):
-        try:
-            with open(test_file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            content = content.replace("VALUTAZIONE: [Sarà aggiunta dopo la valutazione]", f"VALUTAZIONE: {risposta}")
-            
-            with open(test_file_path, "w", encoding="utf-8") as f:
-                f.write(content)
-        except Exception as e:
-            st.error(f"Errore nell'aggiornamento del file di valutazione: {str(e)}")
+    # Mostra la valutazione in streaming; il testo completo serve per il parsing del punteggio
+    risposta = st.write_stream(chiamata_llm_stream(prompt, tipo="valutazione", **PARAMETRI_VALUTAZIONE))
     
     # Estrai punteggio e commento
-    try:
-        # Try to extract using English format
-        if "SCORE:" in risposta:
-            punteggio_match = risposta.split("SCORE:")[1].split("\n")[0].strip()
-            punteggio = int(punteggio_match)  # Keep the original 0-100 scale
-            commento = risposta.split("COMMENT:")[1].strip()
-        else:
-            # If no format is found, use default
-            punteggio = 50  # Default on 0-100 scale
-            commento = risposta
-    except:
-        punteggio = 50  # Default in caso di errore nel parsing (0-100 scale)
-        commento = risposta
+    punteggio, commento = estrai_punteggio(risposta)
     
     # Salva il punteggio
     punteggi_df = salva_punteggio(punteggi_df, test_argomento, punteggio, commento, punteggi_file)
+    store.registra_valutazione(test_record_id, risposta, punteggio, punteggi_df["ID"].iloc[-1])
     
     # Aggiorna lo stato dell'argomento a "completato" dopo il test
     stato_argomenti_df = aggiorna_stato_argomento(stato_argomenti_df, test_argomento, "completato", stato_file)
@@ -0,0 +1,329 @@
+"""
+Rate-limit-aware batch execution of LLM calls.
+
+The rate limit is process-wide: every batch of the app draws from the
+limiter returned by get_rate_limiter(). aiohttp is imported by the first
+batch, not by the app start.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import streamlit as st
+
+BATCH_CONCURRENCY = 8
+RATE_RPM = 120
+RATE_TPM = 200000
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_minute`.
+
+    The bookkeeping is guarded by a thread lock and the wait is an
+    asyncio.sleep outside it, so one bucket can be shared by batches
+    running on different threads and event loops.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        """
+        Args:
+            rate_per_minute (float): Refill rate
+            capacity (float, optional): Bucket size. Defaults to one minute of budget.
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount=1):
+        """
+        Take `amount` tokens, waiting until the bucket has refilled them.
+
+        The tokens are reserved immediately (the balance may go negative),
+        so concurrent callers queue up in arrival order.
+
+        Args:
+            amount (float, optional): Tokens to take. Defaults to 1.
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            attesa = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if attesa > 0:
+            await asyncio.sleep(attesa)
+
+
+class RateLimiter:
+    """
+    Requests and tokens per minute budget shared by every batch.
+
+    A 429 received by any batch pauses all of them.
+    """
+
+    def __init__(self, rpm=RATE_RPM, tpm=RATE_TPM):
+        """
+        Args:
+            rpm (float, optional): Requests per minute
+            tpm (float, optional): Tokens per minute
+        """
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self._pausa_fino = 0.0
+
+    async def acquire(self, token):
+        """
+        Wait for a pause in progress, then for one request and `token` tokens.
+
+        Args:
+            token (int): Estimated tokens of the request
+        """
+        attesa = self._pausa_fino - time.monotonic()
+        if attesa > 0:
+            await asyncio.sleep(attesa)
+        await self.rpm.acquire(1)
+        await self.tpm.acquire(token)
+
+    def pausa(self, secondi):
+        """
+        Hold every request for `secondi` seconds (after a 429).
+
+        Args:
+            secondi (float): Pause length
+        """
+        self._pausa_fino = max(self._pausa_fino, time.monotonic() + secondi)
+
+
+@st.cache_resource(show_spinner=False)
+def get_rate_limiter(rpm=RATE_RPM, tpm=RATE_TPM):
+    """
+    Return the process-wide rate limiter for a budget.
+
+    Args:
+        rpm (float, optional): Requests per minute
+        tpm (float, optional): Tokens per minute
+
+    Returns:
+        RateLimiter: Shared limiter
+    """
+    return RateLimiter(rpm, tpm)
+
+
+class BatchResult:
+    """
+    Outcome of a single request in a batch.
+    """
+
+    __slots__ = ("index", "status", "content", "attempts", "http_status", "usage")
+
+    def __init__(self, index, status, content, attempts, http_status=None, usage=None):
+        self.index = index
+        self.status = status
+        self.content = content
+        self.attempts = attempts
+        self.http_status = http_status
+        self.usage = usage
+
+    @property
+    def ok(self):
+        """bool: True if the request succeeded."""
+        return self.status == "ok"
+
+    def __repr__(self):
+        return f"BatchResult(index={self.index}, status={self.status!r}, attempts={self.attempts})"
+
+
+def _retry_after(value):
+    """
+    Parse a Retry-After header.
+
+    Args:
+        value (str): Header value (seconds or HTTP date)
+
+    Returns:
+        float or None: Delay in seconds
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def stima_token(prompt, max_tokens):
+    """
+    Rough token estimate of a request (about 4 characters per token).
+
+    Args:
+        prompt (str): Prompt text
+        max_tokens (int): Maximum completion tokens
+
+    Returns:
+        int: Estimated total tokens
+    """
+    return len(prompt) // 4 + max_tokens
+
+
+class LLMBatchEngine:
+    """
+    Bounded-concurrency engine for batches of LLM calls.
+
+    Requests share one aiohttp session, at most `concurrency` are in flight,
+    and requests/tokens per minute are limited by a RateLimiter, shared
+    with the other batches when one is passed in. 429, 5xx and network
+    errors are retried with exponential backoff and full jitter, honouring
+    Retry-After; a 429 pauses every batch on the limiter. Results come
+    back in input order, one BatchResult per request.
+    """
+
+    def __init__(self, client, concurrency=BATCH_CONCURRENCY, rpm=RATE_RPM, tpm=RATE_TPM,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, ledger=None,
+                 limiter=None):
+        """
+        Args:
+            client (LLMClient): LLM client
+            concurrency (int, optional): Maximum in-flight requests
+            rpm (float, optional): Requests per minute (without a limiter)
+            tpm (float, optional): Tokens per minute (without a limiter)
+            max_retries (int, optional): Retries per request
+            backoff_base (float, optional): First backoff delay in seconds
+            backoff_max (float, optional): Maximum backoff delay in seconds
+            ledger (LLMLedger, optional): Ledger recording every request
+            limiter (RateLimiter, optional): Shared limiter. Defaults to a
+                private one with the `rpm` and `tpm` budget.
+        """
+        self.client = client
+        self.ledger = ledger
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = limiter or RateLimiter(rpm, tpm)
+
+    def _backoff(self, tentativo, retry_after=None):
+        """Delay before the next attempt."""
+        ritardo = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (tentativo - 1)))
+        if retry_after is not None:
+            ritardo = max(ritardo, retry_after)
+        return ritardo
+
+    async def _esegui(self, index, richiesta, session, headers, semaforo):
+        """Run one request and record it in the ledger (retries included in the wall time)."""
+        misure = []
+        risultato = await self._tenta(index, richiesta, session, headers, semaforo, misure)
+        if misure:
+            misure[0].chiudi(risultato.http_status, risultato.usage, None if risultato.ok else risultato.content)
+        return risultato
+
+    async def _tenta(self, index, richiesta, session, headers, semaforo, misure):
+        """
+        Run one request with retries.
+
+        The ledger measurement is opened into `misure` when the first
+        attempt is sent, so the rate limit and concurrency waits are not
+        counted as latency.
+        """
+        import aiohttp
+
+        prompt = richiesta["prompt"]
+        max_tokens = richiesta.get("max_tokens", 500)
+        payload = self.client.build_payload(prompt, max_tokens=max_tokens, temperature=richiesta.get("temperature", 0.7))
+        errore, http_status = None, None
+
+        for tentativo in range(1, self.max_retries + 2):
+            await self.limiter.acquire(stima_token(prompt, max_tokens))
+            retry_after = None
+            try:
+                async with semaforo:
+                    if self.ledger is not None and not misure:
+                        misure.append(self.ledger.misura(richiesta.get("tipo", "generico"), self.client.model))
+                    async with session.post(self.client.url, headers=headers, json=payload) as response:
+                        http_status = response.status
+                        if response.status == 200:
+                            try:
+                                result = await response.json()
+                                if "choices" in result and len(result["choices"]) > 0:
+                                    return BatchResult(index, "ok", result["choices"][0]["message"]["content"],
+                                                       tentativo, http_status, result.get("usage"))
+                            except (ValueError, KeyError, TypeError, IndexError) as e:
+                                # JSON malformato o struttura inattesa: errore del solo elemento
+                                return BatchResult(index, "error", f"❌ Errore API: Risposta non valida: {str(e)}",
+                                                   tentativo, http_status)
+                            return BatchResult(index, "error", f"❌ Errore API: Risposta non valida: {result}",
+                                               tentativo, http_status)
+                        text = await response.text()
+                        errore = f"❌ Errore API: {response.status}: {text}"
+                        if response.status not in RETRY_STATUS:
+                            return BatchResult(index, "error", errore, tentativo, http_status)
+                        retry_after = _retry_after(response.headers.get("Retry-After"))
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                errore = f"❌ Errore nella chiamata API asincrona: {str(e)}"
+
+            if tentativo > self.max_retries:
+                break
+            ritardo = self._backoff(tentativo, retry_after)
+            if http_status == 429:
+                self.limiter.pausa(ritardo)
+            await asyncio.sleep(ritardo)
+
+        return BatchResult(index, "error", errore, self.max_retries + 1, http_status)
+
+    async def run(self, richieste):
+        """
+        Execute a batch of requests.
+
+        Args:
+            richieste (list): Prompts (str) or dicts with "prompt" and optional
+                "max_tokens"/"temperature"/"tipo" (prompt type for the ledger)
+
+        Returns:
+            list: BatchResult objects in input order
+        """
+        import aiohttp
+
+        richieste = [{"prompt": r} if isinstance(r, str) else r for r in richieste]
+        try:
+            headers = self.client.headers()
+        except FileNotFoundError:
+            errore = "❌ File secrets.toml non trovato. Assicurati che il file esista nella directory .streamlit"
+            return [BatchResult(i, "error", errore, 0) for i in range(len(richieste))]
+        except Exception as e:
+            # Chiave o modello mancanti, secrets.toml non valido
+            errore = f"❌ Errore nella configurazione LLM: {str(e)}"
+            return [BatchResult(i, "error", errore, 0) for i in range(len(richieste))]
+
+        if self.client.on_client_loop():
+            session, owns_session = self.client.async_session(), False
+        else:
+            session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(
+                sock_connect=self.client.connect_timeout, sock_read=self.client.read_timeout
+            ))
+            owns_session = True
+
+        semaforo = asyncio.Semaphore(self.concurrency)
+        try:
+            return list(await asyncio.gather(*(
+                self._esegui(i, r, session, headers, semaforo) for i, r in enumerate(richieste)
+            )))
+        finally:
+            if owns_session:
+                await session.close()
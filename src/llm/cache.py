@@ -0,0 +1,205 @@
+"""
+Persistent on-disk cache for LLM responses.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+CACHE_FILE = ".cache/llm_cache.sqlite3"
+CACHE_TTL = 7 * 24 * 3600  # Le lezioni per un argomento cambiano raramente
+CACHE_MAX_ENTRIES = 2000
+CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+
+def make_key(model, prompt, max_tokens, temperature):
+    """
+    Build the cache key for an LLM request.
+
+    Args:
+        model (str): Model identifier
+        prompt (str): Prompt text
+        max_tokens (int): Maximum number of tokens
+        temperature (float): Temperature parameter
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    raw = json.dumps([model, prompt, int(max_tokens), float(temperature)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-backed LLM response cache.
+
+    Entries expire after `ttl` seconds and are evicted in least-recently-used
+    order once the cache exceeds `max_entries` or `max_bytes`. Every entry
+    records the topic it belongs to, so a single topic can be invalidated.
+    """
+
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        """
+        Args:
+            path (str, optional): SQLite database path
+            ttl (float, optional): Time-to-live in seconds (None disables expiry)
+            max_entries (int, optional): Maximum number of entries
+            max_bytes (int, optional): Maximum total size of cached responses
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS risposte (
+                chiave TEXT PRIMARY KEY,
+                argomento TEXT,
+                risposta TEXT NOT NULL,
+                dimensione INTEGER NOT NULL,
+                creato REAL NOT NULL,
+                ultimo_accesso REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_risposte_argomento ON risposte(argomento)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_risposte_accesso ON risposte(ultimo_accesso)")
+
+    def get(self, key):
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): Cache key (see make_key)
+
+        Returns:
+            str or None: Cached response, or None on miss or expiry
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT risposta, creato FROM risposte WHERE chiave = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM risposte WHERE chiave = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE risposte SET ultimo_accesso = ? WHERE chiave = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def contains(self, key):
+        """
+        Check whether a valid entry exists, without touching the counters.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            bool: True if the entry exists and has not expired
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT creato FROM risposte WHERE chiave = ?", (key,)).fetchone()
+        return row is not None and (self.ttl is None or time.time() - row[0] <= self.ttl)
+
+    def put(self, key, response, topic=None):
+        """
+        Store a response and evict old entries if the cache is over budget.
+
+        Args:
+            key (str): Cache key
+            response (str): LLM response
+            topic (str, optional): Topic the response belongs to
+        """
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO risposte VALUES (?, ?, ?, ?, ?, ?)",
+                (key, topic, response, size, now, now)
+            )
+            self._evict()
+            self._conn.execute("COMMIT")
+
+    def _evict(self):
+        """Drop expired entries, then least-recently-used ones until within budget."""
+        if self.ttl is not None:
+            self._conn.execute("DELETE FROM risposte WHERE creato < ?", (time.time() - self.ttl,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(dimensione), 0) FROM risposte").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        to_delete = []
+        for key, size in self._conn.execute("SELECT chiave, dimensione FROM risposte ORDER BY ultimo_accesso"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM risposte WHERE chiave = ?", to_delete)
+
+    def invalidate_topic(self, topic):
+        """
+        Remove every cached response for a topic.
+
+        Args:
+            topic (str): Topic name
+
+        Returns:
+            int: Number of removed entries
+        """
+        with self._lock:
+            return self._conn.execute("DELETE FROM risposte WHERE argomento = ?", (topic,)).rowcount
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM risposte")
+
+    def stats(self):
+        """
+        Return cache statistics.
+
+        Returns:
+            dict: Hits, misses, hit rate, entry count and total size
+        """
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(dimensione), 0) FROM risposte"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm_cache():
+    """
+    Return the process-wide LLM response cache.
+
+    Returns:
+        LLMCache: Shared cache
+    """
+    return LLMCache()
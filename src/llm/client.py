@@ -0,0 +1,251 @@
+"""
+Pooled HTTP client for the OpenRouter chat/completions API.
+
+The API base URL defaults to OpenRouter and can be pointed at any
+compatible server (e.g. the local stand-in in benchmarks/) with the
+OPENROUTER_BASE_URL environment variable or a "base_url" key in the
+[openrouter_api_key] section of secrets.toml; the environment wins.
+
+requests and aiohttp are imported when the first call needs them, so
+that creating the client (e.g. for the lesson cache keys) does not
+slow down the app start.
+"""
+
+import asyncio
+import os
+import threading
+
+import streamlit as st
+import toml
+
+SECRETS_FILE = ".streamlit/secrets.toml"
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+POOL_SIZE = 10
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 120
+
+
+class LLMClient:
+    """
+    Process-wide LLM client.
+
+    Holds a keep-alive connection pool for synchronous calls and a dedicated
+    event loop (running in a daemon thread) with a long-lived aiohttp session
+    for asynchronous calls, so warm requests skip the TCP+TLS handshake.
+    The secrets file is parsed once and reloaded only when its mtime changes.
+    """
+
+    def __init__(self, secrets_file=SECRETS_FILE, url=None, pool_size=POOL_SIZE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT):
+        """
+        Args:
+            secrets_file (str, optional): Path to secrets.toml
+            url (str, optional): chat/completions endpoint. Defaults to the configured base URL.
+            pool_size (int, optional): Maximum number of pooled connections
+            connect_timeout (float, optional): Connect timeout in seconds
+            read_timeout (float, optional): Read timeout in seconds
+        """
+        self.secrets_file = secrets_file
+        self._url = url
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+
+        self._lock = threading.Lock()
+        self._config = None
+        self._config_mtime = None
+        self._headers = None
+
+        # Pool di connessioni keep-alive per le chiamate sincrone (creato al primo uso)
+        self._session = None
+
+        # Event loop dedicato per le chiamate asincrone (creato al primo uso)
+        self._loop = None
+        self._loop_thread = None
+        self._async_session = None
+
+    def config(self):
+        """
+        Return the LLM configuration, reloading secrets.toml only if it changed.
+
+        Returns:
+            dict: Configuration with "api_key", "model" and "base_url" keys
+
+        Raises:
+            FileNotFoundError: If the secrets file does not exist
+        """
+        mtime = os.stat(self.secrets_file).st_mtime
+        with self._lock:
+            if self._config is None or mtime != self._config_mtime:
+                secrets = toml.load(self.secrets_file)["openrouter_api_key"]
+                self._config = {
+                    "api_key": secrets["openrouter_api_key"],
+                    "model": secrets["model"],
+                    "base_url": secrets.get("base_url", OPENROUTER_BASE_URL),
+                }
+                self._headers = {
+                    "Authorization": f"Bearer {self._config['api_key']}",
+                    "Content-Type": "application/json",
+                    "HTTP-Referer": "https://yourapp.com",
+                    "X-Title": "Studio Orale AS2B"
+                }
+                self._config_mtime = mtime
+            return self._config
+
+    @property
+    def session(self):
+        """requests.Session: Keep-alive connection pool for synchronous calls."""
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def url(self):
+        """str: chat/completions endpoint."""
+        if self._url:
+            return self._url
+        base_url = os.environ.get("OPENROUTER_BASE_URL") or self.config()["base_url"]
+        return f"{base_url.rstrip('/')}/chat/completions"
+
+    @property
+    def model(self):
+        """str: Model identifier from the current configuration."""
+        return self.config()["model"]
+
+    def headers(self):
+        """
+        Return the request headers for the current configuration.
+
+        Returns:
+            dict: HTTP headers
+        """
+        self.config()
+        return self._headers
+
+    def build_payload(self, prompt, max_tokens=500, temperature=0.7, stream=False, messages=None):
+        """
+        Build a chat/completions payload.
+
+        Args:
+            prompt (str): Prompt text, sent as a single user message
+            max_tokens (int, optional): Maximum number of tokens to generate. Defaults to 500.
+            temperature (float, optional): Temperature parameter. Defaults to 0.7.
+            stream (bool, optional): Request an SSE stream. Defaults to False.
+            messages (list, optional): Full message list, used instead of `prompt`
+
+        Returns:
+            dict: Request payload
+        """
+        return {
+            "model": self.model,
+            "messages": messages or [{"role": "user", "content": prompt}],
+            "stream": stream,
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+
+    def post(self, payload, stream=False):
+        """
+        Send a payload through the pooled session.
+
+        Args:
+            payload (dict): Request payload
+            stream (bool, optional): Do not read the body eagerly. Defaults to False.
+
+        Returns:
+            requests.Response: HTTP response
+        """
+        return self.session.post(
+            self.url,
+            headers=self.headers(),
+            json=payload,
+            timeout=(self.connect_timeout, self.read_timeout),
+            stream=stream
+        )
+
+    def _ensure_loop(self):
+        """Start the background event loop if it is not running yet."""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="llm-client-loop", daemon=True
+                )
+                self._loop_thread.start()
+        return self._loop
+
+    def async_session(self):
+        """
+        Return the shared aiohttp session.
+
+        Must be called from a coroutine running on the client's event loop
+        (see run_async).
+
+        Returns:
+            aiohttp.ClientSession: Long-lived session
+        """
+        if self._async_session is None or self._async_session.closed:
+            import aiohttp
+
+            self._async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self.connect_timeout, sock_read=self.read_timeout
+                )
+            )
+        return self._async_session
+
+    def on_client_loop(self):
+        """
+        Check whether the caller is running on the client's event loop.
+
+        Returns:
+            bool: True if the current running loop is the client's loop
+        """
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def run_async(self, coro):
+        """
+        Run a coroutine on the client's event loop and wait for its result.
+
+        Args:
+            coro (coroutine): Coroutine to execute
+
+        Returns:
+            object: Coroutine result
+        """
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self):
+        """Close the pooled sessions and stop the background loop."""
+        if self._session is not None:
+            self._session.close()
+        if self._loop is not None:
+            if self._async_session is not None and not self._async_session.closed:
+                asyncio.run_coroutine_threadsafe(self._async_session.close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm_client():
+    """
+    Return the process-wide LLM client shared by every session.
+
+    Returns:
+        LLMClient: Shared client
+    """
+    return LLMClient()
@@ -0,0 +1,197 @@
+"""
+Token-budgeted conversation context for the free chat.
+
+The request sent to the tutor holds a system prompt, a rolling summary of
+the older turns and as many recent turns as fit in the token budget.
+The summary is regenerated only when the turns not covered by it overflow
+the budget; it then absorbs enough turns to free half of the budget, so
+the next regeneration is several turns away. Turns are folded in chunks
+whose summary prompt fits the budget, and the log is read one block at a
+time: a request never holds more than the window plus one chunk. The
+summary is stored with the chat history after each chunk, so it survives
+restarts.
+"""
+
+import os
+import re
+
+from src.llm.api import chiamata_llm
+
+BUDGET_CONTESTO = int(os.environ.get("DASHBOARD_CHAT_BUDGET", 3000))  # Token di prompt per richiesta
+TOKEN_PER_MESSAGGIO = 4  # Overhead di ruolo e separatori di ogni messaggio
+PASSO_LETTURA = 10  # Turni letti dal log per volta
+PARAMETRI_RIASSUNTO = {"max_tokens": 300, "temperature": 0.3}
+PROMPT_SISTEMA = (
+    "You are an English language tutor helping a student prepare for an oral exam. "
+    "Use the conversation so far as context. RESPOND ONLY IN ENGLISH."
+)
+
+_PEZZI = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def conta_token(testo):
+    """
+    Fast local token estimate.
+
+    Words count one token every 4 characters (at least one), punctuation
+    one token per symbol: close enough to BPE tokenizers for budgeting,
+    without loading a tokenizer.
+
+    Args:
+        testo (str): Text
+
+    Returns:
+        int: Estimated tokens
+    """
+    return sum((len(p) + 3) // 4 for p in _PEZZI.findall(testo or ""))
+
+
+def conta_token_messaggi(messaggi):
+    """
+    Estimate the prompt tokens of a message list.
+
+    Args:
+        messaggi (list): Chat messages
+
+    Returns:
+        int: Estimated tokens
+    """
+    return sum(conta_token(m["content"]) + TOKEN_PER_MESSAGGIO for m in messaggi)
+
+
+def prompt_riassunto(riassunto, turni):
+    """
+    Build the prompt that folds turns into the rolling summary.
+
+    Args:
+        riassunto (str): Current summary (may be empty)
+        turni (list): Turns to add to the summary
+
+    Returns:
+        str: Prompt text
+    """
+    conversazione = "\n".join(f"Student: {t['utente']}\nTutor: {t['llm']}" for t in turni)
+    return f"""Summarize this tutoring conversation for later reference.
+
+Previous summary:
+{riassunto or "(none)"}
+
+New turns:
+{conversazione}
+
+Keep topics covered, the student's questions, mistakes and key explanations.
+At most 150 words. SUMMARY ONLY. ENGLISH ONLY."""
+
+
+def _messaggi_turno(turno):
+    return [
+        {"role": "user", "content": turno["utente"]},
+        {"role": "assistant", "content": turno["llm"]},
+    ]
+
+
+class ConversationContext:
+    """
+    Rolling summary plus budgeted recent turns of one chat session.
+
+    The summary itself is kept by the ChatHistory; the attributes mirror
+    it for the last request.
+    """
+
+    def __init__(self, budget=BUDGET_CONTESTO, riassumi=None):
+        """
+        Args:
+            budget (int, optional): Prompt token budget per request
+            riassumi (callable, optional): prompt -> summary text. Defaults to chiamata_llm.
+        """
+        self.budget = budget
+        self.riassumi = riassumi or (lambda prompt: chiamata_llm(prompt, tipo="riassunto", **PARAMETRI_RIASSUNTO))
+        self.riassunto = ""
+        self.riassunti_fino_a = 0  # Indice del primo turno non coperto dal riassunto
+        self.riassunti_generati = 0
+        self.ultimo_prompt_token = 0
+
+    def _base(self, messaggio):
+        """System prompt, summary and the new user message."""
+        sistema = PROMPT_SISTEMA
+        if self.riassunto:
+            sistema += f"\n\nSummary of the earlier conversation:\n{self.riassunto}"
+        return [{"role": "system", "content": sistema}], [{"role": "user", "content": messaggio}]
+
+    def _finestra(self, turni, disponibili):
+        """Index of the oldest turn such that the turns from there on fit."""
+        inizio = len(turni)
+        for i in range(len(turni) - 1, -1, -1):
+            costo = conta_token_messaggi(_messaggi_turno(turni[i]))
+            if costo > disponibili:
+                break
+            disponibili -= costo
+            inizio = i
+        return inizio
+
+    def _leggi_finestra(self, chat_log, minimo, disponibili):
+        """Most recent turns (not before minimo) that fit, read backwards one block at a time."""
+        blocchi = []
+        fine = len(chat_log)
+        while fine > minimo:
+            blocco = chat_log.intervallo(max(minimo, fine - PASSO_LETTURA), fine)
+            for i in range(len(blocco) - 1, -1, -1):
+                costo = conta_token_messaggi(_messaggi_turno(blocco[i]))
+                if costo > disponibili:
+                    blocchi.append(blocco[i + 1:])
+                    return [t for b in reversed(blocchi) for t in b]
+                disponibili -= costo
+            blocchi.append(blocco)
+            fine -= len(blocco)
+        return [t for b in reversed(blocchi) for t in b]
+
+    def _blocco(self, chat_log, inizio, fine):
+        """Turns from inizio (before fine) whose summary prompt fits the budget, at least one."""
+        blocco = chat_log.intervallo(inizio, min(fine, inizio + PASSO_LETTURA))
+        disponibili = self.budget - conta_token(prompt_riassunto(self.riassunto, []))
+        for i, turno in enumerate(blocco):
+            disponibili -= conta_token_messaggi(_messaggi_turno(turno))
+            if disponibili < 0 and i > 0:
+                return blocco[:i]
+        return blocco
+
+    def messaggi(self, chat_log, messaggio):
+        """
+        Build the messages of a new chat request.
+
+        Args:
+            chat_log (ChatHistory): Chat history (without the new message)
+            messaggio (str): New user message
+
+        Returns:
+            tuple: (messages, estimated prompt tokens)
+        """
+        self.riassunto, self.riassunti_fino_a = chat_log.riassunto()
+        if self.riassunti_fino_a > len(chat_log):
+            # Turni coperti dal riassunto già cancellati dal log: riparti da zero
+            self.riassunto, self.riassunti_fino_a = "", 0
+        testa, coda = self._base(messaggio)
+        turni = self._leggi_finestra(chat_log, self.riassunti_fino_a, self.budget - conta_token_messaggi(testa + coda))
+        inizio = len(chat_log) - len(turni)
+
+        if inizio > self.riassunti_fino_a:
+            # Budget superato: i turni esclusi (e quanti servono a liberare metà
+            # budget) confluiscono nel riassunto, un blocco alla volta
+            fino_a = inizio + self._finestra(turni, self.budget // 2 - conta_token_messaggi(testa + coda))
+            while self.riassunti_fino_a < fino_a:
+                blocco = self._blocco(chat_log, self.riassunti_fino_a, fino_a)
+                riassunto = self.riassumi(prompt_riassunto(self.riassunto, blocco))
+                if not riassunto or riassunto.startswith("❌"):
+                    # Se il riassunto fallisce, la richiesta usa solo i turni che stanno nel budget
+                    break
+                self.riassunto = riassunto.strip()
+                self.riassunti_fino_a += len(blocco)
+                self.riassunti_generati += 1
+                chat_log.salva_riassunto(self.riassunto, self.riassunti_fino_a)
+            turni = turni[max(0, self.riassunti_fino_a - inizio):]
+            testa, coda = self._base(messaggio)
+            turni = turni[self._finestra(turni, self.budget - conta_token_messaggi(testa + coda)):]
+
+        messaggi = testa + [m for t in turni for m in _messaggi_turno(t)] + coda
+        self.ultimo_prompt_token = conta_token_messaggi(messaggi)
+        return messaggi, self.ultimo_prompt_token
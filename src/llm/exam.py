@@ -0,0 +1,129 @@
+"""
+Mock exam ("simulazione esame") for the Dashboard Studio application.
+
+Questions, model answers and grades for all drawn topics are generated
+concurrently through the batch engine, so each phase costs roughly one
+LLM round trip instead of one per topic.
+"""
+
+from src.llm.api import (
+    PARAMETRI_DOMANDA,
+    PARAMETRI_RISPOSTA_MODELLO,
+    PARAMETRI_VALUTAZIONE,
+    domanda_predefinita,
+    estrai_punteggio,
+    prompt_domanda_test,
+    prompt_risposta_modello,
+    prompt_valutazione,
+    risposta_modello_predefinita,
+    run_llm_batch,
+)
+from src.data.records import get_test_record_store
+
+# Peso di estrazione per stato: gli argomenti meno preparati escono più spesso
+PESI_STATO = {"non iniziato": 3.0, "da ripassare": 2.0, "completato": 1.0}
+NUMERO_DOMANDE = 5
+
+
+def estrai_argomenti_esame(stato_argomenti_df, n=NUMERO_DOMANDE, seed=None):
+    """
+    Draw exam topics, weighted toward "non iniziato" and "da ripassare".
+    
+    Args:
+        stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+        n (int, optional): Number of topics. Defaults to NUMERO_DOMANDE.
+        seed (int, optional): Random seed
+        
+    Returns:
+        list: Drawn topic names (without repetitions)
+    """
+    n = min(n, len(stato_argomenti_df))
+    if n == 0:
+        return []
+    pesi = stato_argomenti_df["Stato"].map(PESI_STATO).fillna(PESI_STATO["non iniziato"])
+    return stato_argomenti_df.sample(n=n, weights=pesi, random_state=seed)["Argomento"].tolist()
+
+
+def genera_simulazione(argomenti):
+    """
+    Generate question and model answer for every topic concurrently.
+    
+    Args:
+        argomenti (list): Topic names
+        
+    Returns:
+        list: One dict per topic with "argomento", "domanda",
+            "risposta_modello" and an empty "risposta_utente"
+    """
+    risultati = run_llm_batch([
+        {"prompt": prompt_domanda_test(a), "tipo": "domanda", **PARAMETRI_DOMANDA} for a in argomenti
+    ])
+    domande = [
+        r.content if r.ok and r.content else domanda_predefinita(a)
+        for a, r in zip(argomenti, risultati)
+    ]
+    
+    risultati = run_llm_batch([
+        {"prompt": prompt_risposta_modello(a, d), "tipo": "risposta_modello", **PARAMETRI_RISPOSTA_MODELLO}
+        for a, d in zip(argomenti, domande)
+    ])
+    risposte_modello = [
+        r.content if r.ok and r.content else risposta_modello_predefinita(a)
+        for a, r in zip(argomenti, risultati)
+    ]
+    
+    return [
+        {"argomento": a, "domanda": d, "risposta_modello": m, "risposta_utente": ""}
+        for a, d, m in zip(argomenti, domande, risposte_modello)
+    ]
+
+
+def valuta_simulazione(domande, punteggi_df, punteggi_file, stato_argomenti_df, stato_file):
+    """
+    Grade every answer concurrently and persist the results in one batch.
+    
+    Args:
+        domande (list): Items returned by genera_simulazione, with "risposta_utente" filled in
+        punteggi_df (pandas.DataFrame): DataFrame containing scores
+        punteggi_file (str): Path to scores file
+        stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+        stato_file (str): Path to state file
+        
+    Returns:
+        tuple: (items with "valutazione", "punteggio" and "esito", updated
+            punteggi_df, updated stato_argomenti_df)
+    """
+    from src.data.loader import salva_punteggi
+    from src.utils.state import aggiorna_stati_argomenti
+    
+    risultati = run_llm_batch([
+        {
+            "prompt": prompt_valutazione(d["argomento"], d["domanda"], d["risposta_modello"], d["risposta_utente"]),
+            "tipo": "valutazione",
+            **PARAMETRI_VALUTAZIONE
+        }
+        for d in domande
+    ])
+    
+    righe = []
+    superate = []
+    valutate = []
+    for d, r in zip(domande, risultati):
+        d = dict(d, valutazione=r.content, esito=r.status, punteggio=None)
+        if r.ok:
+            d["punteggio"], commento = estrai_punteggio(r.content)
+            righe.append({"Argomento": d["argomento"], "Punteggio": d["punteggio"], "Commento": commento})
+            superate.append(d)
+        valutate.append(d)
+    
+    # Una sola scrittura per i punteggi, una per i record dei test e una per gli stati
+    punteggi_df = salva_punteggi(punteggi_df, righe, punteggi_file)
+    if righe:
+        get_test_record_store(punteggi_file).aggiungi([
+            dict(d, punteggio_id=punteggio_id)
+            for d, punteggio_id in zip(superate, punteggi_df["ID"].iloc[-len(righe):])
+        ])
+        stato_argomenti_df = aggiorna_stati_argomenti(
+            stato_argomenti_df, [r["Argomento"] for r in righe], "completato", stato_file
+        )
+    return valutate, punteggi_df, stato_argomenti_df
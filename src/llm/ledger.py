@@ -0,0 +1,199 @@
+"""
+Ledger of LLM calls for the Dashboard Studio application.
+
+Every call (or lesson cache hit) is one row of a local SQLite table with
+its prompt type, model, wall time, time to first token, token usage,
+HTTP status and cache-hit flag. The ops tab aggregates it into latency
+percentiles and throughput per prompt type.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+LEDGER_FILE = ".cache/llm_ledger.sqlite3"
+COLONNE = [
+    "inizio", "tipo", "modello", "durata", "ttft", "prompt_token",
+    "completion_token", "http_status", "cache_hit", "errore",
+]
+
+
+class Misura:
+    """
+    Timer of a single LLM call, recorded in the ledger when closed.
+    """
+
+    def __init__(self, ledger, tipo, modello):
+        self.ledger = ledger
+        self.tipo = tipo
+        self.modello = modello
+        self.inizio = time.time()
+        self._t0 = time.perf_counter()
+        self.ttft = None
+
+    def primo_token(self):
+        """Mark the arrival of the first streamed chunk."""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._t0
+
+    def chiudi(self, http_status=None, usage=None, errore=None):
+        """
+        Record the call.
+
+        Args:
+            http_status (int, optional): Final HTTP status
+            usage (dict, optional): "usage" field of the response
+            errore (str, optional): Error message
+        """
+        self.ledger.registra(
+            self.tipo, self.modello, time.perf_counter() - self._t0, ttft=self.ttft, usage=usage,
+            http_status=http_status, errore=errore, inizio=self.inizio
+        )
+
+
+class LLMLedger:
+    """
+    Append-only SQLite ledger of LLM calls.
+    """
+
+    def __init__(self, path=LEDGER_FILE):
+        """
+        Args:
+            path (str, optional): Database path
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chiamate (
+                inizio REAL NOT NULL,
+                tipo TEXT NOT NULL,
+                modello TEXT,
+                durata REAL,
+                ttft REAL,
+                prompt_token INTEGER,
+                completion_token INTEGER,
+                http_status INTEGER,
+                cache_hit INTEGER NOT NULL DEFAULT 0,
+                errore TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_chiamate_inizio ON chiamate(inizio);
+        """)
+
+    def misura(self, tipo, modello):
+        """
+        Start timing a call.
+
+        Args:
+            tipo (str): Prompt type (lezione, domanda, risposta_modello, valutazione, chat, ...)
+            modello (str): Model identifier
+
+        Returns:
+            Misura: Timer to close when the call ends
+        """
+        return Misura(self, tipo, modello)
+
+    def registra(self, tipo, modello, durata, ttft=None, usage=None, http_status=None,
+                 cache_hit=False, errore=None, inizio=None):
+        """
+        Record one call.
+
+        Args:
+            tipo (str): Prompt type
+            modello (str): Model identifier
+            durata (float): Wall time in seconds
+            ttft (float, optional): Time to first token in seconds
+            usage (dict, optional): "usage" field of the response
+            http_status (int, optional): Final HTTP status
+            cache_hit (bool, optional): Served from the cache
+            errore (str, optional): Error message
+            inizio (float, optional): Start timestamp. Defaults to now - durata.
+        """
+        usage = usage or {}
+        riga = (
+            inizio if inizio is not None else time.time() - durata, tipo, modello, durata, ttft,
+            usage.get("prompt_tokens"), usage.get("completion_tokens"), http_status, int(cache_hit),
+            errore[:500] if errore else None,
+        )
+        try:
+            with self._lock:
+                self.conn.execute("INSERT INTO chiamate VALUES (%s)" % ", ".join("?" * len(COLONNE)), riga)
+        except sqlite3.Error:
+            # Il ledger è diagnostico: non deve mai far fallire una chiamata
+            pass
+
+    def carica(self, dal=None):
+        """
+        Load the recorded calls.
+
+        Args:
+            dal (float, optional): Only calls started after this timestamp
+
+        Returns:
+            pandas.DataFrame: Calls with the COLONNE columns
+        """
+        with self._lock:
+            righe = self.conn.execute(
+                "SELECT %s FROM chiamate WHERE inizio >= ? ORDER BY inizio" % ", ".join(COLONNE), (dal or 0,)
+            ).fetchall()
+        return pd.DataFrame(righe, columns=COLONNE)
+
+    def statistiche(self, dal=None):
+        """
+        Aggregate latency and throughput per prompt type.
+
+        Latency percentiles only consider calls that reached the API
+        (cache hits are counted separately).
+
+        Args:
+            dal (float, optional): Only calls started after this timestamp
+
+        Returns:
+            pandas.DataFrame: One row per prompt type
+        """
+        df = self.carica(dal)
+        if df.empty:
+            return pd.DataFrame()
+        righe = []
+        for tipo, gruppo in df.groupby("tipo"):
+            api = gruppo[gruppo["cache_hit"] == 0]
+            durate = api["durata"].to_numpy(dtype=float)
+            ttft = api["ttft"].dropna().to_numpy(dtype=float)
+            finestra = max(gruppo["inizio"].max() + gruppo["durata"].iloc[-1] - gruppo["inizio"].min(), 1.0)
+            completion = api["completion_token"].sum(min_count=1)
+            p50, p95, p99 = np.percentile(durate, [50, 95, 99]) if len(durate) else (np.nan,) * 3
+            righe.append({
+                "Tipo": tipo,
+                "Chiamate": len(gruppo),
+                "Cache hit": int(gruppo["cache_hit"].sum()),
+                "Errori": int(gruppo["errore"].notna().sum()),
+                "p50 (s)": p50,
+                "p95 (s)": p95,
+                "p99 (s)": p99,
+                "TTFT p50 (s)": np.percentile(ttft, 50) if len(ttft) else np.nan,
+                "Token prompt medi": api["prompt_token"].mean(),
+                "Token risposta medi": api["completion_token"].mean(),
+                "Chiamate/min": len(gruppo) / finestra * 60,
+                "Token/s": completion / durate.sum() if durate.sum() > 0 and pd.notna(completion) else np.nan,
+            })
+        return pd.DataFrame(righe)
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm_ledger():
+    """
+    Return the process-wide LLM call ledger.
+
+    Returns:
+        LLMLedger: Shared ledger
+    """
+    return LLMLedger()
@@ -0,0 +1,133 @@
+"""
+Background prefetching of study lessons.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+from src.llm.api import chiave_lezione, genera_lezione
+from src.llm.cache import get_llm_cache
+from src.llm.client import get_llm_client
+
+PREFETCH_WORKERS = 2
+RIPROVA_DOPO = 300  # Secondi prima di ritentare il prefetch di un argomento fallito
+
+
+class LessonPrefetcher:
+    """
+    Warms the lesson cache on a small pool of worker threads.
+
+    Submitting never blocks the Streamlit script thread; at most
+    `max_workers` lessons are generated concurrently and each topic is
+    queued at most once while it is in flight. A topic whose generation
+    failed is skipped until `riprova_dopo` seconds have passed.
+    """
+
+    def __init__(self, client, cache, max_workers=PREFETCH_WORKERS, riprova_dopo=RIPROVA_DOPO):
+        """
+        Args:
+            client (LLMClient): LLM client
+            cache (LLMCache): Lesson cache
+            max_workers (int, optional): Maximum concurrent generations
+            riprova_dopo (float, optional): Seconds before a failed topic is retried
+        """
+        self.client = client
+        self.cache = cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="lesson-prefetch")
+        self._lock = threading.Lock()
+        self._in_corso = set()
+        self.riprova_dopo = riprova_dopo
+        self.falliti = {}  # argomento -> istante dell'ultimo fallimento
+
+    def prefetch(self, argomenti):
+        """
+        Queue lesson generation for the topics not already cached.
+
+        Args:
+            argomenti (list): Topic names
+
+        Returns:
+            int: Number of newly queued topics
+        """
+        accodati = 0
+        for argomento in argomenti:
+            with self._lock:
+                if argomento in self._in_corso:
+                    continue
+                fallito = self.falliti.get(argomento)
+                if fallito is not None:
+                    if time.monotonic() - fallito < self.riprova_dopo:
+                        continue
+                    del self.falliti[argomento]
+            try:
+                if self.is_ready(argomento):
+                    continue
+            except Exception:
+                # Configurazione LLM mancante: niente prefetch
+                return accodati
+            with self._lock:
+                self._in_corso.add(argomento)
+            self._executor.submit(self._genera, argomento)
+            accodati += 1
+        return accodati
+
+    def _genera(self, argomento):
+        """Worker body: generate one lesson and record the outcome."""
+        try:
+            ok = genera_lezione(argomento, self.client, self.cache)
+        except Exception:
+            ok = False
+        with self._lock:
+            self._in_corso.discard(argomento)
+            if not ok:
+                # Non riprovare ad ogni rerun: il click su 📖 gestirà l'errore
+                self.falliti[argomento] = time.monotonic()
+
+    def is_ready(self, argomento):
+        """
+        Check whether a topic's lesson is already cached.
+
+        Args:
+            argomento (str): Topic name
+
+        Returns:
+            bool: True if the lesson can be served from the cache
+        """
+        return self.cache.contains(chiave_lezione(argomento, self.client))
+
+    def dimentica(self, argomento):
+        """
+        Forget a failed generation, so the topic is prefetched again.
+
+        Args:
+            argomento (str): Topic name
+        """
+        with self._lock:
+            self.falliti.pop(argomento, None)
+
+    def in_progress(self, argomento):
+        """
+        Check whether a topic's lesson is being generated.
+
+        Args:
+            argomento (str): Topic name
+
+        Returns:
+            bool: True if the topic is queued or running
+        """
+        with self._lock:
+            return argomento in self._in_corso
+
+
+@st.cache_resource(show_spinner=False)
+def get_lesson_prefetcher():
+    """
+    Return the process-wide lesson prefetcher.
+
+    Returns:
+        LessonPrefetcher: Shared prefetcher
+    """
+    return LessonPrefetcher(get_llm_client(), get_llm_cache())
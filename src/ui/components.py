@@ -3,28 +3,36 @@ UI components for the Dashboard Studio application.
 """
 
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
 from datetime import datetime, timedelta
-import os
+import calendar
+import math
 
-from src.llm.api import interazione_llm_su_argomento, submit_test_risposta, chiamata_llm
-from src.utils.state import aggiorna_stato_argomento, elimina_test
+from src.llm.api import submit_test_risposta, chiamata_llm_stream
+from src.data.records import get_test_record_store
+from src.llm.cache import get_llm_cache
+from src.llm.context import ConversationContext
+from src.llm.ledger import get_llm_ledger
+from src.llm.prefetch import get_lesson_prefetcher
+from src.utils.state import elimina_punteggi
+from src.utils.profiling import profila
+from src.utils.topic_index import indice_stati
 
+FINESTRA_CHAT = 10  # Turni della chat mostrati per pagina
+PAGINA_STORICO_PUNTEGGI = 25  # Righe per pagina nella tabella dei punteggi
+PAGINA_STORICO_DETTAGLIATO = 10  # Test per pagina nello storico dettagliato
+
+@profila()
 def mostra_calendario_tradizionale(calendario_studio, oggi, data_esame):
     """
     Display traditional calendar.
     
     Args:
-        calendario_studio (pandas.DataFrame): DataFrame containing study calendar
+        calendario_studio (StudyCalendar): Study calendar
         oggi (datetime.date): Current date
         data_esame (datetime.date): Exam date
     """
     st.subheader("📆 Calendario Studio Preparatorio")
     
-    # Convert calendar dates to datetime
-    calendario_studio['Data'] = pd.to_datetime(calendario_studio['Data'])
-    
     # Get the start and end dates
     start_date = oggi
     end_date = data_esame.date()
@@ -67,7 +75,10 @@ def mostra_calendario_tradizionale(calendario_studio, oggi, data_esame):
         # Calculate starting day offset
         start_offset = selected_month.weekday()
         current_day = 1
-        max_days = (selected_month.replace(month=selected_month.month+1, day=1) - timedelta(days=1)).day
+        max_days = calendar.monthrange(selected_month.year, selected_month.month)[1]
+        
+        # Slice of the selected month: day of month -> topics
+        giorni_mese = calendario_studio.mese(selected_month.year, selected_month.month)
         
         # Generate calendar rows
         while current_day <= max_days:
@@ -78,8 +89,7 @@ def mostra_calendario_tradizionale(calendario_studio, oggi, data_esame):
                 else:
                     cell_date = datetime(selected_month.year, selected_month.month, current_day)
                     # Get topics for this day
-                    day_topics = calendario_studio[calendario_studio['Data'].dt.date == cell_date.date()]['Argomenti']
-                    topics = day_topics.iloc[0] if not day_topics.empty else []
+                    topics = giorni_mese.get(current_day, [])
                     
                     # Style current day
                     style = "background: #e6f7ff; border-radius: 5px; padding: 5px;" if cell_date.date() == oggi else ""
@@ -109,6 +119,7 @@ def mostra_calendario_tradizionale(calendario_studio, oggi, data_esame):
     
     return None
 
+@profila()
 def mostra_lista_completa_argomenti(argomenti_df, stato_argomenti_df):
     """
     Display complete list of topics.
@@ -135,6 +146,8 @@ def mostra_lista_completa_argomenti(argomenti_df, stato_argomenti_df):
                 macro_argomenti["Generale"] = []
             macro_argomenti["Generale"].append(argomento)
     
+    indice = indice_stati(stato_argomenti_df)
+    
     # Display in scrollable container
     with st.container(height=400):
         for macro, argomenti in macro_argomenti.items():
@@ -142,8 +155,7 @@ def mostra_lista_completa_argomenti(argomenti_df, stato_argomenti_df):
                 for arg in argomenti:
                     full_arg = f"{macro}: {arg}" if macro != "Generale" else arg
                     # Handle missing topics
-                    matches = stato_argomenti_df.loc[stato_argomenti_df.Argomento == full_arg, "Stato"]
-                    stato_corrente = matches.values[0] if not matches.empty else "non iniziato"
+                    stato_corrente = indice.stato(full_arg)
                     # Etichette aggiornate secondo la nuova logica:
                     # - Completati: dopo aver fatto il test dell'argomento
                     # - Da ripassare: se hai fatto solo la funzione studio dell'argomento
@@ -185,12 +197,13 @@ def mostra_lista_completa_argomenti(argomenti_df, stato_argomenti_df):
     
     return None
 
+@profila()
 def mostra_tabella_oggi(calendario_studio, oggi, stato_argomenti_df):
     """
     Display today's study table.
     
     Args:
-        calendario_studio (pandas.DataFrame): DataFrame containing study calendar
+        calendario_studio (StudyCalendar): Study calendar
         oggi (datetime.date): Current date
         stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
         
@@ -198,21 +211,30 @@ def mostra_tabella_oggi(calendario_studio, oggi, stato_argomenti_df):
         dict or None: Action to perform
     """
     st.markdown("### 📋 Studio del giorno: **" + str(oggi.strftime("%A %d %B %Y")) + "**")
-    oggi_row = calendario_studio[calendario_studio["Data"] == oggi]
-    if oggi_row.empty:
+    lista = calendario_studio.argomenti(oggi)
+    if lista is None:
         st.success("Hai completato tutti gli argomenti! Usa il tempo per ripassare.")
     else:
-        lista = oggi_row.iloc[0]["Argomenti"]
+        prefetcher = get_lesson_prefetcher()
+        indice = indice_stati(stato_argomenti_df)
         for arg in lista:
             # Handle missing topics
-            matches = stato_argomenti_df.loc[stato_argomenti_df.Argomento == arg, "Stato"]
-            stato_corrente = matches.values[0] if not matches.empty else "non iniziato"
+            stato_corrente = indice.stato(arg)
             # Etichette aggiornate secondo la nuova logica:
             # - Completati: dopo aver fatto il test dell'argomento
             # - Da ripassare: se hai fatto solo la funzione studio dell'argomento
             # - Critici: se non è stato fatto nessuno dei due
             etichetta = {"non iniziato": "⚪ Critico", "da ripassare": "🟠 Da ripassare", "completato": "🟢 Completato"}.get(stato_corrente, "⚪ Critico")
             
+            # Badge della lezione preparata in background
+            try:
+                if prefetcher.is_ready(arg):
+                    etichetta += " · ⚡ lezione pronta"
+                elif prefetcher.in_progress(arg):
+                    etichetta += " · ⏳ in preparazione"
+            except Exception:
+                pass
+            
             # Check if this topic had an error previously
             had_error = "last_error_topic" in st.session_state and st.session_state.last_error_topic == arg
             
@@ -248,6 +270,7 @@ def mostra_tabella_oggi(calendario_studio, oggi, stato_argomenti_df):
     
     return None
 
+@profila()
 def mostra_avanzamento(stato_argomenti_df):
     """
     Display progress.
@@ -255,21 +278,24 @@ def mostra_avanzamento(stato_argomenti_df):
     Args:
         stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
     """
+    # Contatori mantenuti dall'indice, senza scansioni
+    conteggi = indice_stati(stato_argomenti_df).conteggi()
     totale = len(stato_argomenti_df)
-    completati = (stato_argomenti_df["Stato"] == "completato").sum()
-    da_ripassare = (stato_argomenti_df["Stato"] == "da ripassare").sum()
+    completati = conteggi["completato"]
+    da_ripassare = conteggi["da ripassare"]
     critici = totale - completati - da_ripassare
     percentuale = completati / totale if totale > 0 else 0
     st.markdown("### 📈 Avanzamento Complessivo")
     st.progress(percentuale, text=f"{int(percentuale*100)}% completato")
     st.write(f"🟢 Completati: {completati} | 🟠 Da ripassare: {da_ripassare} | ⚪ Critici: {critici}")
 
+@profila()
 def mostra_chat(chat_log, stato_argomenti_df, stato_file, punteggi_df, punteggi_file):
     """
     Display chat interface.
     
     Args:
-        chat_log (list): Chat history
+        chat_log (ChatHistory): Chat history
         stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
         stato_file (str): Path to state file
         punteggi_df (pandas.DataFrame): DataFrame containing scores
@@ -301,7 +327,13 @@ def mostra_chat(chat_log, stato_argomenti_df, stato_file, punteggi_df, punteggi_
     
     # Chat history container with user-adjustable height
     with st.container(height=chat_height):
-        for turno in chat_log:
+        # Solo gli ultimi turni; quelli precedenti si caricano a pagine
+        finestra = st.session_state.get("chat_finestra", FINESTRA_CHAT)
+        if len(chat_log) > finestra:
+            if st.button(f"⬆️ Carica messaggi precedenti ({len(chat_log) - finestra})", key="chat_precedenti"):
+                st.session_state.chat_finestra = finestra + FINESTRA_CHAT
+                st.rerun()
+        for turno in chat_log.intervallo(len(chat_log) - finestra, len(chat_log)):
             # Verifica se è una risposta a un test
             if turno['utente'].startswith("Risposta al test:"):
                 # Formatta in modo speciale le risposte ai test per renderle più visibili
@@ -322,6 +354,23 @@ def mostra_chat(chat_log, stato_argomenti_df, stato_file, punteggi_df, punteggi_
                 st.markdown(f"**🧑 Utente**: {turno['utente']}")
                 st.markdown(f"**🤖 AI**: {turno['llm']}")
                 st.divider()
+        
+        # Risposta in streaming al messaggio appena inviato
+        if st.session_state.get("chat_in_attesa"):
+            user_input = st.session_state.chat_in_attesa
+            st.session_state.chat_in_attesa = None
+            st.markdown(f"**🧑 Utente**: {user_input}")
+            st.markdown("**🤖 AI**:")
+            # Turni recenti entro il budget più il riassunto di quelli precedenti
+            if "chat_contesto" not in st.session_state:
+                st.session_state.chat_contesto = ConversationContext()
+            messaggi, prompt_token = st.session_state.chat_contesto.messaggi(chat_log, user_input)
+            risposta = st.write_stream(
+                chiamata_llm_stream(None, max_tokens=500, temperature=0.7, messages=messaggi, tipo="chat")
+            )
+            st.caption(f"🧮 {prompt_token} token di prompt stimati ({len(messaggi)} messaggi)")
+            st.divider()
+            chat_log.append({"utente": user_input, "llm": risposta})
     
     # Gestione del test in corso
     if "test_in_corso" in st.session_state and st.session_state.test_in_corso:
@@ -343,7 +392,7 @@ def mostra_chat(chat_log, stato_argomenti_df, stato_file, punteggi_df, punteggi_
                         st.session_state.test_argomento,
                         st.session_state.test_domanda,
                         st.session_state.test_risposta_modello,
-                        st.session_state.test_file_path,
+                        st.session_state.get("test_record_id"),
                         punteggi_df,
                         punteggi_file,
                         stato_argomenti_df,
@@ -394,10 +443,8 @@ def mostra_chat(chat_log, stato_argomenti_df, stato_file, punteggi_df, punteggi_
         def submit_chat():
             user_input = st.session_state.chat_input
             if user_input:
-                # Add instruction to respond in English
-                enhanced_prompt = f"{user_input}\n\nPlease respond in English only."
-                risposta = chiamata_llm(enhanced_prompt, max_tokens=500, temperature=0.7)
-                chat_log.append({"utente": user_input, "llm": risposta})
+                # La risposta viene generata in streaming dentro il contenitore della chat
+                st.session_state.chat_in_attesa = user_input
                 # Clear input after processing
                 st.session_state.chat_input = ""
         
@@ -410,6 +457,101 @@ def mostra_chat(chat_log, stato_argomenti_df, stato_file, punteggi_df, punteggi_
     
     return punteggi_df, stato_argomenti_df, chat_log
 
+@profila()
+def mostra_simulazione_esame(stato_argomenti_df, stato_file, punteggi_df, punteggi_file):
+    """
+    Display the mock exam mode.
+    
+    Args:
+        stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+        stato_file (str): Path to state file
+        punteggi_df (pandas.DataFrame): DataFrame containing scores
+        punteggi_file (str): Path to scores file
+        
+    Returns:
+        tuple: Updated state variables
+    """
+    from src.llm.exam import NUMERO_DOMANDE, estrai_argomenti_esame, genera_simulazione, valuta_simulazione
+    
+    st.markdown("### 🎓 Simulazione Esame")
+    
+    if "esame_fase" not in st.session_state:
+        st.session_state.esame_fase = None
+    
+    fase = st.session_state.esame_fase
+    
+    if fase is None:
+        st.write("Estrai più argomenti (privilegiando quelli critici e da ripassare), rispondi in sequenza e ricevi tutte le valutazioni alla fine.")
+        n = st.number_input("Numero di domande", min_value=1, max_value=max(1, len(stato_argomenti_df)),
+                            value=min(NUMERO_DOMANDE, max(1, len(stato_argomenti_df))), step=1)
+        if st.button("Inizia simulazione", type="primary"):
+            argomenti = estrai_argomenti_esame(stato_argomenti_df, int(n))
+            with st.spinner(f"Generazione di {len(argomenti)} domande..."):
+                st.session_state.esame_domande = genera_simulazione(argomenti)
+            st.session_state.esame_indice = 0
+            st.session_state.esame_fase = "risposte"
+            st.rerun()
+    
+    elif fase == "risposte":
+        domande = st.session_state.esame_domande
+        indice = st.session_state.esame_indice
+        corrente = domande[indice]
+        
+        st.progress((indice + 1) / len(domande), text=f"Domanda {indice + 1} di {len(domande)}")
+        st.info(f"📝 **Argomento: {corrente['argomento']}**")
+        st.markdown(f"**Domanda**: {corrente['domanda']}")
+        risposta = st.text_area("La tua risposta", value=corrente["risposta_utente"],
+                                key=f"esame_risposta_{indice}", height=200)
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if indice > 0 and st.button("⬅️ Indietro"):
+                corrente["risposta_utente"] = risposta
+                st.session_state.esame_indice -= 1
+                st.rerun()
+        with col2:
+            if indice < len(domande) - 1:
+                if st.button("Avanti ➡️"):
+                    corrente["risposta_utente"] = risposta
+                    st.session_state.esame_indice += 1
+                    st.rerun()
+            elif st.button("Consegna esame", type="primary"):
+                corrente["risposta_utente"] = risposta
+                with st.spinner(f"Valutazione di {len(domande)} risposte..."):
+                    valutate, punteggi_df, stato_argomenti_df = valuta_simulazione(
+                        domande, punteggi_df, punteggi_file, stato_argomenti_df, stato_file
+                    )
+                st.session_state.esame_domande = valutate
+                st.session_state.punteggi_df = punteggi_df
+                st.session_state.esame_fase = "risultati"
+                st.rerun()
+        with col3:
+            if st.button("Annulla simulazione"):
+                st.session_state.esame_fase = None
+                st.rerun()
+    
+    elif fase == "risultati":
+        domande = st.session_state.esame_domande
+        punteggi = [d["punteggio"] for d in domande if d["punteggio"] is not None]
+        if punteggi:
+            st.metric("Punteggio medio", f"{sum(punteggi) / len(punteggi):.1f}/100")
+        
+        for d in domande:
+            titolo = f"{d['argomento']} – {d['punteggio']}/100" if d["punteggio"] is not None else f"{d['argomento']} – ⚠️ non valutato"
+            with st.expander(titolo):
+                st.markdown(f"**Domanda**: {d['domanda']}")
+                st.markdown(f"**La tua risposta**: {d['risposta_utente']}")
+                st.markdown(f"**Valutazione**: {d['valutazione']}")
+                st.markdown("**Risposta modello**:")
+                st.markdown(d["risposta_modello"])
+        
+        if st.button("Nuova simulazione"):
+            st.session_state.esame_fase = None
+            st.rerun()
+    
+    return punteggi_df, stato_argomenti_df
+
+@profila()
 def mostra_storico_punteggi(punteggi_df, punteggi_file):
     """
     Display test scores history.
@@ -433,37 +575,68 @@ def mostra_storico_punteggi(punteggi_df, punteggi_file):
     if punteggi_df.empty:
         st.info("Non hai ancora completato nessun test. Inizia a testare la tua conoscenza!")
     else:
-        # Ordina per data più recente
-        df_sorted = punteggi_df.sort_values(by="Data", ascending=False).reset_index(drop=True)
+        # Snapshot colonnare già ordinato per data, con date tipizzate e senza commenti
+        # (pyarrow caricato solo quando si apre lo storico)
+        from src.data.analytics import get_score_analytics
+        analytics = get_score_analytics(punteggi_file)
+        analytics.sincronizza(punteggi_df)
+        storico = analytics.colonne(["Argomento", "Punteggio", "Data"])
         
-        # Crea una tabella interattiva con pulsanti di eliminazione
-        for i, row in df_sorted.iterrows():
-            col1, col2, col3, col4 = st.columns([3, 1, 2, 1])
-            with col1:
-                st.write(f"**{row['Argomento']}**")
-            with col2:
-                st.write(f"**{row['Punteggio']}/100**")
-            with col3:
-                st.write(f"{row['Data']}")
-            with col4:
-                if st.button("🗑️", key=f"delete_test_{i}", help="Elimina questo test"):
-                    # Passa l'argomento e la data per identificare univocamente il test
-                    punteggi_df = elimina_test(punteggi_df, row['Argomento'], row['Data'], punteggi_file)
-                    # Forza il refresh della pagina
-                    st.rerun()
+        # Filtri e ordinamento eseguiti sullo snapshot; si materializza solo la pagina
+        col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
+        with col1:
+            filtro_argomenti = st.multiselect("Argomenti", analytics.argomenti(), key="storico_argomenti")
+        with col2:
+            intervallo = st.date_input("Periodo", value=(), key="storico_periodo")
+        with col3:
+            ordina_per = st.selectbox("Ordina per", ["Data", "Punteggio", "Argomento"], key="storico_ordine")
+        with col4:
+            discendente = st.toggle("Decrescente", value=True, key="storico_decrescente")
+        dal = intervallo[0] if len(intervallo) > 0 else None
+        al = intervallo[1] if len(intervallo) > 1 else dal
+        
+        _, totale = analytics.pagina(0, 0, filtro_argomenti, dal, al)
+        pagine = max(1, math.ceil(totale / PAGINA_STORICO_PUNTEGGI))
+        # Etichetta e limiti fissi: se cambiassero, Streamlit ricreerebbe il widget tornando a pagina 1
+        pagina = min(st.number_input("Pagina", min_value=1, value=1, key="storico_pagina"), pagine)
+        st.caption(f"Pagina {pagina} di {pagine}")
+        righe, _ = analytics.pagina(
+            PAGINA_STORICO_PUNTEGGI, (pagina - 1) * PAGINA_STORICO_PUNTEGGI,
+            filtro_argomenti, dal, al, ordina_per, discendente
+        )
+        
+        selezione = st.dataframe(
+            righe,
+            hide_index=True,
+            column_order=["Argomento", "Punteggio", "Data"],
+            column_config={
+                "Punteggio": st.column_config.ProgressColumn("Punteggio", min_value=0, max_value=100, format="%d/100"),
+                "Data": st.column_config.DatetimeColumn("Data", format="YYYY-MM-DD HH:mm:ss"),
+            },
+            on_select="rerun",
+            selection_mode="multi-row",
+            # Una selezione per pagina e filtri: le posizioni si riferiscono alle righe mostrate
+            key=f"storico_tabella_{pagina}_{ordina_per}_{discendente}_{dal}_{al}_{'|'.join(filtro_argomenti)}",
+        )
+        posizioni = [p for p in selezione.selection.rows if p < len(righe)]
+        selezionati = righe["ID"].iloc[posizioni].tolist()
+        st.caption(f"{totale} test trovati")
+        if st.button(f"🗑️ Elimina selezionati ({len(selezionati)})", disabled=not selezionati):
+            punteggi_df = elimina_punteggi(punteggi_df, selezionati, punteggi_file)
+            # Forza il refresh della pagina
+            st.rerun()
         
         # Visualizza grafico dell'andamento
-        if len(df_sorted) > 1:
+        if len(storico) > 1:
             st.markdown("#### Andamento Punteggi")
-            df_plot = df_sorted.copy()
-            df_plot["Data"] = pd.to_datetime(df_plot["Data"])
-            df_plot = df_plot.sort_values(by="Data")
             
-            # Crea grafico con plotly.graph_objects
+            # Crea grafico con plotly.graph_objects (importato solo quando serve un grafico)
+            import plotly.graph_objects as go
+            
             fig = go.Figure()
             fig.add_trace(go.Scatter(
-                x=df_plot["Data"].dt.strftime("%d/%m %H:%M"),
-                y=df_plot["Punteggio"],
+                x=storico["Data"].dt.strftime("%d/%m %H:%M"),
+                y=storico["Punteggio"],
                 mode='lines+markers',
                 line=dict(color='#3366CC', shape='linear'),
                 name='Punteggio'
@@ -481,9 +654,10 @@ def mostra_storico_punteggi(punteggi_df, punteggi_file):
             st.plotly_chart(fig, use_container_width=True)
             
             # Statistiche
-            media = df_sorted["Punteggio"].mean()
-            ultimo = df_sorted.iloc[0]["Punteggio"]
-            miglioramento = ultimo - df_sorted.iloc[-1]["Punteggio"] if len(df_sorted) > 1 else 0
+            punteggi = storico["Punteggio"]
+            media = punteggi.mean()
+            ultimo = punteggi.iloc[-1]
+            miglioramento = ultimo - punteggi.iloc[0] if len(punteggi) > 1 else 0
             
             col1, col2, col3 = st.columns(3)
             col1.metric("Punteggio medio", f"{media:.1f}/100")
@@ -493,44 +667,94 @@ def mostra_storico_punteggi(punteggi_df, punteggi_file):
         # Aggiungi visualizzazione dei file di test salvati
         st.markdown("#### 📝 Storico Dettagliato Test")
         
-        temp_dir = "temp_test_files"
-        if os.path.exists(temp_dir):
-            test_files = [f for f in os.listdir(temp_dir) if f.startswith("test_") and f.endswith(".txt")]
-            
-            if test_files:
-                for idx, file in enumerate(sorted(test_files, reverse=True)):
-                    # Estrai l'argomento dal nome del file
-                    argomento = file.replace("test_", "").split("_")[0].replace("_", " ")
-                    file_path = os.path.join(temp_dir, file)
+        store = get_test_record_store(punteggi_file)
+        totale = store.conta()
+        if totale:
+            # Solo il manifesto della pagina corrente; i corpi si leggono su richiesta
+            pagine = max(1, math.ceil(totale / PAGINA_STORICO_DETTAGLIATO))
+            pagina = min(st.number_input("Pagina", min_value=1, value=1, key="pagina_storico_test"), pagine)
+            st.caption(f"Pagina {pagina} di {pagine}")
+            for record in store.manifesto(PAGINA_STORICO_DETTAGLIATO, (pagina - 1) * PAGINA_STORICO_DETTAGLIATO):
+                punteggio = f" – {record['punteggio']}/100" if record["punteggio"] is not None else ""
+                # Crea un expander con pulsante di eliminazione
+                with st.expander(f"Test: {record['argomento']} ({record['creato']}){punteggio}"):
+                    col1, col2 = st.columns([10, 1])
+                    with col2:
+                        if st.button("🗑️", key=f"delete_record_{record['id']}", help="Elimina questo test"):
+                            if record["punteggio_id"] in set(punteggi_df["ID"]):
+                                # Elimina il punteggio per id, con i record collegati
+                                punteggi_df = elimina_punteggi(punteggi_df, [record["punteggio_id"]], punteggi_file)
+                            else:
+                                # Se non c'è un punteggio collegato, elimina solo il record
+                                store.elimina(record["id"])
+                                st.toast("✅ Test eliminato con successo")
+                                st.success("Test eliminato con successo! La pagina verrà aggiornata.")
+                            # Forza il refresh della pagina
+                            st.rerun()
                     
-                    # Crea un expander con pulsante di eliminazione
-                    with st.expander(f"Test: {argomento}"):
-                        col1, col2 = st.columns([10, 1])
-                        with col2:
-                            if st.button("🗑️", key=f"delete_file_{idx}", help="Elimina questo file di test"):
-                                # Trova la riga corrispondente nel dataframe dei punteggi
-                                matching_rows = df_sorted[df_sorted["Argomento"] == argomento]
-                                if not matching_rows.empty:
-                                    # Prendi la prima corrispondenza
-                                    row = matching_rows.iloc[0]
-                                    punteggi_df = elimina_test(punteggi_df, row['Argomento'], row['Data'], punteggi_file, file_path)
-                                else:
-                                    # Se non c'è corrispondenza nel dataframe, elimina solo il file
-                                    os.remove(file_path)
-                                    st.toast("✅ File di test eliminato con successo")
-                                    st.success("File di test eliminato con successo! La pagina verrà aggiornata.")
-                                # Forza il refresh della pagina
-                                st.rerun()
-                        
-                        try:
-                            with open(file_path, "r", encoding="utf-8") as f:
-                                content = f.read()
-                            st.text_area("Dettagli del test", content, height=300, disabled=True)
-                        except Exception as e:
-                            st.error(f"Errore nel leggere il file: {str(e)}")
-            else:
-                st.info("Nessun file di test dettagliato disponibile.")
+                    with col1:
+                        dimensione = f"{(record['dimensione'] or 0) / 1024:.1f} KB"
+                        archiviato = " (archivio)" if record["segmento"] else ""
+                        if st.toggle(f"Mostra dettagli – {dimensione}{archiviato}", key=f"apri_record_{record['id']}"):
+                            dettagli = store.get(record["id"]) or {}
+                            st.markdown(f"**Domanda**: {dettagli.get('domanda') or ''}")
+                            st.markdown(f"**Risposta modello**: {dettagli.get('risposta_modello') or ''}")
+                            st.markdown(f"**Risposta utente**: {dettagli.get('risposta_utente') or '_In attesa di risposta_'}")
+                            st.markdown(f"**Valutazione**: {dettagli.get('valutazione') or '_In attesa di valutazione_'}")
         else:
-            st.info("La directory per i file di test dettagliati non esiste ancora. Completa un test per generarla.")
+            st.info("Nessun test dettagliato disponibile. Completa un test per generarlo.")
     
     return punteggi_df
+
+@profila()
+def mostra_operazioni_llm():
+    """
+    Display latency, token and error metrics of the LLM calls.
+    """
+    st.markdown("### 🛠️ Operazioni LLM")
+    
+    periodi = {"Ultime 24 ore": 1, "Ultimi 7 giorni": 7, "Ultimi 30 giorni": 30}
+    periodo = st.selectbox("Periodo", list(periodi), index=1, key="ops_periodo")
+    dal = datetime.now().timestamp() - periodi[periodo] * 86400
+    
+    # Contatori della cache dal riavvio del server, indipendenti dal periodo
+    cache = get_llm_cache().stats()
+    st.caption(
+        f"Cache delle lezioni: {cache['hits']} hit, {cache['misses']} miss "
+        f"({cache['hit_rate']:.0%} hit rate), {cache['entries']} risposte, {cache['bytes'] / 1024:.0f} KB"
+    )
+    
+    statistiche = get_llm_ledger().statistiche(dal)
+    if statistiche.empty:
+        st.info("Nessuna chiamata LLM registrata nel periodo selezionato.")
+        return
+    
+    chiamate = int(statistiche["Chiamate"].sum())
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Chiamate", chiamate)
+    col2.metric("Cache hit", f"{statistiche['Cache hit'].sum() / chiamate:.0%}")
+    col3.metric("Errori", f"{statistiche['Errori'].sum() / chiamate:.0%}")
+    
+    st.dataframe(
+        statistiche,
+        hide_index=True,
+        column_config={
+            c: st.column_config.NumberColumn(c, format="%.2f")
+            for c in ["p50 (s)", "p95 (s)", "p99 (s)", "TTFT p50 (s)", "Token prompt medi",
+                      "Token risposta medi", "Chiamate/min", "Token/s"]
+        },
+    )
+    
+    # Latenza per tipo di prompt
+    import plotly.graph_objects as go
+    
+    fig = go.Figure()
+    for percentile in ["p50 (s)", "p95 (s)", "p99 (s)"]:
+        fig.add_trace(go.Bar(x=statistiche["Tipo"], y=statistiche[percentile], name=percentile))
+    fig.update_layout(
+        barmode="group",
+        yaxis_title="Secondi",
+        height=300,
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    st.plotly_chart(fig, use_container_width=True)
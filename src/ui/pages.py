@@ -12,6 +12,8 @@ from src.ui.components import (
     mostra_tabella_oggi,
     mostra_avanzamento,
     mostra_chat,
+    mostra_operazioni_llm,
+    mostra_simulazione_esame,
     mostra_storico_punteggi
 )
 from src.llm.api import interazione_llm_su_argomento
@@ -34,12 +36,12 @@ def main_layout(
         argomenti_df (pandas.DataFrame): DataFrame containing topics
         stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
         punteggi_df (pandas.DataFrame): DataFrame containing scores
-        calendario_studio (pandas.DataFrame): DataFrame containing study calendar
+        calendario_studio (StudyCalendar): Study calendar
         oggi (datetime.date): Current date
         data_esame (datetime.date): Exam date
         stato_file (str): Path to state file
         punteggi_file (str): Path to scores file
-        chat_log (list): Chat history
+        chat_log (ChatHistory): Chat history
         
     Returns:
         tuple: Updated state variables
@@ -49,7 +51,9 @@ def main_layout(
     col_sinistra, col_destra = st.columns([2, 1])
     
     with col_sinistra:
-        tab1, tab2, tab3 = st.tabs(["📅 Oggi", "📚 Tutti gli argomenti", "📊 Storico Test"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(
+            ["📅 Oggi", "📚 Tutti gli argomenti", "📊 Storico Test", "🎓 Simulazione esame", "🛠️ Operazioni LLM"]
+        )
         
         with tab1:
             # Mostra tabella oggi
@@ -101,6 +105,19 @@ def main_layout(
         with tab3:
             # Mostra storico punteggi
             punteggi_df = mostra_storico_punteggi(punteggi_df, punteggi_file)
+        
+        with tab4:
+            # Mostra simulazione esame
+            punteggi_df, stato_argomenti_df = mostra_simulazione_esame(
+                stato_argomenti_df, 
+                stato_file, 
+                punteggi_df, 
+                punteggi_file
+            )
+        
+        with tab5:
+            # Mostra metriche delle chiamate LLM
+            mostra_operazioni_llm()
     
     with col_destra:
         # Mostra chat
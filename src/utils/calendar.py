@@ -2,52 +2,502 @@
 Calendar generation utilities for the Dashboard Studio application.
 """
 
+import bisect
+import hashlib
+import math
+import threading
 import pandas as pd
+import streamlit as st
 from datetime import datetime, timedelta
 
-def genera_calendario_studio(df, giorni_studio, oggi, stato_argomenti_df):
+from src.data.score_log import firma_punteggi
+from src.utils.scheduler import SpacedRepetitionScheduler
+
+STATI_DA_RIPASSARE = ("non iniziato", "da ripassare")
+CAPACITA_MINIMA = 3  # Argomenti massimi al giorno, se il catalogo non ne richiede di più
+
+class StudyCalendar:
+    """
+    Study calendar indexed by date, by month and by topic.
+    
+    Lookups of a day, of a month slice and of the dates of a topic are
+    dictionary accesses, so rendering cost does not depend on the length
+    of the plan.
+    """
+    
+    def __init__(self, giorni, distribuzione):
+        """
+        Args:
+            giorni (list): Calendar days (datetime.date), in order
+            distribuzione (list): Topics of each day
+        """
+        self.giorni = [_come_data(g) for g in giorni]
+        self._per_data = {}
+        self._per_mese = {}
+        self._per_argomento = {}
+        for giorno, argomenti in zip(self.giorni, distribuzione):
+            self._per_data[giorno] = argomenti
+            self._per_mese.setdefault((giorno.year, giorno.month), {})[giorno.day] = argomenti
+            for arg in argomenti:
+                self._per_argomento.setdefault(arg, []).append(giorno)
+    
+    def __len__(self):
+        return len(self.giorni)
+    
+    def __iter__(self):
+        """Iterate over (day, topics) pairs in date order."""
+        for giorno in self.giorni:
+            yield giorno, self._per_data[giorno]
+    
+    def __contains__(self, giorno):
+        return _come_data(giorno) in self._per_data
+    
+    def argomenti(self, giorno):
+        """
+        Get the topics of a day.
+        
+        Args:
+            giorno (datetime.date): Day
+            
+        Returns:
+            list or None: Topics, or None if the day is outside the plan
+        """
+        return self._per_data.get(_come_data(giorno))
+    
+    def mese(self, anno, mese):
+        """
+        Get the slice of a month.
+        
+        Args:
+            anno (int): Year
+            mese (int): Month
+            
+        Returns:
+            dict: Mapping day of month -> topics
+        """
+        return self._per_mese.get((anno, mese), {})
+    
+    def date_argomento(self, argomento):
+        """
+        Get the days on which a topic is scheduled.
+        
+        Args:
+            argomento (str): Topic name
+            
+        Returns:
+            list: Days (datetime.date)
+        """
+        return self._per_argomento.get(argomento, [])
+    
+    def imposta_giorno(self, giorno, argomenti):
+        """
+        Replace the topics of a single day, keeping the indices in sync.
+        
+        Args:
+            giorno (datetime.date): Day of the plan
+            argomenti (list): New topics
+        """
+        giorno = _come_data(giorno)
+        for arg in self._per_data[giorno]:
+            date = self._per_argomento.get(arg, [])
+            if giorno in date:
+                date.remove(giorno)
+        self._per_data[giorno] = argomenti
+        self._per_mese[(giorno.year, giorno.month)][giorno.day] = argomenti
+        for arg in argomenti:
+            bisect.insort(self._per_argomento.setdefault(arg, []), giorno)
+    
+    def to_dataframe(self):
+        """
+        Convert to the tabular form used before the index existed.
+        
+        Returns:
+            pandas.DataFrame: DataFrame with "Data" and "Argomenti"
+        """
+        return pd.DataFrame({"Data": self.giorni, "Argomenti": [self._per_data[g] for g in self.giorni]})
+
+
+def _come_data(giorno):
+    """Normalize datetime/Timestamp values to datetime.date."""
+    return giorno.date() if isinstance(giorno, datetime) else giorno
+
+
+def _giorni_piano(giorni_studio):
+    """
+    Split the days until the exam.
+    
+    Returns:
+        tuple: (days of the plan, days on which new topics are introduced)
+    """
+    # Calcola giorni totali e giorni di revisione
+    giorni_totali = max(0, giorni_studio)
+    giorni_revisione = max(7, int(giorni_totali * 0.1))  # 10% dei giorni per revisione
+    return giorni_totali, max(1, giorni_totali - giorni_revisione)
+
+
+def _piano_base(df, giorni_studio, oggi, punteggi_df):
+    """
+    Build the SM-2 part of the plan, which does not depend on topic states.
+    
+    Returns:
+        tuple: (scheduler, topics of each day, indices of the review days left free,
+            topics per day)
+    """
+    argomenti = df['Argomento'].tolist()
+    giorni_totali, giorni_studio_effettivi = _giorni_piano(giorni_studio)
+    scheduler = SpacedRepetitionScheduler.da_storico(argomenti, punteggi_df, oggi, giorni_studio_effettivi)
+    nuovi = sum(1 for arg in argomenti if scheduler.voce(arg).ripetizioni == 0)
+    per_giorno = math.ceil(nuovi / giorni_studio_effettivi) if nuovi else 1
+    capacita = max(CAPACITA_MINIMA, 2 * per_giorno)
+    distribuzione = scheduler.pianifica(
+        giorni_totali,
+        capacita=capacita,
+        ultimo_giorno_nuovi=giorni_studio_effettivi - 1
+    )
+    
+    # Giorni di revisione senza ripetizioni in scadenza
+    slot_liberi = [g for g in range(giorni_studio_effettivi, giorni_totali) if not distribuzione[g]]
+    return scheduler, distribuzione, slot_liberi, capacita
+
+
+def argomenti_da_ripassare(stato_argomenti_df):
+    """
+    Get the topics that still need a review session.
+    
+    Args:
+        stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+        
+    Returns:
+        list: Topics in "non iniziato" or "da ripassare" state
+    """
+    return stato_argomenti_df.loc[
+        stato_argomenti_df["Stato"].isin(STATI_DA_RIPASSARE), "Argomento"
+    ].tolist()
+
+
+def _ripasso_slot(slot_liberi, da_ripassare):
+    """Assign one topic to review (or the placeholder) to each free review day."""
+    return {
+        giorno: [da_ripassare[idx]] if idx < len(da_ripassare) else ["Ripasso approfondito"]
+        for idx, giorno in enumerate(slot_liberi)
+    }
+
+
+def genera_calendario_studio(df, giorni_studio, oggi, stato_argomenti_df, punteggi_df=None):
     """
     Generate study calendar.
     
+    Topics are placed by the SM-2 scheduler (src/utils/scheduler.py):
+    never-tested topics are introduced over the study days, tested topics
+    come back when their review falls due according to their scores, and
+    every review is followed by its projected next review. Review days with
+    nothing due get one "non iniziato"/"da ripassare" topic each.
+    
     Args:
         df (pandas.DataFrame): DataFrame containing topics
         giorni_studio (int): Number of days until exam
         oggi (datetime.date): Current date
         stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+        punteggi_df (pandas.DataFrame, optional): DataFrame containing scores
         
     Returns:
-        pandas.DataFrame: DataFrame containing study calendar
+        StudyCalendar: Study calendar
     """
-    # Calcola giorni totali e giorni di revisione
-    giorni_totali = giorni_studio
-    giorni_revisione = max(7, int(giorni_totali * 0.1))  # 10% dei giorni per revisione
-    giorni_studio_effettivi = giorni_totali - giorni_revisione
+    _, distribuzione, slot_liberi, _ = _piano_base(df, giorni_studio, oggi, punteggi_df)
+    for giorno, argomenti in _ripasso_slot(slot_liberi, argomenti_da_ripassare(stato_argomenti_df)).items():
+        distribuzione[giorno] = argomenti
     
-    # Ottieni lista argomenti
-    argomenti = df['Argomento'].tolist()
+    giorni = [oggi + timedelta(days=i) for i in range(len(distribuzione))]
+    return StudyCalendar(giorni, distribuzione)
+
+
+def firma_catalogo(df):
+    """
+    Hash of the topics catalogue.
+    
+    Args:
+        df (pandas.DataFrame): DataFrame containing topics
+        
+    Returns:
+        str: Hex digest
+    """
+    return hashlib.sha1("\n".join(map(str, df['Argomento'])).encode("utf-8")).hexdigest()
+
+
+class CalendarCache:
+    """
+    Memoized study calendar shared across reruns.
+    
+    The calendar and its SM-2 scheduler are rebuilt from the score history
+    only when the catalogue or the date change. A saved score reschedules
+    its topic in the kept scheduler (registra_test, O(log n)) and a deleted
+    one recomputes just its topic from the remaining tests; the topic is
+    then removed from the days it was planned on and placed on its newly
+    projected days, and only those days (plus the free review days that
+    shift) are patched. A moved topic respects the daily capacity but does
+    not push other topics to later days as a full projection would; the
+    next rebuild (a new day) plans everything again. Topic
+    states only decide which topic fills each free review day, so a state
+    change patches those days alone.
+    
+    The score hooks are called by the functions that save and delete
+    scores; changes made by other sessions are found by score id when the
+    scores fingerprint differs. When the caller passes the data version
+    counters, the catalogue and the topic states are compared by version
+    instead of being hashed and scanned on every rerun.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chiave = None
+        self._oggi = None
+        self._giorni_studio = 0
+        self._scheduler = None
+        self._punteggi = {}  # id -> argomento dei punteggi già applicati allo scheduler
+        self._firma = None
+        self._da_ripianificare = set()  # Argomenti il cui record SM-2 è cambiato
+        self._piano = []  # Argomenti SM-2 di ogni giorno, senza i giorni di revisione liberi
+        self._giorni_argomento = {}  # argomento -> indici dei giorni in _piano
+        self._capacita = CAPACITA_MINIMA
+        self._calendario = None
+        self._slot_liberi = []
+        self._ripasso = {}
+        self._da_ripassare = None
+        self._versione_stato = None
+        self.riusi = 0
+        self.aggiornamenti = 0
+        self.ricostruzioni = 0
     
-    # Distribuzione più intelligente
-    distribuzione = [[] for _ in range(giorni_totali)]
+    def _registra(self, righe):
+        """Apply new scores (dicts or rows with ID, Argomento, Punteggio, Data) to the scheduler."""
+        for riga in righe:
+            argomento = riga["Argomento"]
+            if riga["ID"] in self._punteggi or argomento not in self._scheduler:
+                continue
+            try:
+                giorno = (datetime.strptime(str(riga["Data"])[:10], "%Y-%m-%d").date() - self._oggi).days
+            except ValueError:
+                giorno = 0
+            try:
+                punteggio = float(riga["Punteggio"])
+            except (TypeError, ValueError):
+                punteggio = 0
+            self._scheduler.registra_test(argomento, 0 if math.isnan(punteggio) else punteggio, giorno)
+            self._punteggi[riga["ID"]] = argomento
+            self._da_ripianificare.add(argomento)
     
-    # Fase 1: Distribuzione iniziale
-    for idx, arg in enumerate(argomenti):
-        giorno_target = idx % giorni_studio_effettivi
-        distribuzione[giorno_target].append(arg)
+    def _ricalcola(self, argomenti, punteggi_df):
+        """Recompute the SM-2 records of some topics from their remaining tests."""
+        argomenti = [a for a in argomenti if a in self._scheduler]
+        if not argomenti:
+            return
+        storico = punteggi_df[punteggi_df["Argomento"].isin(argomenti)] if punteggi_df is not None else None
+        # Un argomento rimasto senza test torna nuovo, da introdurre subito
+        parziale = SpacedRepetitionScheduler.da_storico(
+            argomenti, storico, self._oggi, _giorni_piano(self._giorni_studio)[1]
+        )
+        for argomento in argomenti:
+            voce = parziale.voce(argomento)
+            self._scheduler.inserisci(argomento, voce.scadenza, voce.ef, voce.ripetizioni, voce.intervallo)
+        self._da_ripianificare.update(argomenti)
     
-    # Fase 2: Aggiungi sessioni di ripasso mirato
-    argomenti_da_ripassare = stato_argomenti_df[
-        (stato_argomenti_df["Stato"] == "non iniziato") | 
-        (stato_argomenti_df["Stato"] == "da ripassare")
-    ]["Argomento"].tolist()
+    def _ripianifica(self, da_ripassare):
+        """Move the rescheduled topics to their new days and patch the days that changed."""
+        giorni_totali, giorni_studio_effettivi = _giorni_piano(self._giorni_studio)
+        toccati = set()
+        for argomento in self._da_ripianificare:
+            vecchi = self._giorni_argomento.get(argomento, [])
+            for giorno in vecchi:
+                self._piano[giorno].remove(argomento)
+            nuovi = self._scheduler.proietta_argomento(
+                argomento, giorni_totali, self._capacita, self._piano, giorni_studio_effettivi - 1
+            )
+            for giorno in nuovi:
+                self._piano[giorno].append(argomento)
+            self._giorni_argomento[argomento] = nuovi
+            toccati.update(set(vecchi).symmetric_difference(nuovi))
+        self._da_ripianificare.clear()
+        
+        # I giorni di revisione svuotati diventano liberi, quelli occupati non lo sono più
+        for giorno in toccati:
+            if giorno < giorni_studio_effettivi:
+                continue
+            posizione = bisect.bisect_left(self._slot_liberi, giorno)
+            libero = posizione < len(self._slot_liberi) and self._slot_liberi[posizione] == giorno
+            if not self._piano[giorno] and not libero:
+                self._slot_liberi.insert(posizione, giorno)
+            elif self._piano[giorno] and libero:
+                del self._slot_liberi[posizione]
+        ripasso = _ripasso_slot(self._slot_liberi, da_ripassare)
+        for giorno in toccati:
+            if giorno not in ripasso:
+                self._calendario.imposta_giorno(self._calendario.giorni[giorno], list(self._piano[giorno]))
+        for giorno, argomenti in ripasso.items():
+            if giorno in toccati or self._ripasso.get(giorno) != argomenti:
+                self._calendario.imposta_giorno(self._calendario.giorni[giorno], argomenti)
+        self._ripasso = ripasso
     
-    # Distribuisci gli argomenti da ripassare nei giorni di revisione
-    for idx, giorno in enumerate(range(giorni_studio_effettivi, giorni_totali)):
-        if idx < len(argomenti_da_ripassare):
-            distribuzione[giorno] = [argomenti_da_ripassare[idx]]
+    def _allinea(self, punteggi_df):
+        """Apply the score changes not seen through the hooks (other sessions), by id."""
+        firma = firma_punteggi(punteggi_df)
+        if firma == self._firma:
+            return
+        ids = set(punteggi_df["ID"])
+        rimossi = [i for i in self._punteggi if i not in ids]
+        nuovi = punteggi_df[~punteggi_df["ID"].isin(self._punteggi.keys())]
+        if rimossi:
+            argomenti = {self._punteggi.pop(i) for i in rimossi}
+            self._ricalcola(argomenti, punteggi_df)
+            # I nuovi punteggi degli argomenti ricalcolati sono già nel loro storico
+            ricalcolati = nuovi[nuovi["Argomento"].isin(argomenti)]
+            self._punteggi.update(zip(ricalcolati["ID"], ricalcolati["Argomento"]))
+        if not nuovi.empty:
+            self._registra(nuovi.sort_values("Data", kind="stable").to_dict("records"))
+        self._firma = firma
+    
+    def registra_punteggi(self, righe, punteggi_df=None):
+        """
+        Reschedule the topics of newly saved scores.
+        
+        Args:
+            righe (list): Saved rows with "ID", "Argomento", "Punteggio" and "Data"
+            punteggi_df (pandas.DataFrame, optional): Scores including the new rows
+        """
+        with self._lock:
+            if self._scheduler is None:
+                return
+            self._registra(righe)
+            if punteggi_df is not None:
+                self._firma = firma_punteggi(punteggi_df)
+    
+    def rimuovi_punteggi(self, ids, punteggi_df):
+        """
+        Reschedule the topics of deleted scores from their remaining tests.
+        
+        Args:
+            ids (list): Deleted score ids
+            punteggi_df (pandas.DataFrame): Scores without the deleted rows
+        """
+        with self._lock:
+            if self._scheduler is None:
+                return
+            argomenti = {self._punteggi.pop(i) for i in ids if i in self._punteggi}
+            self._ricalcola(argomenti, punteggi_df)
+            self._firma = firma_punteggi(punteggi_df)
+    
+    def calendario(self, df, giorni_studio, oggi, stato_argomenti_df, punteggi_df=None, versioni=None):
+        """
+        Get the study calendar, recomputing only what changed.
+        
+        Args:
+            df (pandas.DataFrame): DataFrame containing topics
+            giorni_studio (int): Number of days until exam
+            oggi (datetime.date): Current date
+            stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+            punteggi_df (pandas.DataFrame, optional): DataFrame containing scores
+            versioni (tuple, optional): (catalogue version, state version) from
+                VersioniDati; without them the catalogue is hashed and the
+                states scanned on every call
+            
+        Returns:
+            StudyCalendar: Study calendar
+        """
+        if versioni is None:
+            chiave = (firma_catalogo(df), oggi, giorni_studio)
+            versione_stato = None
         else:
-            # Se ci sono più giorni di revisione che argomenti, ripeti gli argomenti più critici
-            distribuzione[giorno] = ["Ripasso approfondito"]
+            chiave = (("versione", versioni[0]), oggi, giorni_studio)
+            versione_stato = versioni[1]
+        with self._lock:
+            if versione_stato is not None and versione_stato == self._versione_stato:
+                da_ripassare = self._da_ripassare
+            else:
+                da_ripassare = argomenti_da_ripassare(stato_argomenti_df)
+            if chiave != self._chiave:
+                self._scheduler, distribuzione, self._slot_liberi, self._capacita = _piano_base(
+                    df, giorni_studio, oggi, punteggi_df
+                )
+                self._piano = [list(argomenti) for argomenti in distribuzione]
+                self._giorni_argomento = {}
+                for giorno, argomenti in enumerate(self._piano):
+                    for argomento in argomenti:
+                        self._giorni_argomento.setdefault(argomento, []).append(giorno)
+                self._ripasso = _ripasso_slot(self._slot_liberi, da_ripassare)
+                for giorno, argomenti in self._ripasso.items():
+                    distribuzione[giorno] = argomenti
+                giorni = [oggi + timedelta(days=i) for i in range(len(distribuzione))]
+                self._calendario = StudyCalendar(giorni, distribuzione)
+                self._chiave = chiave
+                self._oggi, self._giorni_studio = oggi, giorni_studio
+                if punteggi_df is not None:
+                    self._punteggi = dict(zip(punteggi_df["ID"], punteggi_df["Argomento"]))
+                    self._firma = firma_punteggi(punteggi_df)
+                else:
+                    self._punteggi, self._firma = {}, None
+                self._da_ripianificare.clear()
+                self.ricostruzioni += 1
+            else:
+                if punteggi_df is not None:
+                    self._allinea(punteggi_df)
+                if self._da_ripianificare:
+                    # Record SM-2 cambiati: sposta solo quegli argomenti nei loro nuovi giorni
+                    self._ripianifica(da_ripassare)
+                    self.aggiornamenti += 1
+                elif da_ripassare == self._da_ripassare:
+                    self.riusi += 1
+                else:
+                    # Aggiorna solo i giorni di revisione il cui argomento è cambiato
+                    ripasso = _ripasso_slot(self._slot_liberi, da_ripassare)
+                    for giorno, argomenti in ripasso.items():
+                        if self._ripasso.get(giorno) != argomenti:
+                            self._calendario.imposta_giorno(self._calendario.giorni[giorno], argomenti)
+                    self._ripasso = ripasso
+                    self.aggiornamenti += 1
+            self._da_ripassare = da_ripassare
+            self._versione_stato = versione_stato
+            return self._calendario
+    
+    def stats(self):
+        """
+        Get the recomputation counters.
+        
+        Returns:
+            dict: Reruns served from cache, partial patches and full rebuilds
+        """
+        return {"riusi": self.riusi, "aggiornamenti": self.aggiornamenti, "ricostruzioni": self.ricostruzioni}
+
+
+@st.cache_resource(show_spinner=False)
+def get_calendar_cache(punteggi_file):
+    """
+    Return the process-wide calendar cache of a user partition.
+    
+    Each partition has its own cache: the cached calendar is patched in
+    place, so sessions of different users must not share it. It is keyed
+    by the scores file, which is what the score hooks know.
     
-    giorni = [oggi + timedelta(days=i) for i in range(giorni_totali)]
-    calendario = pd.DataFrame({"Data": giorni, "Argomenti": distribuzione})
-    return calendario
+    Args:
+        punteggi_file (str): Scores file of the partition
+        
+    Returns:
+        CalendarCache: Shared calendar cache
+    """
+    return CalendarCache()
+
+def argomenti_in_programma(calendario_studio, giorni):
+    """
+    Get the topics scheduled on the given days.
+    
+    Args:
+        calendario_studio (StudyCalendar): Study calendar
+        giorni (list): List of datetime.date
+        
+    Returns:
+        list: Topics in calendar order, without duplicates or review placeholders
+    """
+    argomenti = []
+    for giorno in giorni:
+        for arg in calendario_studio.argomenti(giorno) or []:
+            if arg != "Ripasso approfondito" and arg not in argomenti:
+                argomenti.append(arg)
+    return argomenti
@@ -0,0 +1,264 @@
+"""
+Opt-in per-rerun profiling for the Dashboard Studio application.
+
+Enabled with the DASHBOARD_PROFILE=1 environment variable or the
+?profile=1 query parameter. Each rerun times the stages of main and
+every function decorated with @profila, writes a Chrome trace-event file
+(open it in chrome://tracing or https://ui.perfetto.dev) and shows the
+breakdown in the sidebar. With DASHBOARD_PROFILE_CPROFILE=N the rerun
+also runs under cProfile and the .prof files of the N slowest reruns
+are kept.
+"""
+
+import cProfile
+import functools
+import heapq
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import streamlit as st
+
+PROFILI_DIR = os.path.join(".cache", "profili")
+PROFILO_ENV = os.environ.get("DASHBOARD_PROFILE", "") == "1"
+CPROFILE_LENTI = int(os.environ.get("DASHBOARD_PROFILE_CPROFILE", 0))  # Rerun più lenti da conservare
+TRACCE_MAX = 50  # Tracce conservate su disco
+
+_corrente = threading.local()
+
+
+class ProfileArchive:
+    """
+    Process-wide store of the trace files and of the slowest cProfile dumps.
+    """
+
+    def __init__(self, directory=PROFILI_DIR, tracce_max=TRACCE_MAX, lenti=CPROFILE_LENTI):
+        """
+        Args:
+            directory (str, optional): Output directory
+            tracce_max (int, optional): Trace files kept on disk
+            lenti (int, optional): Slowest reruns whose cProfile dump is kept
+        """
+        self.directory = directory
+        self.tracce_max = tracce_max
+        self.lenti = lenti
+        self._lock = threading.Lock()
+        self._tracce = []
+        self._prof = []  # Min-heap (durata, path) dei rerun più lenti
+        self._seq = 0
+
+    def salva(self, profiler):
+        """
+        Write the trace of a finished rerun and keep its cProfile dump if it
+        is among the slowest.
+
+        Args:
+            profiler (RerunProfiler): Finished profiler
+
+        Returns:
+            str: Path of the trace file
+        """
+        with self._lock:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            self._seq += 1
+            nome = f"rerun_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{self._seq:05d}"
+            traccia = os.path.join(self.directory, f"{nome}.json")
+            with open(traccia, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": profiler.eventi_trace(), "displayTimeUnit": "ms"}, f)
+            self._tracce.append(traccia)
+            while len(self._tracce) > self.tracce_max:
+                _rimuovi(self._tracce.pop(0))
+
+            if profiler.cprofile is not None and self.lenti > 0:
+                if len(self._prof) < self.lenti or profiler.durata > self._prof[0][0]:
+                    prof = os.path.join(self.directory, f"{nome}.prof")
+                    profiler.cprofile.dump_stats(prof)
+                    heapq.heappush(self._prof, (profiler.durata, prof))
+                    if len(self._prof) > self.lenti:
+                        _rimuovi(heapq.heappop(self._prof)[1])
+            return traccia
+
+
+def _rimuovi(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class RerunProfiler:
+    """
+    Stage timer of one rerun.
+    """
+
+    def __init__(self, attivo, cprofile=False):
+        """
+        Args:
+            attivo (bool): Record timings; when False every method is a no-op
+            cprofile (bool, optional): Also run the rerun under cProfile
+        """
+        self.attivo = attivo
+        self.fasi = []  # (nome, inizio, durata, profondità)
+        self.durata = 0.0
+        self.cprofile = None
+        self._profondita = 0
+        self._t0 = None
+        self._cprofile_richiesto = attivo and cprofile
+
+    def inizia(self):
+        """Start timing the rerun and make this the thread's current profiler."""
+        if not self.attivo:
+            return
+        _corrente.profiler = self
+        self._t0 = time.perf_counter()
+        if self._cprofile_richiesto:
+            try:
+                self.cprofile = cProfile.Profile()
+                self.cprofile.enable()
+            except ValueError:
+                # Un altro profiler è già attivo nel processo
+                self.cprofile = None
+
+    def termina(self, archivio):
+        """
+        Stop timing and write the trace.
+
+        Args:
+            archivio (ProfileArchive): Output store
+
+        Returns:
+            str or None: Path of the trace file
+        """
+        if not self.attivo or self._t0 is None:
+            return None
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        self.durata = time.perf_counter() - self._t0
+        _corrente.profiler = None
+        return archivio.salva(self)
+
+    @contextmanager
+    def _misura(self, nome):
+        inizio = time.perf_counter()
+        self._profondita += 1
+        try:
+            yield
+        finally:
+            self._profondita -= 1
+            self.fasi.append((nome, inizio - self._t0, time.perf_counter() - inizio, self._profondita))
+
+    def fase(self, nome):
+        """
+        Time a stage.
+
+        Args:
+            nome (str): Stage name
+
+        Returns:
+            contextmanager: Context timing the enclosed block
+        """
+        if not self.attivo or self._t0 is None:
+            return nullcontext()
+        return self._misura(nome)
+
+    def eventi_trace(self):
+        """
+        Convert the stages to Chrome trace events.
+
+        Returns:
+            list: Complete ("X") events in microseconds
+        """
+        pid, tid = os.getpid(), threading.get_ident()
+        eventi = [{"name": "rerun", "ph": "X", "ts": 0, "dur": int(self.durata * 1e6), "pid": pid, "tid": tid}]
+        for nome, inizio, durata, profondita in self.fasi:
+            eventi.append({
+                "name": nome, "ph": "X", "ts": int(inizio * 1e6), "dur": int(durata * 1e6),
+                "pid": pid, "tid": tid, "args": {"profondita": profondita},
+            })
+        return eventi
+
+    def riepilogo(self):
+        """
+        Get the stages in start order.
+
+        Returns:
+            list: Dicts with "Fase" (indented by depth) and "ms"
+        """
+        return [
+            {"Fase": "  " * profondita + nome, "ms": round(durata * 1000, 1)}
+            for nome, _, durata, profondita in sorted(self.fasi, key=lambda f: f[1])
+        ]
+
+
+def profiler_corrente():
+    """
+    Get the profiler of the rerun running on this thread.
+
+    Returns:
+        RerunProfiler or None: Current profiler
+    """
+    return getattr(_corrente, "profiler", None)
+
+
+def profila(nome=None):
+    """
+    Decorator timing a function as a stage of the current rerun.
+
+    Costs one attribute lookup when profiling is off or the function runs
+    outside the script thread.
+
+    Args:
+        nome (str, optional): Stage name. Defaults to the function name.
+    """
+    def decoratore(funzione):
+        etichetta = nome or funzione.__name__
+
+        @functools.wraps(funzione)
+        def wrapper(*args, **kwargs):
+            profiler = profiler_corrente()
+            if profiler is None:
+                return funzione(*args, **kwargs)
+            with profiler.fase(etichetta):
+                return funzione(*args, **kwargs)
+        return wrapper
+    return decoratore
+
+
+def profilo_richiesto(query_params):
+    """
+    Check whether profiling is enabled for this rerun.
+
+    Args:
+        query_params (streamlit.runtime.state.QueryParamsProxy): st.query_params
+
+    Returns:
+        bool: True if enabled by env var or ?profile=1
+    """
+    return PROFILO_ENV or query_params.get("profile") == "1"
+
+
+def mostra_profilo(profiler, traccia):
+    """
+    Show the timing breakdown of the rerun in the sidebar.
+
+    Args:
+        profiler (RerunProfiler): Finished profiler
+        traccia (str): Path of the trace file
+    """
+    with st.sidebar.expander(f"⏱️ Profilo rerun: {profiler.durata * 1000:.0f} ms"):
+        st.dataframe(profiler.riepilogo(), hide_index=True)
+        st.caption(f"Trace: {traccia}")
+
+
+@st.cache_resource(show_spinner=False)
+def get_profile_archive():
+    """
+    Return the process-wide profile archive.
+
+    Returns:
+        ProfileArchive: Shared archive
+    """
+    return ProfileArchive()
@@ -0,0 +1,329 @@
+"""
+Spaced-repetition scheduling (SM-2 style) for the Dashboard Studio application.
+
+Every topic has an SM-2 record (easiness factor, consecutive passed
+repetitions, current interval) and a due day, expressed as an offset in
+days from today. Due days live in a binary heap, so registering a test
+result reschedules one topic in O(log n); stale heap entries are skipped
+lazily. Initial records for the whole catalogue are computed from the
+score history with vectorised NumPy.
+"""
+
+import heapq
+import math
+
+import numpy as np
+import pandas as pd
+
+EF_INIZIALE = 2.5
+EF_MINIMO = 1.3
+QUALITA_SUFFICIENTE = 3  # Sotto questa qualità la ripetizione riparte da capo
+QUALITA_PROIETTATA = 4  # Qualità ipotizzata per le ripetizioni future del piano
+INTERVALLO_MASSIMO = 365
+
+
+def qualita_da_punteggio(punteggio):
+    """
+    Map a 0-100 test score to SM-2 quality (0-5).
+
+    Args:
+        punteggio (float or numpy.ndarray): Score(s) on 0-100 scale
+
+    Returns:
+        float or numpy.ndarray: Quality
+    """
+    return np.clip(np.asarray(punteggio, dtype=float) / 20.0, 0.0, 5.0)
+
+
+def nuovo_ef(ef, qualita):
+    """SM-2 easiness factor update."""
+    d = 5.0 - qualita
+    return max(EF_MINIMO, ef + 0.1 - d * (0.08 + d * 0.02))
+
+
+def prossimo_intervallo(ripetizioni, ef, intervallo):
+    """SM-2 interval after `ripetizioni` consecutive passed repetitions."""
+    if ripetizioni <= 1:
+        return 1
+    if ripetizioni == 2:
+        return 6
+    return min(INTERVALLO_MASSIMO, int(round(intervallo * ef)))
+
+
+class VoceSM2:
+    """
+    SM-2 record of a topic.
+    """
+
+    __slots__ = ("argomento", "ef", "ripetizioni", "intervallo", "scadenza", "versione")
+
+    def __init__(self, argomento, ef, ripetizioni, intervallo, scadenza):
+        self.argomento = argomento
+        self.ef = ef
+        self.ripetizioni = ripetizioni
+        self.intervallo = intervallo
+        self.scadenza = scadenza
+        self.versione = 0
+
+
+class SpacedRepetitionScheduler:
+    """
+    Priority queue of next-review days driven by SM-2.
+    """
+
+    def __init__(self):
+        self._voci = {}
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._voci)
+
+    def __contains__(self, argomento):
+        return argomento in self._voci
+
+    def _push(self, voce):
+        self._seq += 1
+        heapq.heappush(self._heap, (voce.scadenza, self._seq, voce.versione, voce.argomento))
+        if len(self._heap) > 2 * len(self._voci) + 64:
+            # Troppe voci obsolete: ricostruisci l'heap con le sole valide
+            self._heap = [e for e in self._heap if self._voci[e[3]].versione == e[2]]
+            heapq.heapify(self._heap)
+
+    def voce(self, argomento):
+        """
+        Get the SM-2 record of a topic.
+
+        Args:
+            argomento (str): Topic name
+
+        Returns:
+            VoceSM2 or None: Record
+        """
+        return self._voci.get(argomento)
+
+    def inserisci(self, argomento, scadenza, ef=EF_INIZIALE, ripetizioni=0, intervallo=0):
+        """
+        Insert or replace a topic. O(log n).
+
+        Args:
+            argomento (str): Topic name
+            scadenza (int): Due day as offset from today
+            ef (float, optional): Easiness factor
+            ripetizioni (int, optional): Consecutive passed repetitions
+            intervallo (int, optional): Current interval in days
+        """
+        voce = self._voci.get(argomento)
+        if voce is None:
+            voce = VoceSM2(argomento, ef, ripetizioni, intervallo, scadenza)
+            self._voci[argomento] = voce
+        else:
+            voce.ef, voce.ripetizioni, voce.intervallo, voce.scadenza = ef, ripetizioni, intervallo, scadenza
+            voce.versione += 1
+        self._push(voce)
+
+    def registra_test(self, argomento, punteggio, giorno=0):
+        """
+        Reschedule a topic after a test. O(log n).
+
+        Args:
+            argomento (str): Topic name
+            punteggio (float): Score on 0-100 scale
+            giorno (int, optional): Day of the test as offset from today
+
+        Returns:
+            int: New due day (offset from today)
+        """
+        voce = self._voci.get(argomento)
+        if voce is None:
+            self.inserisci(argomento, giorno)
+            voce = self._voci[argomento]
+        qualita = float(qualita_da_punteggio(punteggio))
+        ef = nuovo_ef(voce.ef, qualita)
+        if qualita < QUALITA_SUFFICIENTE:
+            ripetizioni, intervallo = 0, 1
+        else:
+            ripetizioni = voce.ripetizioni + 1
+            intervallo = prossimo_intervallo(ripetizioni, ef, voce.intervallo)
+        self.inserisci(argomento, giorno + intervallo, ef, ripetizioni, intervallo)
+        return giorno + intervallo
+
+    def prossimi(self, limite=None):
+        """
+        List the valid heap entries in due order without modifying the queue.
+
+        Args:
+            limite (int, optional): Maximum number of topics
+
+        Returns:
+            list: (due day, topic) pairs
+        """
+        heap = list(self._heap)
+        risultato = []
+        while heap and (limite is None or len(risultato) < limite):
+            scadenza, _, versione, argomento = heapq.heappop(heap)
+            if self._voci[argomento].versione == versione:
+                risultato.append((scadenza, argomento))
+        return risultato
+
+    def pianifica(self, giorni_totali, capacita, ultimo_giorno_nuovi=None):
+        """
+        Project the review plan day by day.
+
+        Each day takes up to `capacita` due topics (most overdue first); a
+        topic taken on a day is assumed reviewed with quality
+        QUALITA_PROIETTATA and re-queued at its next SM-2 interval. Topics
+        that do not fit are carried over to the next day. The queue itself
+        is not modified.
+
+        Args:
+            giorni_totali (int): Number of days to plan
+            capacita (int): Maximum topics per day
+            ultimo_giorno_nuovi (int, optional): Last day on which never-reviewed
+                topics may be introduced
+
+        Returns:
+            list: Topics of each day
+        """
+        # Copia leggera dello stato: (scadenza, seq, argomento, ef, ripetizioni, intervallo)
+        heap = []
+        for scadenza, seq, versione, argomento in self._heap:
+            voce = self._voci[argomento]
+            if voce.versione == versione:
+                heap.append((scadenza, seq, argomento, voce.ef, voce.ripetizioni, voce.intervallo))
+        heapq.heapify(heap)
+        seq = self._seq
+
+        distribuzione = [[] for _ in range(giorni_totali)]
+        for giorno in range(giorni_totali):
+            rinviati = []
+            while heap and heap[0][0] <= giorno and len(distribuzione[giorno]) < capacita:
+                voce = heapq.heappop(heap)
+                _, _, argomento, ef, ripetizioni, intervallo = voce
+                if ripetizioni == 0 and ultimo_giorno_nuovi is not None and giorno > ultimo_giorno_nuovi:
+                    # Gli argomenti mai affrontati non entrano nei giorni di sola revisione
+                    rinviati.append(voce)
+                    continue
+                distribuzione[giorno].append(argomento)
+                ef = nuovo_ef(ef, QUALITA_PROIETTATA)
+                ripetizioni += 1
+                intervallo = prossimo_intervallo(ripetizioni, ef, intervallo)
+                if giorno + intervallo < giorni_totali:
+                    seq += 1
+                    heapq.heappush(heap, (giorno + intervallo, seq, argomento, ef, ripetizioni, intervallo))
+            for voce in rinviati:
+                heapq.heappush(heap, voce)
+        return distribuzione
+
+    def proietta_argomento(self, argomento, giorni_totali, capacita, piano, ultimo_giorno_nuovi=None):
+        """
+        Project the review days of a single topic into an existing plan.
+
+        Same projection as pianifica (reviews assumed with quality
+        QUALITA_PROIETTATA, carried over to the next day when a day is
+        full), for one topic only: the other topics keep their days, so a
+        changed topic can be moved without planning the whole catalogue
+        again.
+
+        Args:
+            argomento (str): Topic name
+            giorni_totali (int): Number of days to plan
+            capacita (int): Maximum topics per day
+            piano (list): Topics already planned on each day, without this topic
+            ultimo_giorno_nuovi (int, optional): Last day on which never-reviewed
+                topics may be introduced
+
+        Returns:
+            list: Day indices, in order
+        """
+        voce = self._voci[argomento]
+        giorno, ef, ripetizioni, intervallo = max(0, voce.scadenza), voce.ef, voce.ripetizioni, voce.intervallo
+        giorni = []
+        while giorno < giorni_totali:
+            if ripetizioni == 0 and ultimo_giorno_nuovi is not None and giorno > ultimo_giorno_nuovi:
+                break
+            if len(piano[giorno]) >= capacita:
+                giorno += 1
+                continue
+            giorni.append(giorno)
+            ef = nuovo_ef(ef, QUALITA_PROIETTATA)
+            ripetizioni += 1
+            intervallo = prossimo_intervallo(ripetizioni, ef, intervallo)
+            giorno += intervallo
+        return giorni
+
+    @classmethod
+    def da_storico(cls, argomenti, punteggi_df, oggi, giorni_introduzione):
+        """
+        Build the scheduler for a catalogue from the score history.
+
+        Topics with tests get their SM-2 record from their history
+        (vectorised); topics never tested are introduced in catalogue order,
+        evenly spread over the first `giorni_introduzione` days.
+
+        Args:
+            argomenti (list): Topic names of the catalogue
+            punteggi_df (pandas.DataFrame or None): DataFrame containing scores
+            oggi (datetime.date): Current date
+            giorni_introduzione (int): Days over which new topics are introduced
+
+        Returns:
+            SpacedRepetitionScheduler: Scheduler
+        """
+        argomenti = pd.Index(pd.unique(pd.Series(argomenti, dtype=object)))
+        n = len(argomenti)
+        ef = np.full(n, EF_INIZIALE)
+        ripetizioni = np.zeros(n, dtype=np.int64)
+        intervallo = np.zeros(n, dtype=np.int64)
+        scadenza = np.zeros(n, dtype=np.int64)
+        testati = np.zeros(n, dtype=bool)
+
+        if punteggi_df is not None and not punteggi_df.empty:
+            storico = pd.DataFrame({
+                "Argomento": punteggi_df["Argomento"],
+                "Qualita": qualita_da_punteggio(pd.to_numeric(punteggi_df["Punteggio"], errors="coerce").fillna(0)),
+                "Data": pd.to_datetime(punteggi_df["Data"], errors="coerce"),
+            }).dropna(subset=["Data"]).sort_values("Data", kind="stable")
+            gruppi = storico.groupby("Argomento", sort=False)
+            agg = pd.DataFrame({
+                "n": gruppi.size(),
+                "media": gruppi["Qualita"].mean(),
+                "ultima": gruppi["Qualita"].last(),
+                "data": gruppi["Data"].last(),
+            })
+            pos = argomenti.get_indexer(agg.index)
+            agg = agg[pos >= 0]
+            pos = pos[pos >= 0]
+
+            n_test = agg["n"].to_numpy()
+            d = 5.0 - agg["media"].to_numpy()
+            ef_t = np.maximum(EF_MINIMO, EF_INIZIALE + n_test * (0.1 - d * (0.08 + d * 0.02)))
+            superato = agg["ultima"].to_numpy() >= QUALITA_SUFFICIENTE
+            rip_t = np.where(superato, n_test, 0)
+            int_t = np.where(
+                rip_t <= 1, 1,
+                np.where(rip_t == 2, 6,
+                         np.minimum(INTERVALLO_MASSIMO, np.round(6 * ef_t ** np.clip(rip_t - 2, 0, 30))))
+            ).astype(np.int64)
+            giorni_trascorsi = (pd.Timestamp(oggi) - agg["data"].dt.normalize()).dt.days.to_numpy()
+
+            ef[pos] = ef_t
+            ripetizioni[pos] = rip_t
+            intervallo[pos] = int_t
+            scadenza[pos] = np.maximum(0, int_t - giorni_trascorsi)
+            testati[pos] = True
+
+        # Argomenti nuovi: blocchi consecutivi distribuiti sui giorni di introduzione
+        nuovi = np.flatnonzero(~testati)
+        if len(nuovi):
+            per_giorno = max(1, math.ceil(len(nuovi) / max(1, giorni_introduzione)))
+            scadenza[nuovi] = np.arange(len(nuovi)) // per_giorno
+
+        scheduler = cls()
+        for i, argomento in enumerate(argomenti):
+            voce = VoceSM2(argomento, float(ef[i]), int(ripetizioni[i]), int(intervallo[i]), int(scadenza[i]))
+            scheduler._voci[argomento] = voce
+            scheduler._heap.append((voce.scadenza, i, 0, argomento))
+        heapq.heapify(scheduler._heap)
+        scheduler._seq = n
+        return scheduler
@@ -5,6 +5,12 @@ State management utilities for the Dashboard Studio application.
 import streamlit as st
 import pandas as pd
 
+from src.data.loader import get_versioni_dati
+from src.data.records import get_test_record_store
+from src.data.write_behind import unita_corrente
+from src.utils.calendar import get_calendar_cache
+from src.utils.topic_index import indice_stati
+
 def aggiorna_stato_argomento(stato_argomenti_df, argomento, nuovo_stato, stato_file):
     """
     Update topic state.
@@ -18,52 +24,66 @@ def aggiorna_stato_argomento(stato_argomenti_df, argomento, nuovo_stato, stato_f
     Returns:
         pandas.DataFrame: Updated DataFrame containing topics state
     """
-    stato_argomenti_df.loc[stato_argomenti_df.Argomento == argomento, "Stato"] = nuovo_stato
-    stato_argomenti_df.to_csv(stato_file, index=False)
+    indice = indice_stati(stato_argomenti_df)
+    posizione = indice.posizione(argomento)
+    if posizione is not None:
+        stato_argomenti_df.iat[posizione, stato_argomenti_df.columns.get_loc("Stato")] = nuovo_stato
+        indice.imposta(argomento, nuovo_stato)
+    unita_corrente().aggiorna_stato(stato_file, stato_argomenti_df, [argomento], nuovo_stato)
+    get_versioni_dati().incrementa(stato_file)
     st.toast(f"✅ Stato aggiornato: {argomento} → {nuovo_stato}")
     return stato_argomenti_df
 
-def elimina_test(punteggi_df, argomento, data, punteggi_file, file_path=None):
+def aggiorna_stati_argomenti(stato_argomenti_df, argomenti, nuovo_stato, stato_file):
     """
-    Delete test from history.
+    Update the state of several topics with a single write.
+    
+    Args:
+        stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+        argomenti (list): Topic names
+        nuovo_stato (str): New state
+        stato_file (str): Path to state file
+        
+    Returns:
+        pandas.DataFrame: Updated DataFrame containing topics state
+    """
+    indice = indice_stati(stato_argomenti_df)
+    colonna = stato_argomenti_df.columns.get_loc("Stato")
+    for argomento in argomenti:
+        posizione = indice.posizione(argomento)
+        if posizione is not None:
+            stato_argomenti_df.iat[posizione, colonna] = nuovo_stato
+            indice.imposta(argomento, nuovo_stato)
+    unita_corrente().aggiorna_stato(stato_file, stato_argomenti_df, argomenti, nuovo_stato)
+    get_versioni_dati().incrementa(stato_file)
+    st.toast(f"✅ Stato aggiornato per {len(set(argomenti))} argomenti → {nuovo_stato}")
+    return stato_argomenti_df
+
+def elimina_punteggi(punteggi_df, ids, punteggi_file):
+    """
+    Delete several tests from history with a single write.
     
     Args:
         punteggi_df (pandas.DataFrame): DataFrame containing scores
-        argomento (str): Topic name
-        data (str): Test date
+        ids (list): Score ids
         punteggi_file (str): Path to scores file
-        file_path (str, optional): Path to test file
         
     Returns:
         pandas.DataFrame: Updated DataFrame containing scores
     """
-    import os
-    
-    # Trova la riga corrispondente all'argomento e alla data
-    mask = (punteggi_df["Argomento"] == argomento) & (punteggi_df["Data"] == data)
+    ids = list(ids)
+    if not ids:
+        return punteggi_df
+    # Tombstone nel log e record dettagliati collegati
+    unita_corrente().elimina_punteggi(punteggi_file, ids)
+    get_test_record_store(punteggi_file).elimina_per_punteggio(ids)
     
-    if mask.any():
-        # Rimuovi la riga dal dataframe
-        punteggi_df = punteggi_df[~mask].reset_index(drop=True)
-        
-        # Salva immediatamente le modifiche
-        punteggi_df.to_csv(punteggi_file, index=False)
-        
-        # Aggiorna anche la sessione per mantenere la coerenza tra refresh
-        if "punteggi_df" in st.session_state:
-            st.session_state.punteggi_df = punteggi_df
-        
-        # Se è fornito un percorso file, elimina anche il file di test
-        if file_path and os.path.exists(file_path):
-            try:
-                os.remove(file_path)
-            except Exception as e:
-                st.error(f"Errore nell'eliminazione del file: {str(e)}")
-        
-        # Notifica all'utente
-        st.toast("✅ Test eliminato con successo")
-        st.success("Test eliminato con successo! La pagina verrà aggiornata.")
-    else:
-        st.error("Test non trovato nel database")
+    punteggi_df = punteggi_df[~punteggi_df["ID"].isin(ids)].reset_index(drop=True)
+    # Ricalcola nel calendario solo gli argomenti dei test eliminati
+    get_calendar_cache(punteggi_file).rimuovi_punteggi(ids, punteggi_df)
     
+    # Aggiorna anche la sessione per mantenere la coerenza tra refresh
+    if "punteggi_df" in st.session_state:
+        st.session_state.punteggi_df = punteggi_df
+    st.toast(f"✅ {len(ids)} test eliminati")
     return punteggi_df
@@ -0,0 +1,140 @@
+"""
+Constant-time topic state index for the Dashboard Studio application.
+"""
+
+import threading
+import weakref
+
+STATI = ("non iniziato", "da ripassare", "completato")
+CODICI = {stato: codice for codice, stato in enumerate(STATI)}
+CODICE_DEFAULT = CODICI["non iniziato"]
+
+
+class TopicRecord:
+    """
+    State record of a single topic.
+    """
+
+    __slots__ = ("posizione", "nome", "codice")
+
+    def __init__(self, posizione, nome, codice):
+        self.posizione = posizione
+        self.nome = nome
+        self.codice = codice
+
+
+class TopicStateStore:
+    """
+    Dict-backed mapping from topic name to state code.
+
+    Built once per topics-state DataFrame; lookups and updates are O(1)
+    and the per-state counters are maintained on every update, so
+    progress figures never need a scan.
+    """
+
+    __slots__ = ("_record", "_conteggi", "versione")
+
+    def __init__(self, stato_argomenti_df):
+        """
+        Args:
+            stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+        """
+        self._record = {}
+        self._conteggi = [0] * len(STATI)
+        self.versione = 0
+        argomenti = stato_argomenti_df["Argomento"].tolist()
+        stati = stato_argomenti_df["Stato"].tolist()
+        for posizione, (nome, stato) in enumerate(zip(argomenti, stati)):
+            codice = CODICI.get(stato, CODICE_DEFAULT)
+            # In caso di duplicati vale la prima riga, come in .values[0]
+            if nome not in self._record:
+                self._record[nome] = TopicRecord(posizione, nome, codice)
+                self._conteggi[codice] += 1
+
+    def __len__(self):
+        return len(self._record)
+
+    def __contains__(self, nome):
+        return nome in self._record
+
+    def stato(self, nome, default="non iniziato"):
+        """
+        Get the state of a topic.
+
+        Args:
+            nome (str): Topic name
+            default (str, optional): State of unknown topics
+
+        Returns:
+            str: Topic state
+        """
+        record = self._record.get(nome)
+        return STATI[record.codice] if record is not None else default
+
+    def posizione(self, nome):
+        """
+        Get the row position of a topic in the indexed DataFrame.
+
+        Args:
+            nome (str): Topic name
+
+        Returns:
+            int or None: Row position
+        """
+        record = self._record.get(nome)
+        return record.posizione if record is not None else None
+
+    def imposta(self, nome, stato):
+        """
+        Update the state of a topic and the counters.
+
+        Args:
+            nome (str): Topic name
+            stato (str): New state
+        """
+        record = self._record.get(nome)
+        if record is None:
+            return
+        codice = CODICI.get(stato, CODICE_DEFAULT)
+        self._conteggi[record.codice] -= 1
+        self._conteggi[codice] += 1
+        record.codice = codice
+        self.versione += 1
+
+    def conteggi(self):
+        """
+        Get the number of topics per state.
+
+        Returns:
+            dict: Mapping state -> count
+        """
+        return dict(zip(STATI, self._conteggi))
+
+
+_indici = {}
+_indici_lock = threading.Lock()
+
+
+def indice_stati(stato_argomenti_df):
+    """
+    Return the TopicStateStore of a topics-state DataFrame, building it once.
+
+    The index is tied to the DataFrame object: it is reused for as long as
+    that DataFrame lives and must be kept in sync through
+    aggiorna_stato_argomento / aggiorna_stati_argomenti.
+
+    Args:
+        stato_argomenti_df (pandas.DataFrame): DataFrame containing topics state
+
+    Returns:
+        TopicStateStore: Index of the DataFrame
+    """
+    chiave = id(stato_argomenti_df)
+    with _indici_lock:
+        voce = _indici.get(chiave)
+        if voce is not None and voce[0]() is stato_argomenti_df:
+            return voce[1]
+        indice = TopicStateStore(stato_argomenti_df)
+        _indici[chiave] = (weakref.ref(stato_argomenti_df), indice)
+        weakref.finalize(stato_argomenti_df, _indici.pop, chiave, None)
+        return indice